@@ -6,6 +6,11 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app import app
+from services.log import configure_logging
+
+# The lifespan (which configures logging elsewhere) isn't guaranteed to run
+# here, and there's no fork to wait for, so start the log writer right away
+configure_logging()
 
 # Vercel Python runtime automatically detects FastAPI app
 # Just import and expose it
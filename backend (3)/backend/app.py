@@ -1,30 +1,98 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from routes.prediction_routes import router as prediction_router
 from routes.chat_routes import router as chat_router
 from routes.notes_routes import router as notes_router
 from routes.auth_routes import router as auth_router
+from routes.admin_routes import router as admin_router
+from db.connection import MONGO_HEALTH_INTERVAL, close_client, connection_stats, health_probe
+from db.write_buffer import WRITE_BUFFER, WRITE_BUFFER_ENABLED
+from services.executor import shutdown_executor
+from services.log import RequestIdMiddleware, configure_logging, shutdown_logging
+from services.metrics import CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, render as render_metrics
+from services.rate_limit import LIMITER, RateLimitMiddleware
+from services.password_service import shutdown_password_pool
 
-app = FastAPI()
+
+# -----------------------------
+# ♻️ Lifespan — index bootstrap, Mongo health probe and model watcher on startup, release pools on shutdown
+# -----------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Imported here, not at module level, so `import app` (a serverless cold
+    # start) doesn't pay for pymongo, numpy and the model registry
+    from db.indexes import MONGO_ENSURE_INDEXES, ensure_indexes_in_background
+    from services.model_registry import MODEL_WATCH_INTERVAL, REGISTRY
+    from services.prediction_service import SHADOW, SHADOW_MODEL_VERSION
+
+    # Here rather than at import: with gunicorn's preload_app the import
+    # happens in the master, and the writer thread wouldn't survive the fork
+    configure_logging()
+    # In the background so an unreachable MongoDB doesn't hold up startup
+    tasks = []
+    if MONGO_HEALTH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(health_probe()))
+    if MONGO_ENSURE_INDEXES:
+        tasks.append(asyncio.create_task(ensure_indexes_in_background()))
+    if WRITE_BUFFER_ENABLED:
+        WRITE_BUFFER.start()
+    REGISTRY.start_watcher(MODEL_WATCH_INTERVAL)
+    if SHADOW_MODEL_VERSION:
+        SHADOW.start(SHADOW_MODEL_VERSION)
+    yield
+    REGISTRY.stop_watcher()
+    SHADOW.stop()
+    # Drain queued inserts while the Mongo client is still open
+    await WRITE_BUFFER.close()
+    for task in tasks:
+        task.cancel()
+    shutdown_executor()
+    shutdown_password_pool()
+    await close_client()
+    await LIMITER.backend.close()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # -----------------------------
 # 🔥 CORS — REQUIRED for frontend to connect
 # -----------------------------
+# Innermost of the middleware: 429s still get CORS headers, metrics and a request id
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],        # Allow all frontend URLs
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# Added last so it runs first: everything below it logs with the request id
+app.add_middleware(RequestIdMiddleware)
 
 # -----------------------------
 # 🏡 Home Route
 # -----------------------------
 @app.get("/")
-def home():
+async def home():
     return {"status": "Backend Running"}
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+@app.get("/api/health/db")
+async def db_health():
+    return {"status": "success", "db": connection_stats(), "write_buffer": WRITE_BUFFER.stats()}
+
 # -----------------------------
 # 🔗 API Routers
 # -----------------------------
@@ -32,3 +100,4 @@ app.include_router(prediction_router)
 app.include_router(chat_router)
 app.include_router(notes_router)
 app.include_router(auth_router)
+app.include_router(admin_router)
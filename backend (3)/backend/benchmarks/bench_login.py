@@ -0,0 +1,48 @@
+"""Login (bcrypt verify) throughput at different password pool sizes.
+
+    python -m benchmarks.bench_login [--logins 64] [--rounds 12] [--pools 0,1,2,4]
+
+Pool size 0 is the thread-pool fallback. Every run fires all logins at
+once, the way a start-of-term spike does, with a queue big enough that
+nothing is rejected.
+"""
+import argparse
+import asyncio
+import time
+
+from services.password_service import PasswordHasher, _hash_job
+
+
+async def run(pool_size: int, logins: int, rounds: int, password_hash: str) -> float:
+    hasher = PasswordHasher(pool_size=pool_size, queue_max=logins, rounds=rounds)
+    try:
+        # Warm the pool so process start-up isn't counted
+        await hasher.verify("warm-up", password_hash)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(hasher.verify("correct horse", password_hash) for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+    finally:
+        hasher.shutdown()
+
+    assert all(valid for valid, _ in results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--pools", default="0,1,2,4")
+    args = parser.parse_args()
+
+    password_hash = _hash_job("correct horse", args.rounds)
+    print(f"bcrypt cost {args.rounds}, {args.logins} concurrent logins")
+    print(f"{'pool size':>9} {'logins/s':>10}")
+    for pool_size in [int(p) for p in args.pools.split(",")]:
+        throughput = asyncio.run(run(pool_size, args.logins, args.rounds, password_hash))
+        print(f"{pool_size:>9} {throughput:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Compare the pickle, native booster and pure-NumPy model loaders.
+
+    python -m benchmarks.bench_model_load [--runs 5] [--rows 2000]
+
+Cold load is measured in a fresh interpreter per run, so it includes
+importing xgboost (and, for the pickle, the sklearn wrapper it drags in).
+Peak RSS is taken from that same interpreter.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from services.model_loader import JSON_FILE, find_native_model, load_model
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_COLD_LOAD = """
+import time
+start = time.perf_counter()
+from services.model_loader import load_model
+load_model({backend!r})
+elapsed = time.perf_counter() - start
+from benchmarks.bench_model_load import peak_rss_kb
+print(elapsed, peak_rss_kb())
+"""
+
+
+def peak_rss_kb() -> int:
+    # VmHWM is per address space, unlike ru_maxrss which survives exec and
+    # would report the (much larger) parent benchmark process
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def cold_load(backend: str, runs: int) -> tuple:
+    """Median ``(seconds, peak RSS in MB)`` over ``runs`` fresh interpreters."""
+    timings, rss = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", _COLD_LOAD.format(backend=backend)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        )
+        seconds, maxrss_kb = out.stdout.strip().splitlines()[-1].split()
+        timings.append(float(seconds))
+        rss.append(int(maxrss_kb) / 1024)
+    return statistics.median(timings), statistics.median(rss)
+
+
+def per_row_latency_us(model, n_features: int, rows: int) -> dict:
+    X = np.random.default_rng(0).normal(size=(rows, n_features))
+
+    start = time.perf_counter()
+    for i in range(rows):
+        model.predict(X[i:i + 1])
+    single = (time.perf_counter() - start) / rows * 1e6
+
+    start = time.perf_counter()
+    model.predict(X)
+    batched = (time.perf_counter() - start) / rows * 1e6
+
+    return {"single_row_us": single, "batched_row_us": batched}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    backends = ["pickle"]
+    if find_native_model() is not None:
+        backends.append("native")
+    else:
+        print("No exported native model found - run export_model.py to include it.")
+    if JSON_FILE.exists():
+        backends.append("numpy")
+
+    print(f"{'loader':8} {'cold load (ms)':>16} {'peak RSS (MB)':>14} {'1-row predict (us)':>20} {'batched (us/row)':>18}")
+    for backend in backends:
+        seconds, rss_mb = cold_load(backend, args.runs)
+        model, _ = load_model(backend)
+        latency = per_row_latency_us(model, 14, args.rows)
+        print(
+            f"{backend:8} {seconds * 1e3:16.1f} {rss_mb:14.1f} "
+            f"{latency['single_row_us']:20.1f} {latency['batched_row_us']:18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
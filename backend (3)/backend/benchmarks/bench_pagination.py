@@ -0,0 +1,115 @@
+"""Keyset vs offset paging over one user's very long chat history.
+
+    MONGO_URI=mongodb://127.0.0.1:27017 python -m benchmarks.bench_pagination [--messages 100000] [--limit 50]
+
+Seeds ``--messages`` chat documents for a single user into a scratch
+database (``<DB_NAME>_bench``, dropped afterwards), creates the
+``{email: 1, _id: -1}`` index the history queries rely on, then fetches
+pages at increasing depth two ways:
+
+* keyset - ``get_chat_history(before=cursor)``, what the API does
+* offset - ``find().sort().skip(n).limit()``, for comparison
+
+For each depth it prints the median fetch time and the index keys the
+query examined (from ``explain``). Keyset stays flat; offset grows with n.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from bson import ObjectId
+from pymongo import AsyncMongoClient
+
+import db.connection as connection
+from db.chat_model import get_chat_history
+
+BENCH_EMAIL = "bench-pagination@example.com"
+
+
+async def seed(col, messages: int) -> list:
+    # Explicit, increasing ids so the benchmark knows the cursor for any depth
+    ids = [ObjectId() for _ in range(messages)]
+    batch = 5000
+    for start in range(0, messages, batch):
+        await col.insert_many(
+            [
+                {
+                    "_id": ids[i],
+                    "email": BENCH_EMAIL,
+                    "sender": "user" if i % 2 == 0 else "bot",
+                    "message": f"message {i} " + "lorem ipsum " * 8,
+                }
+                for i in range(start, min(start + batch, messages))
+            ],
+            ordered=False,
+        )
+    await col.create_index([("email", 1), ("_id", -1)])
+    return ids
+
+
+async def _timed(coro_factory, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await coro_factory()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def _keys_examined(col, query: dict, skip: int, limit: int) -> int:
+    cursor = col.find(query, {"sender": 1, "message": 1}).sort("_id", -1).skip(skip).limit(limit)
+    plan = await cursor.explain()
+    return plan["executionStats"]["totalKeysExamined"]
+
+
+async def run(messages: int, limit: int, runs: int) -> None:
+    client = AsyncMongoClient(os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017"))
+    db_name = f"{connection.DB_NAME}_bench"
+    await client.drop_database(db_name)
+    col = client[db_name]["chat_history"]
+
+    # Point the app's data layer at the scratch database
+    connection._client = client
+    connection._db = client[db_name]
+
+    try:
+        print(f"Seeding {messages} messages ...")
+        ids = await seed(col, messages)
+
+        query = {"email": BENCH_EMAIL}
+        print(f"{'depth':>8} {'keyset ms':>10} {'keys':>7} {'offset ms':>10} {'keys':>7}")
+        for fraction in (0.0, 0.1, 0.5, 0.9, 0.999):
+            depth = int((messages - limit) * fraction)
+            # Newest-first depth -> the _id just above the page we want
+            cursor = str(ids[messages - depth]) if depth else None
+
+            keyset_ms = await _timed(lambda: get_chat_history(BENCH_EMAIL, before=cursor, limit=limit), runs)
+            keyset_query = dict(query, _id={"$lt": ObjectId(cursor)}) if cursor else query
+            keyset_keys = await _keys_examined(col, keyset_query, 0, limit + 1)
+
+            async def offset_page():
+                find = col.find(query, {"sender": 1, "message": 1}).sort("_id", -1).skip(depth).limit(limit)
+                return await find.to_list(length=limit)
+
+            offset_ms = await _timed(offset_page, runs)
+            offset_keys = await _keys_examined(col, query, depth, limit)
+
+            print(f"{depth:>8} {keyset_ms:10.2f} {keyset_keys:>7} {offset_ms:10.2f} {offset_keys:>7}")
+    finally:
+        await client.drop_database(db_name)
+        await connection.close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.limit, args.runs))
+
+
+if __name__ == "__main__":
+    main()
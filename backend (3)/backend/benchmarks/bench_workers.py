@@ -0,0 +1,128 @@
+"""Per-worker memory and startup time of N forked workers for each way of loading the model.
+
+    python -m benchmarks.bench_workers [--workers 4] [--backends pickle,native,numpy,mmap]
+
+lazy     every worker loads the bundle on its first prediction (what each
+         uvicorn/gunicorn worker does without preloading)
+preload  the parent loads it once and forks (gunicorn ``preload_app``);
+         workers inherit it copy-on-write
+
+Startup is the time from fork to a worker's first prediction. Memory comes
+from /proc/self/smaps_rollup while all workers are alive: RSS counts shared
+pages in full in every worker, PSS splits them between the processes
+mapping them, and private is what each worker adds on its own. Every
+scenario runs in a fresh interpreter.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def memory_kb() -> dict:
+    fields = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private"}
+    usage = {"rss": 0, "pss": 0, "private": 0}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in fields:
+                    usage[fields[key]] += int(line.split()[1])
+    except OSError:
+        import resource
+        usage["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def _worker(registry, X, barrier, results):
+    start = time.perf_counter()
+    registry.current().predict(X)
+    startup = time.perf_counter() - start
+    # Measure once every worker has loaded, so shared pages are shared
+    barrier.wait()
+    results.put({"startup_ms": startup * 1000, **memory_kb()})
+    barrier.wait()
+
+
+def run_scenario(mode: str, backend: str, workers: int) -> dict:
+    import numpy as np
+
+    from services.model_registry import ModelRegistry
+    from services.preprocess import ENCODER
+
+    registry = ModelRegistry(pinned=None, backend=backend)
+    X = np.zeros((1, ENCODER.n_features))
+    parent_load_ms = 0.0
+    if mode == "preload":
+        start = time.perf_counter()
+        registry.current()
+        parent_load_ms = (time.perf_counter() - start) * 1000
+        # As gunicorn.conf.py does before forking
+        gc.collect()
+        gc.freeze()
+
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(registry, X, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    def median(key):
+        values = sorted(sample[key] for sample in samples)
+        return values[len(values) // 2]
+
+    return {
+        "mode": mode,
+        "backend": backend,
+        "workers": workers,
+        "parent_load_ms": parent_load_ms,
+        "startup_ms": median("startup_ms"),
+        "rss_mb": median("rss") / 1024,
+        "pss_mb": median("pss") / 1024,
+        "private_mb": median("private") / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backends", default="pickle,native,numpy,mmap")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        mode, backend = args.scenario.split(":")
+        print(json.dumps(run_scenario(mode, backend, args.workers)))
+        return
+
+    print(f"{'mode':8} {'backend':8} {'parent load (ms)':>17} {'worker startup (ms)':>20} "
+          f"{'RSS (MB)':>9} {'PSS (MB)':>9} {'private (MB)':>13}")
+    for backend in args.backends.split(","):
+        for mode in ("lazy", "preload"):
+            out = subprocess.run(
+                [sys.executable, "-W", "ignore", "-m", "benchmarks.bench_workers",
+                 "--scenario", f"{mode}:{backend}", "--workers", str(args.workers)],
+                cwd=BACKEND_DIR, capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                print(f"{mode:8} {backend:8} failed: {out.stderr.strip().splitlines()[-1]}")
+                continue
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"{mode:8} {backend:8} {result['parent_load_ms']:17.1f} {result['startup_ms']:20.1f} "
+                f"{result['rss_mb']:9.1f} {result['pss_mb']:9.1f} {result['private_mb']:13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
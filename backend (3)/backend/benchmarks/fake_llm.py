@@ -0,0 +1,144 @@
+"""A local OpenAI/Groq-compatible chat completions server for tests and load runs.
+
+    python -m benchmarks.fake_llm --port 9100 --first-token-delay 0.2
+    LLM_BASE_URL=http://127.0.0.1:9100 GROQ_API_KEY=fake uvicorn app:app
+
+Answers ``POST /openai/v1/chat/completions`` (the path the Groq SDK uses),
+streamed or not, echoing a canned reply word by word.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "Spaced repetition means reviewing material at increasing intervals so it sticks."
+
+
+class FakeLLMServer:
+    def __init__(self, reply: str = DEFAULT_REPLY, first_token_delay: float = 0.0,
+                 token_delay: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def tokens(self) -> list:
+        words = self.reply.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.requests.append(body)
+
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+
+            def _complete(self, body):
+                time.sleep(fake.first_token_delay + fake.token_delay * len(fake.tokens()))
+                payload = json.dumps({
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": fake.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                time.sleep(fake.first_token_delay)
+                for i, token in enumerate(fake.tokens()):
+                    if i:
+                        time.sleep(fake.token_delay)
+                    self._event({"role": "assistant", "content": token}, None, body)
+                self._event({}, "stop", body)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _event(self, delta, finish_reason, body):
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.reply, args.first_token_delay, args.token_delay, args.host, args.port)
+    print(f"Fake LLM listening on {server.base_url}")
+    server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""An in-memory stand-in for the async MongoDB collections, for load runs without a mongod.
+
+    with fake_mongo():
+        ...  # every db/* helper now reads and writes dicts in this process
+
+Covers only what db/* uses: insert_one/insert_many, find(...).sort().limit()
+.to_list(), find_one, update_one with ``$set``, the calibration
+``find_one_and_update`` pipeline and the ``get_latest_payloads``
+aggregation. Filters support equality (dotted paths too) and ``$lt``,
+``$gt``, ``$lte``, ``$gte``, ``$in``. It is not a general Mongo emulator;
+queries are linear scans, so keep datasets to a few thousand documents.
+"""
+import asyncio
+import copy
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+import db.connection as connection
+
+_MISSING = object()
+_COMPARE = {
+    "$lt": lambda a, b: a < b,
+    "$gt": lambda a, b: a > b,
+    "$lte": lambda a, b: a <= b,
+    "$gte": lambda a, b: a >= b,
+    "$in": lambda a, b: a in b,
+}
+
+
+def _get(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = _get(doc, field)
+        if isinstance(condition, dict) and condition and next(iter(condition)).startswith("$"):
+            for op, operand in condition.items():
+                if value is _MISSING or not _COMPARE[op](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    out = {"_id": doc["_id"]} if projection.get("_id", 1) else {}
+    for field, keep in projection.items():
+        if keep and field != "_id" and field in doc:
+            out[field] = copy.deepcopy(doc[field])
+    return out
+
+
+def _evaluate(expression, doc: dict):
+    """The aggregation expressions the calibration update uses."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        (op, args), = expression.items()
+        values = [_evaluate(arg, doc) for arg in args]
+        if op == "$add":
+            return sum(values)
+        if op == "$multiply":
+            product = 1.0
+            for value in values:
+                product *= value
+            return product
+        if op == "$ifNull":
+            return values[0] if values[0] is not None else values[1]
+        raise NotImplementedError(op)
+    return expression
+
+
+class FakeCursor:
+    def __init__(self, docs, projection=None):
+        self._docs = docs
+        self._projection = projection
+
+    def sort(self, key: str, direction: int = 1) -> "FakeCursor":
+        self._docs.sort(key=lambda doc: _get(doc, key), reverse=direction < 0)
+        return self
+
+    def limit(self, n: int) -> "FakeCursor":
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        docs = self._docs if length is None else self._docs[:length]
+        return [_project(doc, self._projection) for doc in docs]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self.to_list():
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, name: str, unique: tuple = ()):
+        self.name = name
+        self.unique = unique
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def _insert(self, doc: dict):
+        doc.setdefault("_id", ObjectId())
+        for field in self.unique:
+            if any(_get(other, field) == _get(doc, field) for other in self._docs.values()):
+                raise DuplicateKeyError(f"E11000 duplicate key on {self.name}.{field}")
+        self._docs[doc["_id"]] = copy.deepcopy(doc)
+        return doc["_id"]
+
+    def _select(self, query) -> list:
+        return [doc for doc in self._docs.values() if _matches(doc, query or {})]
+
+    async def insert_one(self, doc: dict):
+        with self._lock:
+            return SimpleNamespace(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs, ordered: bool = True):
+        with self._lock:
+            return SimpleNamespace(inserted_ids=[self._insert(doc) for doc in docs])
+
+    def find(self, query=None, projection=None) -> FakeCursor:
+        with self._lock:
+            # Projected (and copied) only for the documents that survive sort/limit
+            return FakeCursor(self._select(query), projection)
+
+    async def find_one(self, query=None, projection=None):
+        with self._lock:
+            found = self._select(query)
+            return _project(found[0], projection) if found else None
+
+    async def update_one(self, query, update, upsert: bool = False):
+        with self._lock:
+            found = self._select(query)
+            if found:
+                found[0].update(copy.deepcopy(update.get("$set", {})))
+            return SimpleNamespace(matched_count=len(found[:1]), modified_count=len(found[:1]))
+
+    async def find_one_and_update(self, query, update, upsert: bool = False, return_document=None):
+        with self._lock:
+            found = self._select(query)
+            if found:
+                doc = found[0]
+            elif upsert:
+                doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+                self._insert(doc)
+                doc = self._docs[doc["_id"]]
+            else:
+                return None
+            for stage in update if isinstance(update, list) else [update]:
+                # Evaluate against the old document, then apply
+                doc.update({field: _evaluate(expr, doc) for field, expr in stage["$set"].items()})
+            return copy.deepcopy(doc)
+
+    async def aggregate(self, pipeline):
+        with self._lock:
+            docs = list(self._docs.values())
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if op == "$match":
+                docs = [doc for doc in docs if _matches(doc, spec)]
+            elif op == "$sort":
+                for key, direction in reversed(list(spec.items())):
+                    docs.sort(key=lambda doc: _get(doc, key), reverse=direction < 0)
+            elif op == "$limit":
+                docs = docs[:spec]
+            elif op == "$group":
+                groups = {}
+                for doc in docs:
+                    key = _evaluate(spec["_id"], doc)
+                    if key not in groups:
+                        # Only $first accumulators are needed
+                        groups[key] = {"_id": key, **{
+                            field: _evaluate(acc["$first"], doc) for field, acc in spec.items() if field != "_id"
+                        }}
+                docs = list(groups.values())
+            else:
+                raise NotImplementedError(op)
+        return FakeCursor(docs)
+
+    async def count_documents(self, query) -> int:
+        with self._lock:
+            return len(self._select(query))
+
+
+class FakeDatabase:
+    # Mirrors the unique index db/indexes.py creates
+    UNIQUE = {"users": ("email",)}
+
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name, self.UNIQUE.get(name, ()))
+        return self._collections[name]
+
+    def stats(self) -> dict:
+        return {name: len(col._docs) for name, col in self._collections.items()}
+
+
+@contextmanager
+def fake_mongo(database: FakeDatabase = None):
+    """Point ``db.connection.get_db`` (and so every collection getter) at an in-memory database."""
+    database = database or FakeDatabase()
+    original = connection.get_db
+
+    async def get_db():
+        await asyncio.sleep(0)
+        return database
+
+    connection.get_db = get_db
+    try:
+        yield database
+    finally:
+        connection.get_db = original
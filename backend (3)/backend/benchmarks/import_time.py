@@ -0,0 +1,114 @@
+"""Where an import (by default ``import app``, i.e. a cold start) spends its time.
+
+    python -m benchmarks.import_time [--target app] [--runs 5] [--top 15] [--json out.json]
+
+Runs ``python -X importtime -c "import <target>"`` in ``--runs`` fresh
+interpreters and keeps each module's median. The raw output lists every
+module; this aggregates it:
+
+packages   self time summed per top-level package (numpy, pymongo, fastapi...)
+modules    the slowest modules by cumulative time (including what they import)
+heavy      heavy optional dependencies that were imported at all - the
+           serving path should only load these on the first request that
+           needs them
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Dependencies that must not be imported just by importing the app
+HEAVY_PACKAGES = (
+    "numpy", "pymongo", "groq", "httpx", "xgboost", "sklearn", "scipy", "pandas",
+    "joblib", "torch", "transformers", "google", "passlib", "bcrypt", "requests",
+)
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(text: str) -> dict:
+    """``{module: (self_us, cumulative_us, depth)}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in text.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+
+def run_once(target: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"import {target} failed: {out.stderr.strip().splitlines()[-1:]}")
+    return parse_importtime(out.stderr)
+
+
+def profile(target: str = "app", runs: int = 5) -> dict:
+    """Median self and cumulative time per module over ``runs`` cold imports, aggregated."""
+    samples = [run_once(target) for _ in range(runs)]
+    names = set().union(*samples)
+    modules = {}
+    for name in names:
+        present = [sample[name] for sample in samples if name in sample]
+        modules[name] = {
+            "self_ms": statistics.median(s[0] for s in present) / 1000,
+            "cumulative_ms": statistics.median(s[1] for s in present) / 1000,
+            "depth": present[0][2],
+        }
+
+    packages = defaultdict(lambda: {"self_ms": 0.0, "modules": 0})
+    for name, entry in modules.items():
+        package = packages[name.split(".")[0]]
+        package["self_ms"] += entry["self_ms"]
+        package["modules"] += 1
+
+    total_ms = modules.get(target, {}).get("cumulative_ms")
+    return {
+        "target": target,
+        "runs": runs,
+        "total_ms": total_ms,
+        "module_count": len(modules),
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1]["self_ms"])),
+        "modules": dict(sorted(modules.items(), key=lambda item: -item[1]["cumulative_ms"])),
+        "heavy": sorted(name for name in HEAVY_PACKAGES if name in packages),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="app", help="module to import (default app)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="also write the full report here")
+    args = parser.parse_args()
+
+    report = profile(args.target, args.runs)
+    print(f"import {args.target}: {report['total_ms']:.1f} ms, {report['module_count']} modules "
+          f"(median of {args.runs} cold runs)\n")
+
+    print(f"{'package':24} {'self (ms)':>10} {'modules':>8}")
+    for name, entry in list(report["packages"].items())[:args.top]:
+        print(f"{name:24} {entry['self_ms']:10.1f} {entry['modules']:8}")
+
+    print(f"\n{'module':48} {'cumulative (ms)':>16} {'self (ms)':>10}")
+    for name, entry in list(report["modules"].items())[:args.top]:
+        print(f"{'  ' * entry['depth'] + name:48} {entry['cumulative_ms']:16.1f} {entry['self_ms']:10.1f}")
+
+    print(f"\nheavy dependencies imported: {', '.join(report['heavy']) or 'none'}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""Reproducible benchmark suite: microbenchmarks plus an in-process load test of every API route.
+
+    python -m benchmarks.suite [--quick] [--out results.json] [--compare baseline.json]
+    python -m benchmarks.suite --mongo mongodb://127.0.0.1:27017    # a real mongod instead
+
+Microbenchmarks
+    preprocess   ``preprocess_payload`` on one payload
+    predict      the serving model at batch sizes 1 to 10k rows
+    cold_load    each model backend loaded in a fresh interpreter
+
+Load test
+    Every route is driven through the ASGI app in this process (httpx's
+    ASGITransport, lifespan included) by ``--concurrency`` clients. MongoDB
+    is the in-memory stand-in from benchmarks/fake_mongo.py unless
+    ``--mongo`` names a server (then a scratch ``<DB_NAME>_bench`` database
+    is used and dropped). The LLM is benchmarks/fake_llm.py with
+    ``--llm-delay`` before the first token. Streamed replies are timed to
+    the end of the stream. Google login is left out (it calls Google).
+
+Each entry reports throughput and p50/p95/p99 latency. The results (with
+the commit, machine and settings) are written as JSON; ``--compare``
+checks them against an earlier file and exits 1 if any throughput or p95
+got worse by more than ``--threshold``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BENCH_EMAIL = "bench@example.com"
+ADMIN_TOKEN = "bench-admin-token"
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+PAYLOAD = {
+    "topic_name": "Photosynthesis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 2.0,
+    "review_count": 1,
+    "confidence": 2,
+    "difficulty": "medium",
+    "stress_level": 3,
+    "sleep_hours": 7.0,
+    "mood": "calm",
+    "distraction_level": 2,
+    "recent_event": "None",
+    "attention_level": 4,
+}
+
+
+def summarize(latencies: list, elapsed: float, **extra) -> dict:
+    """Throughput and p50/p95/p99 (ms) of ``latencies`` (seconds) taken over ``elapsed`` seconds."""
+    ordered = sorted(latencies)
+
+    def pct(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3) if ordered else None
+
+    return {
+        "count": len(ordered),
+        "throughput_per_s": round(len(ordered) / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+        **extra,
+    }
+
+
+def _timed(func, iterations: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+# -----------------------------
+# Microbenchmarks
+# -----------------------------
+def micro_preprocess(iterations: int) -> dict:
+    from services.preprocess import preprocess_payload
+
+    preprocess_payload(PAYLOAD)
+    return _timed(lambda: preprocess_payload(PAYLOAD), iterations)
+
+
+def micro_predict(iterations: int, sizes=BATCH_SIZES) -> dict:
+    import numpy as np
+
+    from services.model_registry import REGISTRY
+    from services.preprocess import preprocess_batch
+
+    bundle = REGISTRY.current()
+    rng = np.random.default_rng(0)
+    payloads = [{**PAYLOAD, "study_time": float(t), "sleep_hours": float(s)}
+                for t, s in zip(rng.uniform(0.5, 8, max(sizes)), rng.uniform(4, 9, max(sizes)))]
+    X_all = preprocess_batch(payloads)
+
+    results = {"backend": type(bundle.model).__name__, "model_version": bundle.version}
+    for size in sizes:
+        X = X_all[:size]
+        bundle.predict(X)
+        # Fewer repeats for big batches so each size takes about the same time
+        result = _timed(lambda: bundle.predict(X), max(3, iterations // size))
+        result["rows_per_s"] = round(size / (result["mean_ms"] / 1000), 1)
+        results[f"batch_{size}"] = result
+    return results
+
+
+def micro_cold_load(runs: int) -> dict:
+    from benchmarks.bench_model_load import cold_load
+    from services.model_loader import FLAT_DIR, JSON_FILE, find_native_model
+
+    backends = ["pickle"]
+    if find_native_model() is not None:
+        backends.append("native")
+    if JSON_FILE.exists():
+        backends.append("numpy")
+    if FLAT_DIR.exists():
+        backends.append("mmap")
+
+    results = {}
+    for backend in backends:
+        try:
+            seconds, rss_mb = cold_load(backend, runs)
+        except subprocess.CalledProcessError as e:
+            results[backend] = {"error": (e.stderr or "").strip().splitlines()[-1:]}
+            continue
+        results[backend] = {"runs": runs, "median_ms": round(seconds * 1000, 2), "peak_rss_mb": round(rss_mb, 1)}
+    return results
+
+
+# -----------------------------
+# Load test
+# -----------------------------
+def scenarios(requests: int) -> list:
+    """``(name, method, path, body(i) or None, number of requests)`` for every route."""
+    def predict_body(i):
+        # Mostly distinct inputs, so the prediction cache rarely answers
+        return {**PAYLOAD, "email": BENCH_EMAIL, "study_time": 0.5 + (i % 997) * 0.01}
+
+    def batch_body(i):
+        return {"email": BENCH_EMAIL, "items": [{**PAYLOAD, "study_time": 0.5 + ((i + j) % 97) * 0.05}
+                                                for j in range(100)]}
+
+    topics = [{**PAYLOAD, "topic_name": f"Topic {n}", "difficulty": d}
+              for n, d in enumerate(["easy", "medium", "hard"] * 4)]
+    light = max(5, requests // 10)
+
+    return [
+        ("home", "GET", "/", None, requests),
+        ("predict", "POST", "/api/predict/", predict_body, requests),
+        ("predict_cached", "POST", "/api/predict/", lambda i: {**PAYLOAD, "email": BENCH_EMAIL}, requests),
+        ("predict_batch_100", "POST", "/api/predict/batch", batch_body, light),
+        ("predict_schedule_stored", "POST", "/api/predict/schedule", lambda i: {"email": BENCH_EMAIL, "steps": 10}, light),
+        ("predict_schedule_12_topics", "POST", "/api/predict/schedule",
+         lambda i: {"email": BENCH_EMAIL, "steps": 10, "topics": topics}, light),
+        ("predict_outcome", "POST", "/api/predict/outcome",
+         lambda i: {"email": BENCH_EMAIL, "model_prediction": 5.0, "actual_days": 3.0 + i % 5}, requests),
+        ("predict_history", "GET", f"/api/predict/history/{BENCH_EMAIL}", None, requests),
+        ("predict_model", "GET", "/api/predict/model", None, requests),
+        ("predict_cache_stats", "GET", "/api/predict/cache/stats", None, requests),
+        ("predict_shadow_stats", "GET", "/api/predict/shadow/stats", None, requests),
+        ("chat_llm", "POST", "/api/chat/",
+         lambda i: {"email": f"chat{i}@example.com", "message": f"Explain spaced repetition #{i}", "no_cache": True}, requests),
+        ("chat_cached", "POST", "/api/chat/",
+         lambda i: {"email": f"cached{i}@example.com", "message": "What is active recall?"}, requests),
+        ("chat_stream", "POST", "/api/chat/stream",
+         lambda i: {"email": f"stream{i}@example.com", "message": f"Stream an answer #{i}", "no_cache": True}, requests),
+        ("chat_history", "GET", "/api/chat/chat0@example.com", None, requests),
+        ("chat_stats", "GET", "/api/chat/cache/stats", None, requests),
+        ("notes_add", "POST", "/api/notes/add",
+         lambda i: {"email": BENCH_EMAIL, "title": f"Note {i}", "content": "Review chapter 3"}, requests),
+        ("notes_list", "GET", f"/api/notes/{BENCH_EMAIL}", None, requests),
+        # bcrypt-bound: see BCRYPT_ROUNDS in the results
+        ("auth_login", "POST", "/api/auth/login", lambda i: {"email": BENCH_EMAIL, "password": "bench-password"}, light),
+        ("admin_models", "GET", "/api/admin/models", None, requests),
+        ("db_health", "GET", "/api/health/db", None, requests),
+        ("metrics", "GET", "/metrics", None, light),
+    ]
+
+
+async def drive(client, method: str, path, body, total: int, concurrency: int) -> dict:
+    """Send ``total`` requests from ``concurrency`` concurrent clients; count non-2xx and ``status: error`` replies."""
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            kwargs = {"json": body(i)} if body is not None else {}
+            t0 = time.perf_counter()
+            response = await client.request(method, path, headers={"X-Admin-Token": ADMIN_TOKEN}, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            failed = not 200 <= response.status_code < 300
+            if not failed and response.headers.get("content-type", "").startswith("application/json"):
+                failed = isinstance(response.json(), dict) and response.json().get("status") == "error"
+            elif not failed and "event: error" in response.text:
+                failed = True
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors=errors, concurrency=concurrency)
+
+
+async def load_test(requests: int, concurrency: int, llm_delay: float, only=None) -> dict:
+    import httpx
+    from groq import AsyncGroq
+
+    from app import app
+    from benchmarks.fake_llm import FakeLLMServer
+    from services.chat_service import set_llm_client
+
+    results = {}
+    with FakeLLMServer(first_token_delay=llm_delay, token_delay=0.0) as llm:
+        set_llm_client(AsyncGroq(api_key="fake", base_url=llm.base_url))
+        try:
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                    # Stored predictions for the schedule/history routes, and the login user
+                    await client.post("/api/predict/", json={**PAYLOAD, "email": BENCH_EMAIL})
+                    await client.post("/api/auth/login", json={"email": BENCH_EMAIL, "password": "bench-password"})
+                    for name, method, path, body, total in scenarios(requests):
+                        if only and name not in only:
+                            continue
+                        # One untimed request warms caches, the model and connections
+                        await drive(client, method, path, body, 1, 1)
+                        results[name] = await drive(client, method, path, body, total, concurrency)
+                        print(f"  {name:28} {results[name]['throughput_per_s']:9.1f}/s  "
+                              f"p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                              f"p99 {results[name]['p99_ms']:8.2f} ms  errors {results[name]['errors']}")
+        finally:
+            set_llm_client(None)
+    return results
+
+
+async def _drop_scratch_db() -> None:
+    import db.connection as connection
+
+    client = await connection.get_client()
+    if client is not None:
+        await client.drop_database(connection.DB_NAME)
+    await connection.close_client()
+
+
+# -----------------------------
+# Results
+# -----------------------------
+def _commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "") if out.returncode == 0 else "unknown"
+    except OSError:
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Entries whose throughput fell, or p95 rose, by more than ``threshold`` (a fraction)."""
+    regressions = []
+
+    def walk(path, new, old):
+        if not isinstance(new, dict) or not isinstance(old, dict):
+            return
+        if "p95_ms" in new and "p95_ms" in old:
+            if old.get("throughput_per_s") and new.get("throughput_per_s") is not None:
+                change = new["throughput_per_s"] / old["throughput_per_s"] - 1
+                if change < -threshold:
+                    regressions.append(f"{path}: throughput {old['throughput_per_s']} -> {new['throughput_per_s']}/s ({change:+.0%})")
+            if old.get("p95_ms") and new.get("p95_ms") is not None:
+                change = new["p95_ms"] / old["p95_ms"] - 1
+                if change > threshold:
+                    regressions.append(f"{path}: p95 {old['p95_ms']} -> {new['p95_ms']} ms ({change:+.0%})")
+            return
+        if "median_ms" in new and old.get("median_ms"):
+            change = new["median_ms"] / old["median_ms"] - 1
+            if change > threshold:
+                regressions.append(f"{path}: {old['median_ms']} -> {new['median_ms']} ms ({change:+.0%})")
+            return
+        for key in new:
+            if key in old:
+                walk(f"{path}.{key}" if path else key, new[key], old[key])
+
+    walk("", {"micro": current.get("micro"), "load": current.get("load")},
+         {"micro": baseline.get("micro"), "load": baseline.get("load")})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="small counts, for a smoke run")
+    parser.add_argument("--requests", type=int, default=None, help="requests per route (default 500, quick 50)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="fake LLM seconds before the first token")
+    parser.add_argument("--mongo", help="MongoDB URI of a server to use instead of the in-memory stand-in")
+    parser.add_argument("--sections", default="micro,cold_load,load", help="any of micro,cold_load,load")
+    parser.add_argument("--routes", help="comma-separated load-test scenario names (default all)")
+    parser.add_argument("--out", help="results file (default benchmark-<commit>.json)")
+    parser.add_argument("--compare", help="an earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (default 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    requests = args.requests or (50 if args.quick else 500)
+    sections = set(args.sections.split(","))
+    routes = set(args.routes.split(",")) if args.routes else None
+    # Settings read at import time, before app is imported
+    os.environ.setdefault("ADMIN_TOKEN", ADMIN_TOKEN)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("MONGO_HEALTH_INTERVAL", "0")
+    # The load test hammers a handful of users; measure the routes, not the limiter's 429s
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    if args.mongo:
+        os.environ["MONGO_URI"] = args.mongo
+        os.environ["DB_NAME"] = os.getenv("DB_NAME", "memory_decay_db") + "_bench"
+    else:
+        os.environ.setdefault("MONGO_ENSURE_INDEXES", "0")
+
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "mongo": "server" if args.mongo else "in-memory",
+            "settings": {key: os.getenv(key) for key in ("MODEL_BACKEND", "BCRYPT_ROUNDS", "CHAT_CACHE_SIZE",
+                                                           "PREDICTION_CACHE_SIZE", "WRITE_BUFFER_ENABLED",
+                                                           "RATE_LIMIT_ENABLED")},
+            "requests": requests,
+            "concurrency": args.concurrency,
+            "llm_delay": args.llm_delay,
+        },
+    }
+
+    if "micro" in sections:
+        print("Microbenchmarks")
+        report["micro"] = {
+            "preprocess_payload": micro_preprocess(2000 if args.quick else 20000),
+            "predict": micro_predict(2000 if args.quick else 20000),
+        }
+        print(f"  preprocess_payload p50 {report['micro']['preprocess_payload']['p50_ms'] * 1000:.1f} us")
+        for size in BATCH_SIZES:
+            entry = report["micro"]["predict"][f"batch_{size}"]
+            print(f"  predict batch {size:>5}   p50 {entry['p50_ms']:9.3f} ms  {entry['rows_per_s']:>12,.0f} rows/s")
+    if "cold_load" in sections:
+        print("Cold model load")
+        report.setdefault("micro", {})["cold_load"] = micro_cold_load(1 if args.quick else 3)
+        for backend, entry in report["micro"]["cold_load"].items():
+            print(f"  {backend:8} {entry.get('median_ms', '-'):>10} ms  {entry.get('peak_rss_mb', '-'):>8} MB")
+
+    if "load" in sections:
+        print(f"Load test: {requests} requests per route, {args.concurrency} concurrent")
+
+        async def run():
+            if args.mongo:
+                try:
+                    return await load_test(requests, args.concurrency, args.llm_delay, routes)
+                finally:
+                    await _drop_scratch_db()
+            from benchmarks.fake_mongo import fake_mongo
+            with fake_mongo():
+                return await load_test(requests, args.concurrency, args.llm_delay, routes)
+
+        report["load"] = asyncio.run(run())
+
+    out = Path(args.out or f"benchmark-{report['meta']['commit']}.json")
+    out.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Results written to {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.threshold)
+        print(f"Compared with {args.compare} ({baseline.get('meta', {}).get('commit', '?')}): "
+              f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        for line in regressions:
+            print(f"  {line}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
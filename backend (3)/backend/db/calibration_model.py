@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+
+from .connection import get_calibration_col
+
+# Running sums of (x = model prediction, y = observed days) per user
+SUM_FIELDS = ("n", "sx", "sy", "sxx", "sxy")
+
+
+async def get_calibration(email: str) -> Optional[dict]:
+    """The user's sums, ``{}`` if they have none yet, or ``None`` if MongoDB is unavailable."""
+    calibration_col = await get_calibration_col()
+    if calibration_col is None:
+        return None
+    return await calibration_col.find_one({"_id": email.lower()}) or {}
+
+
+async def add_observation(email: str, x: float, y: float, decay: float) -> Optional[dict]:
+    """Fold one outcome into the user's sums atomically: ``sum = sum * decay + term``.
+
+    Runs as a single pipeline update (upserting the document), so concurrent
+    outcomes for the same user never lose an update. Returns the new document.
+    """
+    calibration_col = await get_calibration_col()
+    if calibration_col is None:
+        return None
+    from pymongo import ReturnDocument
+
+    terms = {"n": 1.0, "sx": x, "sy": y, "sxx": x * x, "sxy": x * y}
+    update = [{
+        "$set": {
+            **{
+                field: {"$add": [{"$multiply": [{"$ifNull": [f"${field}", 0.0]}, decay]}, term]}
+                for field, term in terms.items()
+            },
+            "updated_at": datetime.utcnow(),
+        }
+    }]
+    return await calibration_col.find_one_and_update(
+        {"_id": email.lower()}, update, upsert=True, return_document=ReturnDocument.AFTER,
+    )
@@ -1,37 +1,83 @@
 from .connection import get_chat_col
+from .pagination import InvalidCursor, fetch_page, parse_cursor
+from .write_buffer import buffered_insert
+from services.log import get_logger
 
+logger = get_logger(__name__)
 
-def save_message(email, sender, message):
+
+async def save_message(email, sender, message):
+    """Save one message; returns its ``_id``, or ``None`` if it couldn't be saved."""
+    doc = {
+        "email": email,
+        "sender": sender,
+        "message": message,
+    }
     try:
-        chat_col = get_chat_col()
+        if await buffered_insert("chat_history", [doc]):
+            return doc["_id"]  # assigned at enqueue
+        chat_col = await get_chat_col()
         if chat_col is not None:
-            chat_col.insert_one(
-                {
-                    "email": email,
-                    "sender": sender,
-                    "message": message,
-                }
+            await chat_col.insert_one(doc)
+            return doc["_id"]
+    except Exception as e:
+        logger.warning("MongoDB save failed (non-critical): %s", e)
+    return None
+
+
+async def get_chat_history(email, before=None, after=None, limit=None):
+    """One page of ``email``'s messages, oldest first, as ``(history, next_cursor)``.
+
+    Raises ``InvalidCursor`` for a malformed ``before``/``after``.
+    """
+    parse_cursor(before), parse_cursor(after)
+
+    def to_item(doc):
+        return {
+            "id": str(doc.get("_id")),
+            "email": email,
+            "sender": doc.get("sender"),
+            "message": doc.get("message"),
+        }
+
+    try:
+        chat_col = await get_chat_col()
+        if chat_col is not None:
+            return await fetch_page(
+                chat_col, {"email": email}, {"sender": 1, "message": 1}, to_item,
+                before=before, after=after, limit=limit, newest_first=False,
             )
+    except InvalidCursor:
+        raise
     except Exception as e:
-        print(f"[CHAT MODEL] MongoDB save failed (non-critical): {e}")
+        logger.warning("MongoDB read failed (non-critical): %s", e)
+    return [], None
 
 
-def get_chat_history(email):
+async def get_recent_messages(email, limit):
+    """Newest ``limit`` messages for ``email``, oldest first, with their ObjectId."""
     try:
-        chat_col = get_chat_col()
+        chat_col = await get_chat_col()
         if chat_col is not None:
-            cursor = chat_col.find({"email": email}).sort("_id", 1)
-            history = []
-            for doc in cursor:
-                history.append(
-                    {
-                        "id": str(doc.get("_id")),
-                        "email": doc.get("email"),
-                        "sender": doc.get("sender"),
-                        "message": doc.get("message"),
-                    }
-                )
-            return history
+            cursor = (
+                chat_col.find({"email": email}, {"sender": 1, "message": 1})
+                .sort("_id", -1)
+                .limit(limit)
+            )
+            docs = await cursor.to_list(length=limit)
+            return list(reversed(docs))
     except Exception as e:
-        print(f"[CHAT MODEL] MongoDB read failed (non-critical): {e}")
+        logger.warning("MongoDB read failed (non-critical): %s", e)
     return []
+
+
+async def get_latest_message_id(email):
+    """``_id`` of ``email``'s newest message (an index-only lookup), or ``None``."""
+    try:
+        chat_col = await get_chat_col()
+        if chat_col is not None:
+            docs = await chat_col.find({"email": email}, {"_id": 1}).sort("_id", -1).limit(1).to_list(length=1)
+            return docs[0]["_id"] if docs else None
+    except Exception as e:
+        logger.warning("MongoDB read failed (non-critical): %s", e)
+    return None
@@ -1,56 +1,309 @@
-from pymongo import MongoClient
+import asyncio
 import os
+import threading
+import time
+from functools import lru_cache
 from dotenv import load_dotenv
 
+from services.log import get_logger
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017")
 DB_NAME = os.getenv("DB_NAME", "memory_decay_db")
 
-# Lazy connection - only connect when needed, with timeout
+# Connection pool (per process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+# Circuit breaker: after a failed connect/ping, callers get None immediately
+# for BASE_DELAY seconds, doubling per consecutive failure up to MAX_DELAY
+MONGO_BREAKER_BASE_DELAY = float(os.getenv("MONGO_BREAKER_BASE_DELAY", "1"))
+MONGO_BREAKER_MAX_DELAY = float(os.getenv("MONGO_BREAKER_MAX_DELAY", "60"))
+# Seconds between background pings (0 disables the probe)
+MONGO_HEALTH_INTERVAL = float(os.getenv("MONGO_HEALTH_INTERVAL", "10"))
+
+logger = get_logger(__name__)
+
+
+class CircuitBreaker:
+    """closed -> open on failure; open -> half-open once the backoff delay has passed."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, base_delay: float = MONGO_BREAKER_BASE_DELAY, max_delay: float = MONGO_BREAKER_MAX_DELAY):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """False while open and still backing off (the caller should fail fast)."""
+        if self.state == self.OPEN:
+            if time.monotonic() < self.retry_at:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state != self.OPEN:
+            self.opened += 1
+        self.state = self.OPEN
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.consecutive_failures - 1))
+        self.retry_at = time.monotonic() + delay
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(max(0.0, self.retry_at - time.monotonic()), 2) if self.state == self.OPEN else 0.0,
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class PoolMetrics:
+    """Counts pool events; pymongo may call these from its own threads (see ``_pool_listener``)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.checkout_failures = 0
+        # Not "pool_cleared": that name is the event method
+        self.clears = 0
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump("clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump("closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._bump("checked_out")
+
+    def connection_checked_in(self, event):
+        self._bump("checked_in")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": self.created - self.closed,
+                "in_use": self.checked_out - self.checked_in,
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+                "pool_cleared": self.clears,
+            }
+
+
+BREAKER = CircuitBreaker()
+POOL_METRICS = PoolMetrics()
+
+_POOL_EVENTS = (
+    "pool_created", "pool_ready", "pool_cleared", "pool_closed",
+    "connection_created", "connection_ready", "connection_closed",
+    "connection_check_out_started", "connection_check_out_failed",
+    "connection_checked_out", "connection_checked_in",
+)
+
+
+@lru_cache(maxsize=1)
+def _pool_listener():
+    """``POOL_METRICS`` as a pymongo ``ConnectionPoolListener``.
+
+    Built with the first client, so importing this module (and the app)
+    doesn't import pymongo.
+    """
+    from pymongo.monitoring import ConnectionPoolListener
+
+    methods = {name: staticmethod(getattr(POOL_METRICS, name)) for name in _POOL_EVENTS}
+    return type("PoolMetricsListener", (ConnectionPoolListener,), methods)()
+
+# Lazy connection - only connect when needed; the breaker keeps an outage from
+# costing every request a server-selection timeout
 _client = None
 _db = None
+_attempt_task = None
+_last_ping_ms = None
 
-def get_client():
-    global _client
+
+def _new_client():
+    from pymongo import AsyncMongoClient
+
+    return AsyncMongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[_pool_listener()],
+    )
+
+
+async def _attempt():
+    """Connect (or re-ping the existing client) once, updating the breaker."""
+    global _client, _db, _last_ping_ms
+    client = _client if _client is not None else _new_client()
+    start = time.perf_counter()
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        was_closed = BREAKER.state == CircuitBreaker.CLOSED
+        BREAKER.record_failure()
+        if was_closed:
+            logger.warning("MongoDB connection failed (non-critical): %s", e)
+        if client is not _client:
+            await client.close()
+        return None
+
+    _last_ping_ms = round((time.perf_counter() - start) * 1000, 2)
+    if BREAKER.state != CircuitBreaker.CLOSED:
+        logger.info("MongoDB connection restored")
+    BREAKER.record_success()
     if _client is None:
-        try:
-            _client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-            # Test connection
-            _client.server_info()
-        except Exception as e:
-            print(f"[DB] MongoDB connection failed (non-critical): {e}")
-            _client = None
+        _client = client
+        _db = None
     return _client
 
-def get_db():
+
+async def _shared_attempt():
+    # Concurrent callers share one connect/ping instead of stampeding the server
+    global _attempt_task
+    loop = asyncio.get_running_loop()
+    task = _attempt_task
+    if task is None or task.done() or task.get_loop() is not loop:
+        task = _attempt_task = loop.create_task(_attempt())
+    return await asyncio.shield(task)
+
+
+async def get_client():
+    if not BREAKER.allow():
+        return None
+    if _client is not None and BREAKER.state == CircuitBreaker.CLOSED:
+        return _client
+    return await _shared_attempt()
+
+async def get_db():
     global _db
+    client = await get_client()
+    if client is None:
+        return None
     if _db is None:
-        client = get_client()
-        if client is not None:
-            _db = client[DB_NAME]
-        else:
-            return None
+        _db = client[DB_NAME]
     return _db
 
-def get_collection(name):
-    db = get_db()
+async def get_collection(name):
+    db = await get_db()
     if db is not None:
         return db[name]
     return None
 
+async def close_client():
+    global _client, _db, _attempt_task
+    if _attempt_task is not None and not _attempt_task.done():
+        _attempt_task.cancel()
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _db = None
+    _attempt_task = None
+
+
+async def health_probe(interval: float = MONGO_HEALTH_INTERVAL) -> None:
+    """Ping Mongo every ``interval`` seconds.
+
+    Opens the breaker as soon as a ping fails (so requests stop waiting on
+    server selection) and closes it when Mongo answers again, without
+    needing a request to come along and find out.
+    """
+    while True:
+        if BREAKER.state == CircuitBreaker.OPEN:
+            # Sleep until the breaker's next retry, not a full interval
+            await asyncio.sleep(max(0.0, min(interval, BREAKER.retry_at - time.monotonic())))
+            if time.monotonic() < BREAKER.retry_at:
+                continue
+        try:
+            await _shared_attempt()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Health probe error: %s", e)
+        if BREAKER.state == CircuitBreaker.CLOSED:
+            await asyncio.sleep(interval)
+
+
+def connection_stats() -> dict:
+    return {
+        "connected": _client is not None and BREAKER.state == CircuitBreaker.CLOSED,
+        "last_ping_ms": _last_ping_ms,
+        "breaker": BREAKER.stats(),
+        "pool": POOL_METRICS.stats(),
+        "config": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+            "server_selection_timeout_ms": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "health_interval_seconds": MONGO_HEALTH_INTERVAL,
+        },
+    }
+
 # Collections with lazy loading
-def get_users_col():
-    return get_collection("users")
+async def get_users_col():
+    return await get_collection("users")
+
+async def get_notes_col():
+    return await get_collection("notes")
 
-def get_notes_col():
-    return get_collection("notes")
+async def get_chat_col():
+    return await get_collection("chat_history")
 
-def get_chat_col():
-    return get_collection("chat_history")
+async def get_prediction_col():
+    return await get_collection("predictions")
 
-def get_prediction_col():
-    return get_collection("predictions")
+async def get_calibration_col():
+    return await get_collection("calibration")
 
 # Backward compatibility - but these will be None if MongoDB is not available
 users_col = None
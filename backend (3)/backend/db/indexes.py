@@ -0,0 +1,160 @@
+"""Index bootstrap and report for every collection the backend queries.
+
+    python -m db.indexes            # create anything missing, then report
+    python -m db.indexes --check    # report only; exit 1 if an index is missing
+
+Creation is idempotent: indexes that already exist with the same keys are
+left alone. The app also runs ``ensure_indexes`` in the background at
+startup unless ``MONGO_ENSURE_INDEXES=0``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+from services.log import get_logger
+
+from .connection import close_client, get_db
+
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") != "0"
+
+logger = get_logger(__name__)
+
+# Every history query is find({"email": ...}).sort("_id", ±1), optionally with an
+# _id range for keyset paging - one compound index serves all of them
+_EMAIL_ID = [("email", ASCENDING), ("_id", DESCENDING)]
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "chat_history": [IndexModel(_EMAIL_ID, name="email_1__id_-1")],
+    "notes": [IndexModel(_EMAIL_ID, name="email_1__id_-1")],
+    "predictions": [IndexModel(_EMAIL_ID, name="email_1__id_-1")],
+    "users": [IndexModel([("email", ASCENDING)], name="email_1", unique=True)],
+}
+
+
+def _key(spec) -> tuple:
+    return tuple((field, int(direction)) for field, direction in spec.items())
+
+
+async def _existing(collection) -> dict:
+    """``{key tuple: index info}`` for the collection's current indexes."""
+    indexes = {}
+    async for info in await collection.list_indexes():
+        indexes[_key(info["key"])] = info
+    return indexes
+
+
+async def ensure_indexes(db=None) -> dict:
+    """Create any missing indexes; returns what was created, already present or failed."""
+    db = db if db is not None else await get_db()
+    result = {"created": [], "existing": [], "errors": []}
+    if db is None:
+        result["errors"].append("MongoDB is unavailable")
+        return result
+
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = await _existing(collection)
+        except PyMongoError as e:
+            result["errors"].append(f"{collection_name}: {e}")
+            continue
+
+        for model in models:
+            document = model.document
+            label = f"{collection_name}.{document['name']}"
+            present = existing.get(_key(document["key"]))
+            if present is not None:
+                if bool(present.get("unique")) != bool(document.get("unique")):
+                    result["errors"].append(f"{label}: exists as {present['name']} with different options")
+                else:
+                    result["existing"].append(label)
+                continue
+            try:
+                await collection.create_indexes([model])
+                result["created"].append(label)
+            except OperationFailure as e:
+                # e.g. duplicate emails already stored block the unique index
+                result["errors"].append(f"{label}: {e.details.get('errmsg', e) if e.details else e}")
+
+    return result
+
+
+async def index_report(db=None) -> dict:
+    """Per collection: expected indexes that are missing, and indexes with no recorded use.
+
+    Usage counts come from ``$indexStats`` and reset when mongod restarts,
+    so "unused" means "unused since ``since``".
+    """
+    db = db if db is not None else await get_db()
+    if db is None:
+        return {"error": "MongoDB is unavailable"}
+
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = await _existing(collection)
+            stats = await (await collection.aggregate([{"$indexStats": {}}])).to_list(length=None)
+        except PyMongoError as e:
+            report[collection_name] = {"error": str(e)}
+            continue
+
+        expected = {_key(model.document["key"]) for model in models}
+        report[collection_name] = {
+            "missing": [model.document["name"] for model in models if _key(model.document["key"]) not in existing],
+            "unused": [
+                {"name": entry["name"], "since": str(entry["accesses"]["since"])}
+                for entry in stats
+                if entry["name"] != "_id_" and entry["accesses"]["ops"] == 0
+            ],
+            "unexpected": [
+                info["name"] for key, info in existing.items()
+                if key not in expected and info["name"] != "_id_"
+            ],
+        }
+    return report
+
+
+async def ensure_indexes_in_background() -> None:
+    """Startup hook: never fails the app, just logs what happened."""
+    try:
+        result = await ensure_indexes()
+    except Exception as e:
+        logger.warning("Index bootstrap failed (non-critical): %s", e)
+        return
+    if result["created"]:
+        logger.info("Created indexes %s", ", ".join(result["created"]))
+    for error in result["errors"]:
+        logger.warning("%s", error)
+
+
+async def _main(check_only: bool) -> int:
+    try:
+        if not check_only:
+            print(json.dumps(await ensure_indexes(), indent=2))
+        report = await index_report()
+    finally:
+        await close_client()
+
+    print(json.dumps(report, indent=2))
+    if "error" in report:
+        return 2
+    missing = any(entry.get("missing") or "error" in entry for entry in report.values())
+    return 1 if missing else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="only report; don't create indexes")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.check)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,33 @@
 from .connection import get_notes_col
+from .pagination import fetch_page, parse_cursor
 
 
-def _notes():
-    return get_notes_col()
+async def _notes():
+    return await get_notes_col()
 
 
-def add_note(note):
-    notes_col = _notes()
+async def add_note(note):
+    notes_col = await _notes()
     if notes_col is not None:
-        notes_col.insert_one(note)
+        await notes_col.insert_one(note)
 
 
-def get_notes(email):
-    notes_col = _notes()
+async def get_notes(email, before=None, after=None, limit=None):
+    """One page of ``email``'s notes, newest first, as ``(notes, next_cursor)``."""
+    notes_col = await _notes()
     if notes_col is None:
-        return []
-
-    cursor = notes_col.find({"email": email}).sort("_id", -1)
-    notes = []
-    for doc in cursor:
-        notes.append(
-            {
-                "id": str(doc.get("_id")),
-                "email": doc.get("email"),
-                "title": doc.get("title"),
-                "content": doc.get("content"),
-            }
-        )
-    return notes
+        parse_cursor(before), parse_cursor(after)
+        return [], None
+
+    def to_item(doc):
+        return {
+            "id": str(doc.get("_id")),
+            "email": email,
+            "title": doc.get("title"),
+            "content": doc.get("content"),
+        }
+
+    return await fetch_page(
+        notes_col, {"email": email}, {"title": 1, "content": 1}, to_item,
+        before=before, after=after, limit=limit,
+    )
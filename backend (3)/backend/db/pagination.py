@@ -0,0 +1,77 @@
+import os
+from typing import Callable, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "200"))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_cursor(value: Optional[str]) -> Optional[ObjectId]:
+    if value is None or value == "":
+        return None
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise InvalidCursor(f"Invalid cursor: {value!r}")
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    projection: dict,
+    to_item: Callable[[dict], dict],
+    *,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    newest_first: bool = True,
+) -> Tuple[List[dict], Optional[str]]:
+    """One keyset page over ``_id`` as ``(items, next_cursor)``.
+
+    Without a cursor the page holds the newest documents. ``before`` walks
+    to older documents and ``after`` to newer ones; ``next_cursor`` continues
+    in the same direction and is ``None`` on the last page. Items come back
+    newest first, or oldest first with ``newest_first=False`` (chat
+    transcripts). Each page is an index range scan on ``{email: 1, _id: -1}``
+    of ``limit + 1`` keys, so its cost doesn't depend on how deep it is.
+    """
+    if before is not None and after is not None:
+        raise InvalidCursor("Pass either 'before' or 'after', not both")
+
+    before_id, after_id = parse_cursor(before), parse_cursor(after)
+    limit = clamp_limit(limit)
+
+    query = dict(query)
+    if before_id is not None:
+        query["_id"] = {"$lt": before_id}
+    elif after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    descending = after_id is None
+
+    cursor = (
+        collection.find(query, projection)
+        .sort("_id", -1 if descending else 1)
+        .limit(limit + 1)
+    )
+    docs = await cursor.to_list(length=limit + 1)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = str(docs[-1]["_id"]) if has_more else None
+
+    # Query order is "away from the cursor"; flip it to the requested display order
+    if descending != newest_first:
+        docs.reverse()
+    return [to_item(doc) for doc in docs], next_cursor
@@ -1,47 +1,115 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from .connection import get_prediction_col
+from .pagination import fetch_page, parse_cursor
+from .write_buffer import buffered_insert
 
 
-def _collection():
-    return get_prediction_col()
+async def _collection():
+    return await get_prediction_col()
 
 
-def save_prediction(email: Optional[str], payload: dict, prediction: float) -> None:
-    pred_col = _collection()
-    if pred_col is None:
-        return
+async def save_prediction(email: Optional[str], payload: dict, prediction: float,
+                          model_prediction: Optional[float] = None,
+                          model_version: Optional[str] = None) -> Optional[str]:
+    """Store one prediction; returns its id, or ``None`` if MongoDB is unavailable.
 
+    ``model_prediction`` is the global model's output before per-user calibration,
+    ``model_version`` the registry version that produced it.
+    """
     doc = {
         "email": email.lower() if email else None,
         "payload": payload,
         "prediction": prediction,
+        "model_prediction": prediction if model_prediction is None else model_prediction,
+        "model_version": model_version,
         "created_at": datetime.utcnow(),
     }
-    pred_col.insert_one(doc)
+    if await buffered_insert("predictions", [doc]):
+        return str(doc["_id"])
+
+    pred_col = await _collection()
+    if pred_col is None:
+        return None
+    result = await pred_col.insert_one(doc)
+    return str(result.inserted_id)
+
 
+async def save_predictions(email: Optional[str], items: List[tuple], model_version: Optional[str] = None) -> None:
+    """Bulk-save ``(payload, prediction[, model_prediction])`` tuples with a single ``insert_many``."""
+    if not items:
+        return
 
-def get_predictions(email: str, limit: int = 10) -> List[dict]:
-    pred_col = _collection()
+    now = datetime.utcnow()
+    owner = email.lower() if email else None
+    docs = [
+        {
+            "email": owner,
+            "payload": item[0],
+            "prediction": item[1],
+            "model_prediction": item[2] if len(item) > 2 else item[1],
+            "model_version": model_version,
+            "created_at": now,
+        }
+        for item in items
+    ]
+    if await buffered_insert("predictions", docs):
+        return
+
+    pred_col = await _collection()
     if pred_col is None:
-        return []
+        return
+    await pred_col.insert_many(docs, ordered=False)
+
 
-    cursor = (
-        pred_col.find({"email": email.lower()})
-        .sort("_id", -1)
-        .limit(limit)
+async def get_predictions(email: str, limit: int = 10, before: Optional[str] = None,
+                          after: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of ``email``'s predictions, newest first, as ``(history, next_cursor)``."""
+    pred_col = await _collection()
+    if pred_col is None:
+        parse_cursor(before), parse_cursor(after)
+        return [], None
+
+    def to_item(doc):
+        return {
+            "id": str(doc.get("_id", "")),
+            "prediction": doc.get("prediction"),
+            "payload": doc.get("payload", {}),
+            "model_version": doc.get("model_version"),
+            "created_at": doc.get("created_at"),
+        }
+
+    return await fetch_page(
+        pred_col, {"email": email.lower()}, {"prediction": 1, "payload": 1, "model_version": 1, "created_at": 1}, to_item,
+        before=before, after=after, limit=limit,
+    )
+
+
+async def get_prediction(email: str, prediction_id: str) -> Optional[dict]:
+    """One of ``email``'s stored predictions by id (``None`` if missing or someone else's)."""
+    pred_col = await _collection()
+    if pred_col is None:
+        return None
+    return await pred_col.find_one(
+        {"_id": parse_cursor(prediction_id), "email": email.lower()},
+        {"prediction": 1, "model_prediction": 1, "created_at": 1},
     )
 
-    history = []
-    for doc in cursor:
-        history.append(
-            {
-                "id": str(doc.get("_id", "")),
-                "prediction": doc.get("prediction"),
-                "payload": doc.get("payload", {}),
-                "created_at": doc.get("created_at"),
-            }
-        )
-    return history
 
+async def get_latest_payloads(email: str, limit: int = 500) -> List[dict]:
+    """Most recent prediction payload per topic for ``email``, newest topics first."""
+    pred_col = await _collection()
+    if pred_col is None:
+        return []
+
+    pipeline = [
+        {"$match": {"email": email.lower()}},
+        # Served by the {email: 1, _id: -1} index, so $first is the newest per topic
+        {"$sort": {"_id": -1}},
+        {"$group": {"_id": "$payload.topic_name", "payload": {"$first": "$payload"}, "last_id": {"$first": "$_id"}}},
+        {"$sort": {"last_id": -1}},
+        {"$limit": limit},
+    ]
+    cursor = await pred_col.aggregate(pipeline)
+    return [doc["payload"] async for doc in cursor if doc.get("payload")]
@@ -4,13 +4,13 @@ from typing import Optional
 from .connection import get_users_col
 
 
-def _users():
+async def _users():
     """Return the users collection if MongoDB is available."""
-    return get_users_col()
+    return await get_users_col()
 
 
-def create_user(email: str, password_hash: Optional[str] = None) -> Optional[dict]:
-    users_col = _users()
+async def create_user(email: str, password_hash: Optional[str] = None) -> Optional[dict]:
+    users_col = await _users()
     if users_col is None:
         return None
 
@@ -20,20 +20,27 @@ def create_user(email: str, password_hash: Optional[str] = None) -> Optional[dic
         "created_at": datetime.utcnow(),
         "last_login": datetime.utcnow(),
     }
-    result = users_col.insert_one(doc)
+    result = await users_col.insert_one(doc)
     doc["_id"] = result.inserted_id
     return doc
 
 
-def get_user(email: str) -> Optional[dict]:
-    users_col = _users()
+async def get_user(email: str) -> Optional[dict]:
+    users_col = await _users()
     if users_col is None:
         return None
-    return users_col.find_one({"email": email.lower()})
+    return await users_col.find_one({"email": email.lower()})
 
 
-def update_last_login(user_id, timestamp: Optional[datetime] = None) -> None:
-    users_col = _users()
+async def update_last_login(user_id, timestamp: Optional[datetime] = None) -> None:
+    users_col = await _users()
     if users_col is None:
         return
-    users_col.update_one({"_id": user_id}, {"$set": {"last_login": timestamp or datetime.utcnow()}})
+    await users_col.update_one({"_id": user_id}, {"$set": {"last_login": timestamp or datetime.utcnow()}})
+
+
+async def update_password_hash(user_id, password_hash: str) -> None:
+    users_col = await _users()
+    if users_col is None:
+        return
+    await users_col.update_one({"_id": user_id}, {"$set": {"password_hash": password_hash}})
@@ -0,0 +1,311 @@
+import asyncio
+import os
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import bson
+from bson import ObjectId, json_util
+
+from services.log import get_logger
+from services.metrics import stage
+
+from .connection import get_collection
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, fine for a single dev server
+    fcntl = None
+
+# Buffer inserts and write them with insert_many (0 = write each insert immediately)
+WRITE_BUFFER_ENABLED = os.getenv("WRITE_BUFFER_ENABLED", "1") != "0"
+# Flush a collection as soon as this many documents are waiting for it...
+WRITE_BUFFER_BATCH = int(os.getenv("WRITE_BUFFER_BATCH", "500"))
+# ...and everything at least this often (seconds)
+WRITE_BUFFER_INTERVAL = float(os.getenv("WRITE_BUFFER_INTERVAL", "1.0"))
+# BSON bytes held in memory before writers wait for a flush / documents spill
+WRITE_BUFFER_MAX_BYTES = int(os.getenv("WRITE_BUFFER_MAX_BYTES", str(16 * 1024 * 1024)))
+# Append-only JSONL file for documents Mongo couldn't take; replayed once it's back.
+# Shared by all workers: appends and replays are serialised with a lock file next to it
+WRITE_BUFFER_SPILL_PATH = os.getenv("WRITE_BUFFER_SPILL_PATH") or None
+
+_DUPLICATE_KEY = 11000
+
+logger = get_logger(__name__)
+
+
+class WriteBuffer:
+    """Write-behind queue: requests enqueue documents, a background task inserts them.
+
+    Every document gets its ``_id`` at enqueue time, so ``_id`` order still
+    matches request order (keyset paging relies on it) and replays after a
+    partial failure are idempotent - a duplicate-key error just means the
+    document already made it. When Mongo is down, documents stay queued
+    until the byte budget is reached; past that they go to the spill file,
+    or are dropped (and counted) if no spill file is configured.
+    """
+
+    def __init__(self, batch_size: int = WRITE_BUFFER_BATCH, interval: float = WRITE_BUFFER_INTERVAL,
+                 max_bytes: int = WRITE_BUFFER_MAX_BYTES, spill_path: Optional[str] = WRITE_BUFFER_SPILL_PATH,
+                 collection_getter=get_collection):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.spill_path = Path(spill_path) if spill_path else None
+        self._get_collection = collection_getter
+        self._pending: Dict[str, deque] = defaultdict(deque)  # collection -> (doc, size)
+        self._bytes = 0
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # -----------------------------
+    # Lifecycle
+    # -----------------------------
+    def start(self) -> None:
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    def after_fork(self) -> None:
+        """In a freshly forked worker: forget the parent's flusher task (``start`` makes a new one on the worker's loop).
+
+        Anything the parent had queued is dropped here rather than written by every worker.
+        """
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+        self._pending.clear()
+        self._bytes = 0
+
+    async def close(self) -> None:
+        """Stop the flusher and write out (or spill) whatever is still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        await self.flush()
+        leftover = self._take_all()
+        if leftover:
+            self._spill_or_drop(leftover)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                await self._replay_spill()
+            except Exception as e:
+                logger.exception("Flush error: %s", e)
+
+    # -----------------------------
+    # Enqueue
+    # -----------------------------
+    async def add(self, collection: str, docs: List[dict]) -> None:
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            size = len(bson.encode(doc))
+            self._pending[collection].append((doc, size))
+            self._bytes += size
+        self.enqueued += len(docs)
+
+        if len(self._pending[collection]) >= self.batch_size:
+            self._wakeup.set()
+        if self._bytes > self.max_bytes:
+            # Backpressure: this writer waits for a flush; if Mongo can't take
+            # it, the overflow goes to disk instead of growing memory
+            await self.flush()
+            if self._bytes > self.max_bytes:
+                self._spill_or_drop(self._take_oldest(self._bytes - self.max_bytes))
+
+    def _take_all(self) -> Dict[str, List[dict]]:
+        taken = {name: [doc for doc, _ in queue] for name, queue in self._pending.items() if queue}
+        self._pending.clear()
+        self._bytes = 0
+        return taken
+
+    def _take_oldest(self, nbytes: int) -> Dict[str, List[dict]]:
+        taken = defaultdict(list)
+        while nbytes > 0 and self._bytes > 0:
+            # Oldest document across collections, by its enqueue-time ObjectId
+            name = min((n for n, q in self._pending.items() if q), key=lambda n: self._pending[n][0][0]["_id"])
+            doc, size = self._pending[name].popleft()
+            taken[name].append(doc)
+            self._bytes -= size
+            nbytes -= size
+        return taken
+
+    def _requeue(self, collection: str, docs: List[dict]) -> None:
+        queue = self._pending[collection]
+        for doc in reversed(docs):
+            size = len(bson.encode(doc))
+            queue.appendleft((doc, size))
+            self._bytes += size
+
+    # -----------------------------
+    # Flush
+    # -----------------------------
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            batch = self._take_all()
+            for name, docs in batch.items():
+                remaining = await self._insert(name, docs)
+                if remaining:
+                    self.failed_flushes += 1
+                    self._requeue(name, remaining)
+            if batch:
+                self.flushes += 1
+
+    async def _insert(self, name: str, docs: List[dict]) -> List[dict]:
+        """Insert ``docs``; returns the ones that still need writing."""
+        collection = await self._get_collection(name)
+        if collection is None:
+            return docs
+        # Loaded by now (there is a collection); not imported at module level to keep startup light
+        from pymongo.errors import BulkWriteError
+
+        try:
+            with stage("mongo_flush"):
+                await collection.insert_many(docs, ordered=False)
+            self.written += len(docs)
+            return []
+        except BulkWriteError as e:
+            # Per-document errors won't succeed on retry; duplicates were already written
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != _DUPLICATE_KEY]
+            if errors:
+                self.rejected += len(errors)
+                logger.warning("%d documents rejected by %s: %s", len(errors), name, errors[0].get("errmsg"))
+            self.written += len(docs) - len(errors)
+            return []
+        except Exception as e:
+            logger.warning("insert_many into %s failed: %s", name, e)
+            return docs
+
+    # -----------------------------
+    # Spill file
+    # -----------------------------
+    @contextmanager
+    def _spill_lock(self):
+        """Exclusive lock on ``<spill file>.lock``, held across processes while appending or taking the file."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.spill_path.with_suffix(self.spill_path.suffix + ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _spill_or_drop(self, batch: Dict[str, List[dict]]) -> None:
+        count = sum(len(docs) for docs in batch.values())
+        if not count:
+            return
+        if self.spill_path is None:
+            self.dropped += count
+            logger.error("Dropped %d documents (buffer full, no spill file configured)", count)
+            return
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._spill_lock(), open(self.spill_path, "a", encoding="utf-8") as f:
+                for name, docs in batch.items():
+                    for doc in docs:
+                        f.write(json_util.dumps({"collection": name, "doc": doc}) + "\n")
+            self.spilled += count
+        except OSError as e:
+            self.dropped += count
+            logger.error("Spill to %s failed, dropped %d documents: %s", self.spill_path, count, e)
+
+    async def _replay_spill(self) -> None:
+        # Only replay into an empty buffer, i.e. after Mongo has been keeping up
+        if self.spill_path is None or self._bytes or not self.spill_path.exists():
+            return
+        try:
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                first = f.readline()
+        except FileNotFoundError:
+            return  # another worker just took it
+        if not first.strip() or await self._get_collection(json_util.loads(first)["collection"]) is None:
+            return
+
+        # Other workers replay the same file: whoever gets the lock first takes
+        # it under a name of its own, the rest find it gone. No await in here,
+        # so this worker can't be spilling into it at the same time either.
+        replaying = self.spill_path.with_suffix(f"{self.spill_path.suffix}.replaying.{os.getpid()}")
+        batch = defaultdict(list)
+        with self._spill_lock():
+            if not self.spill_path.exists():
+                return
+            os.replace(self.spill_path, replaying)
+            with open(replaying, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json_util.loads(line)
+                        batch[record["collection"]].append(record["doc"])
+
+        leftover = {}
+        for name, docs in batch.items():
+            for start in range(0, len(docs), self.batch_size):
+                chunk = docs[start:start + self.batch_size]
+                remaining = await self._insert(name, chunk)
+                self.replayed += len(chunk) - len(remaining)
+                if remaining:
+                    leftover[name] = remaining + docs[start + self.batch_size:]
+                    break
+
+        # Still-unwritten documents go back to the (possibly new) spill file
+        if leftover:
+            self._spill_or_drop(leftover)
+        os.remove(replaying)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "pending": sum(len(queue) for queue in self._pending.values()),
+            "pending_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "spill_file": str(self.spill_path) if self.spill_path else None,
+        }
+
+
+WRITE_BUFFER = WriteBuffer()
+
+
+async def buffered_insert(collection: str, docs: List[dict]) -> bool:
+    """Queue ``docs`` if the buffer is running; returns False so the caller writes directly otherwise."""
+    if not WRITE_BUFFER.running:
+        return False
+    await WRITE_BUFFER.add(collection, docs)
+    return True
@@ -0,0 +1,148 @@
+"""Export the pickled XGBRegressor to XGBoost's native model format.
+
+    python export_model.py                 # models/memory_model.ubj + .json
+    python export_model.py --format ubj    # only the binary UBJ (smaller, ~15x faster to load)
+    python export_model.py --flat          # also models/memory_model_flat/ for MODEL_BACKEND=mmap
+
+The native file is what services/model_loader.py prefers at runtime; the
+pickle stays as the fallback. The JSON file is also what the pure-NumPy
+tree engine (MODEL_BACKEND=numpy) reads.
+
+Also writes models/preprocess_params.json, the label-encoder classes and
+scaler stats as plain JSON, so serving never has to unpickle sklearn objects.
+
+    python export_model.py --version 2026-10-18 [--activate]
+
+copies the pickles from --model-dir into models/versions/<version>/,
+exports them there and writes the bundle's manifest.json last; the running
+app's model registry picks the bundle up without a restart (--activate also
+points models/versions/CURRENT at it).
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from services.model_loader import FLAT_DIR, MODEL_DIR, NativeBoosterModel, load_pickle_model
+from services.model_registry import CURRENT_FILE_NAME, MANIFEST_FILE_NAME, VERSIONS_DIR_NAME, file_digest
+from services.preprocess import CompiledEncoder, safe_load_pickle
+from services.tree_engine import TreeEnsemble
+
+BUNDLE_SOURCES = ["memory_model.pkl", "label_encoders.pkl", "scaler.pkl"]
+
+
+def export(fmt: str, model, model_dir: Path = MODEL_DIR) -> Path:
+    booster = model.get_booster()
+
+    out_path = model_dir / f"memory_model.{fmt}"
+    booster.save_model(str(out_path))
+
+    # Sanity check: the exported booster must predict exactly what the pickle does
+    X = np.random.default_rng(0).normal(size=(1000, booster.num_features()))
+    max_diff = float(np.max(np.abs(NativeBoosterModel(out_path).predict(X) - model.predict(X))))
+    if max_diff > 1e-6:
+        raise RuntimeError(f"Exported model diverges from pickle (max diff {max_diff})")
+
+    print(f"Exported {out_path} ({out_path.stat().st_size / 1e6:.2f} MB, max diff {max_diff:.2e})")
+    return out_path
+
+
+def export_preprocess_params(model_dir: Path = MODEL_DIR) -> Path:
+    encoder = CompiledEncoder.from_fitted(
+        safe_load_pickle(model_dir / "label_encoders.pkl"),
+        safe_load_pickle(model_dir / "scaler.pkl"),
+    )
+    out_path = model_dir / "preprocess_params.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(encoder.to_params(), f, indent=2)
+
+    print(f"Exported {out_path}")
+    return out_path
+
+
+def export_flat(model_dir: Path = MODEL_DIR) -> Path:
+    """Flatten the JSON export into .npy node arrays that workers memory-map read-only."""
+    model_dir = Path(model_dir)
+    ensemble = TreeEnsemble.from_json(model_dir / "memory_model.json")
+    out_dir = model_dir / FLAT_DIR.name
+    ensemble.save_flat(out_dir)
+
+    n_features = len(ensemble.feature_names) if ensemble.feature_names else int(ensemble.features.max()) + 1
+    X = np.random.default_rng(0).normal(size=(1000, n_features))
+    if not np.array_equal(TreeEnsemble.load_flat(out_dir).predict(X), ensemble.predict(X)):
+        raise RuntimeError("Flattened model diverges from the JSON export")
+
+    size = sum(path.stat().st_size for path in out_dir.iterdir())
+    print(f"Exported {out_dir} ({size / 1e6:.2f} MB)")
+    return out_dir
+
+
+def export_all(formats, model_dir: Path = MODEL_DIR, flat: bool = False) -> list:
+    model_dir = Path(model_dir)
+    model = load_pickle_model(model_dir / "memory_model.pkl")
+    paths = [export(fmt, model, model_dir) for fmt in formats]
+    if flat:
+        if "json" not in formats:
+            paths.append(export("json", model, model_dir))
+        paths.append(export_flat(model_dir))
+    paths.append(export_preprocess_params(model_dir))
+    return paths
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def export_bundle(version: str, formats, source_dir: Path = MODEL_DIR, models_dir: Path = MODEL_DIR,
+                  activate: bool = False, flat: bool = False) -> Path:
+    """Build ``models/versions/<version>/`` from the pickles in ``source_dir``."""
+    bundle_dir = Path(models_dir) / VERSIONS_DIR_NAME / version
+    if (bundle_dir / MANIFEST_FILE_NAME).exists():
+        raise FileExistsError(f"Bundle {version} already exists in {bundle_dir}")
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+    for name in BUNDLE_SOURCES:
+        shutil.copy2(Path(source_dir) / name, bundle_dir / name)
+
+    export_all(formats, bundle_dir, flat=flat)
+    with open(bundle_dir / "preprocess_params.json", "r", encoding="utf-8") as f:
+        feature_order = json.load(f)["feature_order"]
+
+    # The manifest goes last: the registry ignores directories without one
+    manifest = {
+        "version": version,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "feature_order": feature_order,
+        "files": {
+            str(path.relative_to(bundle_dir)): file_digest(path)
+            for path in sorted(bundle_dir.rglob("*"))
+            if path.is_file() and path.name != MANIFEST_FILE_NAME
+        },
+    }
+    _write_atomic(bundle_dir / MANIFEST_FILE_NAME, json.dumps(manifest, indent=2))
+    print(f"Wrote bundle {bundle_dir}")
+
+    if activate:
+        _write_atomic(bundle_dir.parent / CURRENT_FILE_NAME, version + "\n")
+        print(f"Activated {version}")
+    return bundle_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["json", "ubj", "both"], default="both")
+    parser.add_argument("--model-dir", type=Path, default=MODEL_DIR)
+    parser.add_argument("--version", help="write a versioned bundle under models/versions/ instead")
+    parser.add_argument("--activate", action="store_true", help="make --version the serving version")
+    parser.add_argument("--flat", action="store_true", help="also write the memory-mappable arrays")
+    args = parser.parse_args()
+    formats = ["ubj", "json"] if args.format == "both" else [args.format]
+    if args.version:
+        export_bundle(args.version, formats, source_dir=args.model_dir, activate=args.activate, flat=args.flat)
+    else:
+        export_all(formats, args.model_dir, flat=args.flat)
@@ -0,0 +1,52 @@
+"""gunicorn settings for multi-worker serving.
+
+    MODEL_BACKEND=mmap gunicorn app:app -c gunicorn.conf.py
+
+With ``preload_app`` the master imports the app and loads the model bundle
+once, then forks: workers start with the model already in memory and
+share its pages copy-on-write. ``MODEL_BACKEND=mmap`` goes further - the
+tree arrays are read-only views of models/memory_model_flat/, so they stay
+shared even after a hot reload, across any number of workers.
+
+Threads don't survive a fork, so ``post_fork`` gives each worker its own
+log writer, model watcher and shadow thread, and clears the write buffer's
+flusher task (the worker's lifespan starts it on its own event loop).
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# Import the app (and load the model) in the master before forking
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from services.model_registry import REGISTRY
+
+    bundle = REGISTRY.current()
+    server.log.info(f"Preloaded model {bundle.version} from {bundle.path.name}")
+    # Objects inherited from the master are never collected; freezing them keeps
+    # each worker's collector from writing to (and so copying) their pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from db.write_buffer import WRITE_BUFFER
+    from services.log import configure_logging
+    from services.model_registry import MODEL_WATCH_INTERVAL, REGISTRY
+    from services.prediction_service import SHADOW
+
+    configure_logging()
+    REGISTRY.after_fork()
+    REGISTRY.start_watcher(MODEL_WATCH_INTERVAL)
+    SHADOW.after_fork()
+    WRITE_BUFFER.after_fork()
+    server.log.info(f"Worker {worker.pid} restarted per-process threads after fork")
@@ -0,0 +1,105 @@
+import hmac
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+from services.executor import run_cpu
+from services.lazy import lazy_import
+from services.log import get_logger
+from services.rate_limit import rate_limit_stats
+
+# Shared secret for the admin API (sent as X-Admin-Token); unset disables it
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+logger = get_logger(__name__)
+
+model_registry = lazy_import("services.model_registry")
+prediction_service = lazy_import("services.prediction_service")
+
+
+class ReloadInput(BaseModel):
+    # A directory under models/versions; omit to reload whatever should be serving now
+    version: Optional[str] = None
+
+
+class ShadowInput(BaseModel):
+    # Candidate bundle under models/versions; omit to switch shadow scoring off
+    version: Optional[str] = None
+    # Percentage of prediction requests mirrored to the candidate
+    sample_pct: Optional[float] = None
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_TOKEN not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/models", dependencies=[Depends(require_admin)])
+async def models_api():
+    registry = model_registry.REGISTRY
+    return {"status": "success", "registry": registry.stats(), "versions": registry.versions()}
+
+
+@router.get("/rate-limits", dependencies=[Depends(require_admin)])
+async def rate_limits_api():
+    return {"status": "success", "rate_limits": rate_limit_stats()}
+
+
+@router.post("/models/reload", dependencies=[Depends(require_admin)])
+async def reload_model_api(data: ReloadInput):
+    """Load a model bundle off the event loop and swap it in; predictions keep being served meanwhile.
+
+    The request lands on one worker. Naming a version also rewrites
+    ``models/versions/CURRENT``, which the other workers' watchers pick up
+    within ``MODEL_WATCH_INTERVAL``; ``all_workers`` says whether they will.
+    """
+    registry = model_registry.REGISTRY
+    previous = registry.peek()
+    try:
+        if data.version:
+            bundle = await run_cpu(registry.promote, data.version)
+        else:
+            bundle = await run_cpu(registry.reload)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Model reload failed: %s", e)
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+
+    return {
+        "status": "success",
+        "previous_version": previous.version if previous is not None else None,
+        "model": bundle.info(),
+        "swapped": bundle is not previous,
+        "pid": os.getpid(),
+        # Every worker resolves the same files; only a MODEL_VERSION pin or a disabled watcher keeps them where they are
+        "all_workers": model_registry.MODEL_WATCH_INTERVAL > 0 and not registry.pinned,
+    }
+
+
+@router.post("/shadow", dependencies=[Depends(require_admin)])
+async def shadow_api(data: ShadowInput):
+    """Start (or stop) scoring live traffic with a candidate model in the background."""
+    if data.sample_pct is not None and not 0 <= data.sample_pct <= 100:
+        raise HTTPException(status_code=400, detail="sample_pct must be between 0 and 100")
+
+    candidate = None
+    if data.version:
+        try:
+            candidate = await run_cpu(model_registry.load_bundle, data.version)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.exception("Candidate load failed: %s", e)
+            raise HTTPException(status_code=500, detail=f"Candidate load failed: {e}")
+
+    prediction_service.SHADOW.set_candidate(candidate, data.sample_pct)
+    return {"status": "success", "shadow": prediction_service.SHADOW.stats()}
@@ -1,37 +1,26 @@
 from datetime import datetime
 
 from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr, Field
-from passlib.context import CryptContext
-from passlib.exc import PasswordSizeError
-from google.oauth2 import id_token
-from google.auth.transport import requests
 
-from db.user_model import create_user, get_user, update_last_login
+from db.user_model import create_user, get_user, update_last_login, update_password_hash
+from services.google_auth_service import verify_google_token
+from services.log import get_logger
+from services.password_service import PasswordQueueFull, PasswordTooLong, hash_password, verify_password
 
 router = APIRouter(prefix="/api/auth", tags=["Auth"])
+logger = get_logger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_TOO_LONG = "Password must be 72 characters or fewer. Please choose a shorter password."
 
 
-def _hash_password(password: str) -> str:
-    try:
-        return pwd_context.hash(password)
-    except PasswordSizeError:
-        raise HTTPException(
-            status_code=400,
-            detail="Password must be 72 characters or fewer. Please choose a shorter password.",
-        )
-
-
-def _verify_password(password: str, password_hash: str) -> bool:
-    try:
-        return pwd_context.verify(password, password_hash)
-    except PasswordSizeError:
-        raise HTTPException(
-            status_code=400,
-            detail="Password must be 72 characters or fewer. Please choose a shorter password.",
-        )
+def _busy(error: PasswordQueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many login attempts right now. Please try again in a moment.",
+        headers={"Retry-After": str(error.retry_after)},
+    )
 
 
 class AuthInput(BaseModel):
@@ -55,58 +44,77 @@ def _serialize_user(user_doc):
 
 
 @router.post("/login")
-def login_user(payload: AuthInput):
+async def login_user(payload: AuthInput):
+    # Here rather than at import: pymongo loads with the first request that needs it
+    from pymongo.errors import DuplicateKeyError
+
     try:
-        user = get_user(payload.email)
+        user = await get_user(payload.email)
         if user:
             password_hash = user.get("password_hash")
-            if not password_hash or not _verify_password(payload.password, password_hash):
+            if not password_hash:
                 raise HTTPException(status_code=401, detail="Invalid email or password.")
 
+            valid, new_hash = await verify_password(payload.password, password_hash)
+            if not valid:
+                raise HTTPException(status_code=401, detail="Invalid email or password.")
+
+            # Stored hash used a different bcrypt cost - upgrade it transparently
+            if new_hash:
+                await update_password_hash(user["_id"], new_hash)
+
             now = datetime.utcnow()
-            update_last_login(user["_id"], now)
+            await update_last_login(user["_id"], now)
             user["last_login"] = now
             return {"status": "success", "user": _serialize_user(user), "mode": "login"}
 
         # Create a new user (auto-register)
-        password_hash = _hash_password(payload.password)
-        new_user = create_user(payload.email, password_hash)
+        password_hash = await hash_password(payload.password)
+        new_user = await create_user(payload.email, password_hash)
         if not new_user:
             raise HTTPException(status_code=503, detail="MongoDB is unavailable. Please try again later.")
 
         return {"status": "success", "user": _serialize_user(new_user), "mode": "register"}
-    except PasswordSizeError:
-        raise HTTPException(
-            status_code=400,
-            detail="Password must be 72 characters or fewer. Please choose a shorter password.",
-        )
+    except DuplicateKeyError:
+        # Lost a registration race on the unique users.email index
+        raise HTTPException(status_code=409, detail="This account was just created. Please sign in again.")
+    except PasswordTooLong:
+        raise HTTPException(status_code=400, detail=PASSWORD_TOO_LONG)
+    except PasswordQueueFull as e:
+        raise _busy(e)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[AUTH] Error: {e}")
+        logger.exception("Auth failed: %s", e)
         raise HTTPException(status_code=500, detail="Authentication failed. Please try again.")
 
 
 @router.post("/google")
-def login_google(payload: GoogleLoginInput):
+async def login_google(payload: GoogleLoginInput):
+    from pymongo.errors import DuplicateKeyError
+
     try:
-        # Verify the token
-        # Note: In a production app, you should also verify the 'aud' claim matches your Client ID.
-        idinfo = id_token.verify_oauth2_token(payload.credential, requests.Request())
+        # Verify the token against cached Google certs (set GOOGLE_CLIENT_ID to also check 'aud').
+        # A cert refresh is blocking HTTP - keep it off the event loop
+        idinfo = await run_in_threadpool(verify_google_token, payload.credential)
 
         email = idinfo.get("email")
         if not email:
             raise HTTPException(status_code=400, detail="Google token missing email")
 
-        user = get_user(email)
+        user = await get_user(email)
         if user:
             now = datetime.utcnow()
-            update_last_login(user["_id"], now)
+            await update_last_login(user["_id"], now)
             user["last_login"] = now
             return {"status": "success", "user": _serialize_user(user), "mode": "login"}
 
         # Create new user with no password (Google only)
-        new_user = create_user(email, password_hash=None)
+        try:
+            new_user = await create_user(email, password_hash=None)
+        except DuplicateKeyError:
+            # A concurrent sign-in created it first
+            new_user = await get_user(email)
         if not new_user:
             raise HTTPException(status_code=503, detail="MongoDB is unavailable. Please try again later.")
 
@@ -115,6 +123,6 @@ def login_google(payload: GoogleLoginInput):
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid Google token")
     except Exception as e:
-        print(f"[AUTH] Google Login Error: {e}")
+        logger.exception("Google login failed: %s", e)
         raise HTTPException(status_code=500, detail="Google authentication failed")
 
@@ -1,16 +1,35 @@
-from fastapi import APIRouter
+import json
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from services.chat_service import chat_with_ai
+from services.chat_context import chat_context_stats, get_history, record_exchange
 from db.chat_model import save_message, get_chat_history
+from db.pagination import InvalidCursor
+from routes.admin_routes import require_admin
+from services.lazy import lazy_import
+from services.log import get_logger
+from services.metrics import count_error, stage
+from services.rate_limit import LLMBusy
 
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
+logger = get_logger(__name__)
+
+# The LLM client (groq, httpx) loads on the first chat request, not at import
+chat_service = lazy_import("services.chat_service")
+
+LLM_BUSY = "The assistant is busy right now. Please try again in a moment."
 
 class ChatInput(BaseModel):
     email: str
     message: str
+    # Skip the response cache and always ask the LLM
+    no_cache: bool = False
 
 @router.post("/")
-def chat_api(data: ChatInput):
+async def chat_api(data: ChatInput):
     try:
         user_msg = data.message.strip()
         email = data.email.strip()
@@ -20,16 +39,111 @@ def chat_api(data: ChatInput):
         if not email:
             return {"status": "error", "reply": "Email is required."}
 
-        bot_reply = chat_with_ai(user_msg)
+        history = await get_history(email, user_msg, chat_service.SYSTEM_PROMPT)
+        bot_reply = await chat_service.chat_with_ai(user_msg, use_cache=not data.no_cache, history=history)
 
-        save_message(email, "user", user_msg)
-        save_message(email, "bot", bot_reply)
+        with stage("mongo_write"):
+            ids = (await save_message(email, "user", user_msg), await save_message(email, "bot", bot_reply))
+        if bot_reply != chat_service.FALLBACK_REPLY:
+            await record_exchange(email, user_msg, bot_reply, ids)
 
         return {"status": "success", "reply": bot_reply}
+    except LLMBusy as e:
+        return JSONResponse(
+            {"status": "error", "reply": LLM_BUSY, "retry_after": e.retry_after},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
-        print(f"[CHAT API] Error: {e}")
+        count_error("chat")
+        logger.exception("Chat failed: %s", e)
         return {"status": "error", "reply": "An error occurred while processing your message. Please try again."}
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_reply(email: str, user_msg: str, use_cache: bool):
+    start = time.perf_counter()
+    ttft = None
+    parts = []
+
+    try:
+        history = await get_history(email, user_msg, chat_service.SYSTEM_PROMPT)
+        async for delta in chat_service.stream_chat(user_msg, use_cache=use_cache, history=history):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            parts.append(delta)
+            yield _sse("token", {"delta": delta})
+    except LLMBusy as e:
+        # The 200 and event-stream headers are already sent; say so the way other stream errors do
+        yield _sse("error", {"message": LLM_BUSY, "retry_after": e.retry_after})
+        return
+    except Exception as e:
+        logger.exception("Chat stream failed: %s", e)
+        count_error("chat_stream")
+        chat_service.STREAM_STATS.record_error()
+        yield _sse("error", {"message": chat_service.FALLBACK_REPLY})
+        return
+
+    duration = time.perf_counter() - start
+    ttft = ttft if ttft is not None else duration
+    chat_service.STREAM_STATS.record(ttft, duration)
+
+    bot_reply = "".join(parts).strip()
+    with stage("mongo_write"):
+        ids = (await save_message(email, "user", user_msg), await save_message(email, "bot", bot_reply))
+    await record_exchange(email, user_msg, bot_reply, ids)
+
+    yield _sse("done", {
+        "reply": bot_reply,
+        "ttft_ms": round(ttft * 1000, 1),
+        "total_ms": round(duration * 1000, 1),
+    })
+
+
+@router.post("/stream")
+async def chat_stream_api(data: ChatInput):
+    """Stream the reply as Server-Sent Events: ``token`` events, then ``done`` (or ``error``)."""
+    user_msg = data.message.strip()
+    email = data.email.strip()
+
+    if not user_msg or not email:
+        message = "Message cannot be empty." if not user_msg else "Email is required."
+
+        async def _invalid():
+            yield _sse("error", {"message": message})
+
+        return StreamingResponse(_invalid(), media_type="text/event-stream")
+
+    return StreamingResponse(
+        _stream_reply(email, user_msg, use_cache=not data.no_cache),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Operational stats: same X-Admin-Token as /api/admin
+@router.get("/stream/stats", dependencies=[Depends(require_admin)])
+async def chat_stream_stats():
+    return {"status": "success", "stream": chat_service.STREAM_STATS.snapshot()}
+
+
+@router.get("/cache/stats", dependencies=[Depends(require_admin)])
+async def chat_cache_api():
+    return {"status": "success", "cache": chat_service.chat_cache_stats()}
+
+
+@router.get("/context/stats", dependencies=[Depends(require_admin)])
+async def chat_context_api():
+    return {"status": "success", "context": chat_context_stats()}
+
+
 @router.get("/{email}")
-def history(email: str):
-    return {"status": "success", "history": get_chat_history(email)}
+async def history(email: str, before: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = None):
+    """A page of the transcript (oldest first); pass ``next_cursor`` back as ``before`` for older messages."""
+    try:
+        messages, next_cursor = await get_chat_history(email, before=before, after=after, limit=limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "history": messages, "next_cursor": next_cursor}
@@ -1,6 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import Optional
 from db.notes_model import add_note, get_notes
+from db.pagination import InvalidCursor
 
 router = APIRouter(prefix="/api/notes", tags=["Notes"])
 
@@ -10,10 +12,15 @@ class NoteInput(BaseModel):
     content: str
 
 @router.post("/add")
-def add_note_api(data: NoteInput):
-    add_note(data.dict())
+async def add_note_api(data: NoteInput):
+    await add_note(data.model_dump())
     return {"status": "success"}
 
 @router.get("/{email}")
-def notes_api(email: str):
-    return {"status": "success", "notes": get_notes(email)}
+async def notes_api(email: str, before: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = None):
+    """A page of notes, newest first (unchanged by paging); pass ``next_cursor`` back as ``before`` for older ones."""
+    try:
+        notes, next_cursor = await get_notes(email, before=before, after=after, limit=limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "notes": notes, "next_cursor": next_cursor}
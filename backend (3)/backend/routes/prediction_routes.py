@@ -1,10 +1,25 @@
-from fastapi import APIRouter
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-from services.prediction_service import predict_days_until_forget
-from db.prediction_model import save_prediction, get_predictions
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, EmailStr, ValidationError
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+from services.executor import run_cpu
+from services.lazy import lazy_import
+from services.log import get_logger
+from services.metrics import count_error, stage
+from db.prediction_model import save_prediction, save_predictions, get_predictions, get_latest_payloads, get_prediction
+from db.pagination import InvalidCursor
+from routes.admin_routes import require_admin
 
 router = APIRouter(prefix="/api/predict", tags=["Prediction"])
+logger = get_logger(__name__)
+
+# numpy and the model load on the first prediction request, not at import
+prediction_service = lazy_import("services.prediction_service")
+schedule_service = lazy_import("services.schedule_service")
+model_registry = lazy_import("services.model_registry")
+calibration_service = lazy_import("services.calibration")
 
 class MemoryInput(BaseModel):
     email: EmailStr
@@ -23,70 +38,124 @@ class MemoryInput(BaseModel):
     recent_event: Optional[str] = "None"
     attention_level: int
 
+
+class BatchMemoryInput(BaseModel):
+    email: EmailStr
+    items: List[Dict[str, Any]]
+
+
+class ScheduleInput(BaseModel):
+    email: EmailStr
+    steps: int = 10
+    # Topic payloads to schedule; defaults to the latest prediction for each of the user's topics
+    topics: Optional[List[Dict[str, Any]]] = None
+    start_date: Optional[date] = None
+    # How much confidence grows per simulated review (capped at 5)
+    confidence_step: float = 1.0
+
+
+class OutcomeInput(BaseModel):
+    email: EmailStr
+    # A stored prediction (from the predict response); its model output is used as x
+    prediction_id: Optional[str] = None
+    # ...or give the model output directly
+    model_prediction: Optional[float] = None
+    # Days until the topic was actually forgotten; defaults to the time since the prediction
+    actual_days: Optional[float] = None
+
+
+MAX_BATCH_SIZE = int(os.getenv("PREDICT_BATCH_MAX", "1000"))
+MAX_OUTCOME_DAYS = 3650
+
+REQUIRED_FIELDS = [
+    "category", "domain", "category_type", "study_time",
+    "review_count", "confidence", "difficulty", "stress_level",
+    "sleep_hours", "mood", "distraction_level", "attention_level"
+]
+
+NUMERIC_FIELDS = [
+    "study_time", "review_count", "confidence", "stress_level",
+    "sleep_hours", "distraction_level", "attention_level"
+]
+
+
+def _validate_payload(payload: dict):
+    """Return ``(model_payload, None)`` on success or ``(None, error_message)``."""
+    # Validate that we have all required fields
+    missing = [f for f in REQUIRED_FIELDS if f not in payload or payload[f] is None or payload[f] == ""]
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+
+    # Ensure numeric fields are properly typed
+    for field in NUMERIC_FIELDS:
+        try:
+            payload[field] = float(payload[field])
+        except (ValueError, TypeError):
+            return None, f"Invalid value for {field}: must be a number"
+
+    return {k: v for k, v in payload.items() if k != "email"}, None
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    parts = []
+    for err in error.errors():
+        loc = ".".join(str(p) for p in err.get("loc", ()))
+        parts.append(f"{loc}: {err.get('msg')}" if loc else str(err.get("msg")))
+    return "; ".join(parts)
+
+
 @router.post("/")
-def predict_api(data: MemoryInput):
+async def predict_api(data: MemoryInput):
     try:
-        payload = data.dict()
+        payload = data.model_dump()
         user_email = payload.get("email")
-        
-        # Validate that we have all required fields
-        required_fields = [
-            "category", "domain", "category_type", "study_time", 
-            "review_count", "confidence", "difficulty", "stress_level",
-            "sleep_hours", "mood", "distraction_level", "attention_level"
-        ]
-        missing = [f for f in required_fields if f not in payload or payload[f] is None or payload[f] == ""]
-        if missing:
+
+        with stage("validation"):
+            model_payload, error = _validate_payload(payload)
+        if error:
             return {
                 "status": "error",
-                "message": f"Missing required fields: {', '.join(missing)}",
+                "message": error,
                 "prediction": None
             }
-        
-        # Ensure numeric fields are properly typed
-        for field in ["study_time", "review_count", "confidence", "stress_level", 
-                     "sleep_hours", "distraction_level", "attention_level"]:
-            try:
-                payload[field] = float(payload[field])
-            except (ValueError, TypeError):
-                return {
-                    "status": "error",
-                    "message": f"Invalid value for {field}: must be a number",
-                    "prediction": None
-                }
-        
-        # Make prediction
-        model_payload = {k: v for k, v in payload.items() if k != "email"}
-        result = predict_days_until_forget(model_payload)
+
+        # Make prediction, then apply the user's calibration (one multiply-add)
+        calibration = await calibration_service.get_user_calibration(user_email)
+        bundle = await model_registry.get_bundle()
+        model_result = await run_cpu(prediction_service.predict_days_until_forget, model_payload, bundle)
+        result = calibration.apply(model_result)
         
         # Validate prediction result
         if result is None or (isinstance(result, float) and (result < 0 or result > 1000)):
-            print(f"[PREDICT API] Warning: Unusual prediction value: {result}")
+            logger.warning("Unusual prediction value: %s", result)
 
         # Try to save to MongoDB, but don't fail if it's not available
+        prediction_id = None
         try:
-            save_prediction(user_email, model_payload, result)
+            with stage("mongo_write"):
+                prediction_id = await save_prediction(user_email, model_payload, result, model_result, bundle.version)
         except Exception as db_error:
-            print(f"[PREDICT API] MongoDB save failed (non-critical): {db_error}")
+            logger.warning("MongoDB save failed (non-critical): %s", db_error)
             # Continue without saving to DB
 
         return {
             "status": "success",
-            "prediction": result
+            "prediction": result,
+            "model_prediction": model_result,
+            "model_version": bundle.version,
+            "prediction_id": prediction_id,
         }
     except ValueError as ve:
-        print(f"[PREDICT API] Validation error: {ve}")
-        import traceback
-        traceback.print_exc()
+        count_error("predict")
+        logger.warning("Validation error: %s", ve)
         return {
             "status": "error",
             "message": str(ve),
             "prediction": None
         }
     except Exception as e:
-        print(f"[PREDICT API] Error: {e}")
-        import traceback
-        traceback.print_exc()
+        count_error("predict")
+        logger.exception("Prediction failed: %s", e)
         return {
             "status": "error",
             "message": f"Prediction failed: {str(e)}",
@@ -94,11 +163,184 @@ def predict_api(data: MemoryInput):
         }
 
 
+@router.post("/batch")
+async def predict_batch_api(data: BatchMemoryInput):
+    if not data.items:
+        return {"status": "error", "message": "No items supplied", "results": []}
+    if len(data.items) > MAX_BATCH_SIZE:
+        return {
+            "status": "error",
+            "message": f"Batch too large: {len(data.items)} items (max {MAX_BATCH_SIZE})",
+            "results": []
+        }
+
+    # Validate every row on its own so one bad row doesn't sink the batch
+    results: List[Optional[dict]] = [None] * len(data.items)
+    valid_indices = []
+    valid_payloads = []
+    with stage("validation"):
+        for index, item in enumerate(data.items):
+            try:
+                row = MemoryInput(**{**item, "email": data.email}).model_dump()
+            except ValidationError as ve:
+                results[index] = {"index": index, "status": "error", "message": _format_validation_error(ve), "prediction": None}
+                continue
+
+            model_payload, error = _validate_payload(row)
+            if error:
+                results[index] = {"index": index, "status": "error", "message": error, "prediction": None}
+                continue
+
+            valid_indices.append(index)
+            valid_payloads.append(model_payload)
+
+    if valid_payloads:
+        calibration = await calibration_service.get_user_calibration(data.email)
+        try:
+            bundle = await model_registry.get_bundle()
+            model_predictions = await run_cpu(prediction_service.predict_batch, valid_payloads, bundle)
+        except Exception as e:
+            count_error("predict_batch")
+            logger.exception("Batch prediction failed: %s", e)
+            return {
+                "status": "error",
+                "message": f"Prediction failed: {str(e)}",
+                "results": []
+            }
+
+        predictions = [calibration.apply(value) for value in model_predictions]
+        for index, prediction in zip(valid_indices, predictions):
+            results[index] = {"index": index, "status": "success", "prediction": prediction}
+
+        # Try to save to MongoDB, but don't fail if it's not available
+        try:
+            with stage("mongo_write"):
+                await save_predictions(data.email, list(zip(valid_payloads, predictions, model_predictions)), bundle.version)
+        except Exception as db_error:
+            logger.warning("Batch MongoDB save failed (non-critical): %s", db_error)
+
+    failed = len(data.items) - len(valid_payloads)
+    if not failed:
+        status = "success"
+    elif valid_payloads:
+        status = "partial"
+    else:
+        status = "error"
+
+    return {
+        "status": status,
+        "model_version": bundle.version if valid_payloads else None,
+        "succeeded": len(valid_payloads),
+        "failed": failed,
+        "results": results
+    }
+
+
+@router.post("/schedule")
+async def schedule_api(data: ScheduleInput):
+    """Simulate ``steps`` reviews of every topic and return the resulting review calendar."""
+    if not 1 <= data.steps <= schedule_service.SCHEDULE_MAX_STEPS:
+        return {"status": "error", "message": f"steps must be between 1 and {schedule_service.SCHEDULE_MAX_STEPS}"}
+
+    if data.topics is not None:
+        topics = data.topics
+    else:
+        try:
+            topics = await get_latest_payloads(data.email, limit=MAX_BATCH_SIZE)
+        except Exception as e:
+            logger.warning("Schedule MongoDB read failed: %s", e)
+            return {"status": "error", "message": "Unable to load your topics"}
+
+    if not topics:
+        return {"status": "error", "message": "No topics to schedule"}
+    if len(topics) > MAX_BATCH_SIZE:
+        return {"status": "error", "message": f"At most {MAX_BATCH_SIZE} topics per schedule"}
+
+    payloads = []
+    for index, item in enumerate(topics):
+        if not isinstance(item, dict):
+            return {"status": "error", "message": f"topics[{index}]: must be an object"}
+        model_payload, error = _validate_payload(dict(item))
+        if error:
+            return {"status": "error", "message": f"topics[{index}]: {error}"}
+        payloads.append(model_payload)
+
+    calibration = await calibration_service.get_user_calibration(data.email)
+    try:
+        bundle = await model_registry.get_bundle()
+        schedule = await run_cpu(schedule_service.build_schedule, payloads, data.steps, data.start_date,
+                                 data.confidence_step, calibration, bundle)
+    except Exception as e:
+        count_error("schedule")
+        logger.exception("Schedule failed: %s", e)
+        return {"status": "error", "message": f"Scheduling failed: {str(e)}"}
+
+    return {"status": "success", **schedule}
+
+
+@router.post("/outcome")
+async def outcome_api(data: OutcomeInput):
+    """Record when a topic was actually forgotten and update the user's calibration."""
+    model_days = data.model_prediction
+    actual_days = data.actual_days
+
+    if data.prediction_id:
+        try:
+            stored = await get_prediction(data.email, data.prediction_id)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid prediction_id")
+        if stored is None:
+            return {"status": "error", "message": "Prediction not found"}
+        model_days = stored.get("model_prediction", stored.get("prediction"))
+        if actual_days is None and stored.get("created_at"):
+            actual_days = (datetime.utcnow() - stored["created_at"]).total_seconds() / 86400
+
+    if model_days is None or actual_days is None:
+        return {"status": "error", "message": "Give a prediction_id, or model_prediction and actual_days"}
+    if not 0 <= actual_days <= MAX_OUTCOME_DAYS:
+        return {"status": "error", "message": f"actual_days must be between 0 and {MAX_OUTCOME_DAYS}"}
+
+    try:
+        calibration = await calibration_service.record_outcome(data.email, model_days, actual_days)
+    except Exception as e:
+        logger.warning("Outcome MongoDB update failed: %s", e)
+        calibration = None
+    if calibration is None:
+        return {"status": "error", "message": "Unable to save the outcome right now"}
+
+    return {"status": "success", "calibration": calibration.to_dict()}
+
+
+@router.get("/model")
+async def model_api():
+    """The model version currently serving predictions."""
+    bundle = await model_registry.get_bundle()
+    return {"status": "success", "model": bundle.info()}
+
+
+# Operational stats: same X-Admin-Token as /api/admin
+@router.get("/cache/stats", dependencies=[Depends(require_admin)])
+async def prediction_cache_api():
+    return {
+        "status": "success",
+        "cache": prediction_service.prediction_cache_stats(),
+        "calibration": calibration_service.calibration_cache_stats(),
+    }
+
+
+@router.get("/shadow/stats", dependencies=[Depends(require_admin)])
+async def shadow_stats_api():
+    """How a candidate model's predictions compare with the served ones on live traffic."""
+    return {"status": "success", "shadow": prediction_service.shadow_stats()}
+
+
 @router.get("/history/{email}")
-def prediction_history(email: str, limit: int = 10):
+async def prediction_history(email: str, limit: int = 10, before: Optional[str] = None, after: Optional[str] = None):
     try:
-        history = get_predictions(email, limit=limit)
-        return {"status": "success", "history": history}
+        history, next_cursor = await get_predictions(email, limit=limit, before=before, after=after)
+        return {"status": "success", "history": history, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"[PREDICT HISTORY] Error: {e}")
+        logger.exception("History read failed: %s", e)
         return {"status": "error", "history": [], "message": "Unable to load history"}
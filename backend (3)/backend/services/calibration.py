@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from .log import get_logger
+
+# Users whose calibration is kept in memory
+CALIBRATION_CACHE_SIZE = int(os.getenv("CALIBRATION_CACHE_SIZE", "10000"))
+# Seconds before a cached calibration is read again (outcomes recorded by other workers show up within this; 0 = never)
+CALIBRATION_CACHE_TTL = float(os.getenv("CALIBRATION_CACHE_TTL", "60"))
+# Pseudo-observations pulling the fit towards "trust the global model" (a=0, b=1)
+CALIBRATION_PRIOR = float(os.getenv("CALIBRATION_PRIOR", "5"))
+# Per-outcome decay of older outcomes (1 = never forget)
+CALIBRATION_DECAY = float(os.getenv("CALIBRATION_DECAY", "0.98"))
+# Limits on the fitted slope, so a few odd outcomes can't flip or explode predictions
+SLOPE_MIN, SLOPE_MAX = 0.25, 4.0
+
+logger = get_logger(__name__)
+
+
+class Calibration:
+    """Per-user linear correction ``days = a + b * model_days`` from running sums.
+
+    The sums (``n``, Σx, Σy, Σx², Σxy, exponentially decayed) are all that is
+    stored, so updating is O(1) and applying is one multiply-add. The
+    least-squares fit is blended with the identity by ``n / (n + prior)``:
+    a user with no outcomes gets the global model unchanged.
+    """
+
+    __slots__ = ("n", "sx", "sy", "sxx", "sxy", "intercept", "slope")
+
+    def __init__(self, n=0.0, sx=0.0, sy=0.0, sxx=0.0, sxy=0.0, prior: float = CALIBRATION_PRIOR):
+        self.n, self.sx, self.sy, self.sxx, self.sxy = float(n), float(sx), float(sy), float(sxx), float(sxy)
+        self.intercept, self.slope = self._fit(prior)
+
+    @classmethod
+    def from_doc(cls, doc: Optional[dict]) -> "Calibration":
+        if not doc:
+            return IDENTITY
+        return cls(*(doc.get(field, 0.0) for field in ("n", "sx", "sy", "sxx", "sxy")))
+
+    def _fit(self, prior: float):
+        n = self.n
+        if n <= 0:
+            return 0.0, 1.0
+
+        mean_x, mean_y = self.sx / n, self.sy / n
+        var_x = self.sxx / n - mean_x * mean_x
+        if n >= 2 and var_x > 1e-9:
+            slope = (self.sxy / n - mean_x * mean_y) / var_x
+            slope = min(max(slope, SLOPE_MIN), SLOPE_MAX)
+            intercept = mean_y - slope * mean_x
+        else:
+            # Not enough spread to fit a slope: shift by the mean error only
+            slope, intercept = 1.0, mean_y - mean_x
+
+        weight = n / (n + prior)
+        return weight * intercept, weight * slope + (1.0 - weight)
+
+    @property
+    def is_identity(self) -> bool:
+        return self.intercept == 0.0 and self.slope == 1.0
+
+    def apply(self, days):
+        """Calibrate a prediction (float or array); never negative."""
+        if self.is_identity:
+            return days
+        if isinstance(days, np.ndarray):
+            return np.maximum(self.intercept + self.slope * days, 0.0)
+        return round(max(self.intercept + self.slope * float(days), 0.0), 2)
+
+    def to_dict(self) -> dict:
+        return {
+            "samples": round(self.n, 2),
+            "intercept": round(self.intercept, 4),
+            "slope": round(self.slope, 4),
+        }
+
+
+IDENTITY = Calibration()
+
+
+class CalibrationCache:
+    """LRU + TTL of ``email -> Calibration``; users without outcomes are cached as ``IDENTITY``.
+
+    An outcome updates the cache of the worker that recorded it; the TTL
+    bounds how long the other workers keep serving the previous fit.
+    """
+
+    def __init__(self, max_size: int = CALIBRATION_CACHE_SIZE, ttl: float = CALIBRATION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, email: str) -> Optional[Calibration]:
+        with self._lock:
+            entry = self._data.get(email)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            calibration, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[email]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(email)
+            self.hits += 1
+            return calibration
+
+    def put(self, email: str, calibration: Calibration) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._data[email] = (calibration, expires_at)
+            self._data.move_to_end(email)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+CALIBRATIONS = CalibrationCache()
+
+
+async def get_user_calibration(email: Optional[str]) -> Calibration:
+    """The user's calibration, from memory or one MongoDB read; identity if unknown or unavailable."""
+    if not email:
+        return IDENTITY
+    email = email.lower()
+    calibration = CALIBRATIONS.get(email)
+    if calibration is not None:
+        return calibration
+
+    from db.calibration_model import get_calibration
+
+    try:
+        doc = await get_calibration(email)
+    except Exception as e:
+        logger.warning("MongoDB read failed (non-critical): %s", e)
+        return IDENTITY
+    if doc is None:
+        # MongoDB unavailable - don't cache, look again next time
+        return IDENTITY
+    calibration = Calibration.from_doc(doc)
+    CALIBRATIONS.put(email, calibration)
+    return calibration
+
+
+async def record_outcome(email: str, model_days: float, actual_days: float) -> Optional[Calibration]:
+    """Fold an observed outcome into the user's calibration; ``None`` if MongoDB is unavailable."""
+    from db.calibration_model import add_observation
+
+    email = email.lower()
+    doc = await add_observation(email, float(model_days), float(actual_days), CALIBRATION_DECAY)
+    if doc is None:
+        return None
+    calibration = Calibration.from_doc(doc)
+    CALIBRATIONS.put(email, calibration)
+    return calibration
+
+
+def calibration_cache_stats() -> dict:
+    return CALIBRATIONS.stats()
@@ -0,0 +1,289 @@
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+# Prompt budget (estimated tokens) for system prompt + summary + history + new message
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+# Of that budget, at most this much goes to the summary of older turns
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "250"))
+# Messages (user + assistant) kept per user in memory
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "40"))
+# Users whose conversations are kept in memory (least recently active dropped first)
+CHAT_CONTEXT_USERS = int(os.getenv("CHAT_CONTEXT_USERS", "2048"))
+# After this many idle seconds a message starts a new conversation (no history sent)
+CHAT_CONTEXT_IDLE = float(os.getenv("CHAT_CONTEXT_IDLE", "1800"))
+# Before each reply, check Mongo for messages another worker saved and reload the history if
+# there are any (0 = trust this process's memory: a single worker or sticky sessions)
+CHAT_CONTEXT_SYNC = os.getenv("CHAT_CONTEXT_SYNC", "1") != "0"
+
+# Per-message framing overhead in chat-completion prompts
+_MESSAGE_OVERHEAD = 4
+_GIST_WORDS = 24
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+_ROLES = {"user": "user", "bot": "assistant", "assistant": "assistant"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English), plus framing overhead."""
+    return math.ceil(len(text) / 4) + _MESSAGE_OVERHEAD
+
+
+def _gist(role: str, text: str) -> str:
+    """First sentence of a message, capped at a few dozen words."""
+    first = _SENTENCE_RE.split(text.strip(), maxsplit=1)[0]
+    words = first.split()
+    if len(words) > _GIST_WORDS:
+        first = " ".join(words[:_GIST_WORDS]) + "…"
+    speaker = "Student" if role == "user" else "Assistant"
+    return f"{speaker}: {first}"
+
+
+class _Turn:
+    __slots__ = ("role", "content", "tokens", "gist", "id")
+
+    def __init__(self, role: str, content: str, doc_id=None):
+        self.role = role
+        self.content = content
+        self.id = doc_id  # the chat_history _id, when it was saved
+        self.tokens = estimate_tokens(content)
+        self.gist = _gist(role, content)
+
+
+class Conversation:
+    """One user's recent turns plus an extractive summary of what rolled off.
+
+    The ring buffer holds at most ``max_turns`` messages; each message that
+    falls out of it contributes its gist (first sentence) to the summary,
+    whose own size is capped at ``summary_tokens``. ``window`` therefore
+    costs O(max_turns) and never touches the database.
+    """
+
+    def __init__(self, max_turns: int = CHAT_CONTEXT_TURNS, summary_tokens: int = CHAT_SUMMARY_TOKENS):
+        self.turns = deque()
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self._rolled = deque()  # gists of turns no longer in the buffer, oldest first
+        self._rolled_tokens = 0
+        self.last_active = 0.0
+        self._lock = threading.Lock()
+
+    def _roll_off(self, turn: _Turn) -> None:
+        self._rolled.append(turn.gist)
+        self._rolled_tokens += estimate_tokens(turn.gist)
+        while self._rolled and self._rolled_tokens > self.summary_tokens:
+            self._rolled_tokens -= estimate_tokens(self._rolled.popleft())
+
+    def append(self, role: str, content: str, at: Optional[float] = None, doc_id=None) -> None:
+        with self._lock:
+            if len(self.turns) >= self.max_turns:
+                self._roll_off(self.turns.popleft())
+            self.turns.append(_Turn(_ROLES.get(role, role), content, doc_id))
+            self.last_active = at if at is not None else time.time()
+
+    def record(self, user_message: str, reply: str, ids: Tuple = (None, None)) -> None:
+        self.append("user", user_message, doc_id=ids[0])
+        self.append("assistant", reply, doc_id=ids[1])
+
+    def has_id(self, doc_id) -> bool:
+        with self._lock:
+            return any(turn.id == doc_id for turn in self.turns)
+
+    def keep_unsaved(self, previous: "Conversation") -> None:
+        """Carry over ``previous``'s turns that are newer than anything loaded (still in the write buffer)."""
+        with self._lock:
+            loaded = [turn.id for turn in self.turns if turn.id is not None]
+        newest = max(loaded) if loaded else None
+        with previous._lock:
+            pending = [t for t in previous.turns if t.id is not None and t.id not in loaded and (newest is None or t.id > newest)]
+            last_active = previous.last_active
+        for turn in pending:
+            self.append(turn.role, turn.content, at=last_active, doc_id=turn.id)
+
+    def is_idle(self, now: Optional[float] = None, idle_after: float = CHAT_CONTEXT_IDLE) -> bool:
+        now = now if now is not None else time.time()
+        return not self.turns or (idle_after > 0 and now - self.last_active > idle_after)
+
+    def window(self, budget: int) -> List[dict]:
+        """History messages (oldest first) that fit in ``budget`` estimated tokens.
+
+        The newest turns are kept verbatim; anything older that doesn't fit is
+        represented by a summary system message placed before them.
+        """
+        with self._lock:
+            turns = list(self.turns)
+            rolled = list(self._rolled)
+
+        kept = []
+        used = 0
+        verbatim_budget = budget - min(self.summary_tokens, budget // 4)
+        for i in range(len(turns) - 1, -1, -1):
+            if used + turns[i].tokens > verbatim_budget:
+                break
+            kept.append(turns[i])
+            used += turns[i].tokens
+        kept.reverse()
+        # Start on a student message so the model never sees a dangling reply
+        while kept and kept[0].role != "user":
+            used -= kept.pop(0).tokens
+
+        dropped = turns[: len(turns) - len(kept)]
+        gists = rolled + [turn.gist for turn in dropped]
+        summary_budget = min(self.summary_tokens, budget - used)
+        lines = []
+        for gist in reversed(gists):
+            cost = estimate_tokens(gist)
+            if summary_budget - cost < _MESSAGE_OVERHEAD:
+                break
+            lines.append(gist)
+            summary_budget -= cost
+        lines.reverse()
+
+        messages = []
+        if lines:
+            messages.append({
+                "role": "system",
+                "content": "Summary of earlier conversation:\n" + "\n".join(lines),
+            })
+        messages.extend({"role": turn.role, "content": turn.content} for turn in kept)
+        return messages
+
+    def clear(self) -> None:
+        with self._lock:
+            self.turns.clear()
+            self._rolled.clear()
+            self._rolled_tokens = 0
+
+
+class ConversationStore:
+    """LRU of per-user ``Conversation``s, hydrated from Mongo.
+
+    Each worker process has its own store, and one user's messages land on
+    whichever worker is free. With ``sync`` on, every ``get`` first looks up
+    the user's newest ``chat_history`` id (one index probe); if this worker
+    hasn't seen it, another worker has answered since, and the history is
+    read again rather than sent with turns missing.
+    """
+
+    def __init__(self, max_users: int = CHAT_CONTEXT_USERS, max_turns: int = CHAT_CONTEXT_TURNS,
+                 summary_tokens: int = CHAT_SUMMARY_TOKENS, loader=None, latest=None,
+                 sync: bool = CHAT_CONTEXT_SYNC):
+        self.max_users = max_users
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        # async (email, limit) -> list of {"_id", "sender", "message"} oldest first
+        self.loader = loader
+        # async (email) -> newest chat_history _id for the user, or None
+        self.latest = latest
+        self.sync = sync
+        self._data = OrderedDict()
+        self._pending = {}
+        self.hydrations = 0
+        self.resyncs = 0
+        self.evictions = 0
+
+    async def _hydrate(self, email: str) -> Conversation:
+        conversation = Conversation(self.max_turns, self.summary_tokens)
+        loader = self.loader
+        if loader is None:
+            from db.chat_model import get_recent_messages as loader
+
+        docs = await loader(email, self.max_turns)
+        for doc in docs:
+            doc_id = doc.get("_id")
+            at = doc_id.generation_time.timestamp() if hasattr(doc_id, "generation_time") else None
+            conversation.append(doc.get("sender", "user"), doc.get("message") or "", at=at, doc_id=doc_id)
+        self.hydrations += 1
+        return conversation
+
+    async def _stale(self, email: str, conversation: Conversation) -> bool:
+        if not self.sync:
+            return False
+        latest = self.latest
+        if latest is None:
+            from db.chat_model import get_latest_message_id as latest
+
+        newest = await latest(email)
+        return newest is not None and not conversation.has_id(newest)
+
+    async def get(self, email: str) -> Conversation:
+        cached = self._data.get(email)
+        if cached is not None:
+            self._data.move_to_end(email)
+            if not await self._stale(email, cached):
+                return cached
+
+        # Concurrent messages from one user share a single Mongo read
+        task = self._pending.get(email)
+        if task is None:
+            task = asyncio.ensure_future(self._hydrate(email))
+            self._pending[email] = task
+        try:
+            conversation = await task
+        finally:
+            self._pending.pop(email, None)
+
+        existing = self._data.get(email)
+        if existing is not None and existing is not cached:
+            return existing  # another request stored it while we waited
+        if cached is not None:
+            conversation.keep_unsaved(cached)
+            self.resyncs += 1
+        self._data[email] = conversation
+        self._data.move_to_end(email)
+        while len(self._data) > self.max_users:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return conversation
+
+    def peek(self, email: str) -> Optional[Conversation]:
+        """The conversation already in memory, without a Mongo round trip."""
+        return self._data.get(email)
+
+    def drop(self, email: str) -> None:
+        self._data.pop(email, None)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._data),
+            "max_users": self.max_users,
+            "max_turns": self.max_turns,
+            "token_budget": CHAT_CONTEXT_TOKENS,
+            "hydrations": self.hydrations,
+            "resyncs": self.resyncs,
+            "sync": self.sync,
+            "evictions": self.evictions,
+        }
+
+
+CONVERSATIONS = ConversationStore()
+
+
+async def get_history(email: str, user_message: str, system_prompt: str,
+                      budget: int = CHAT_CONTEXT_TOKENS) -> List[dict]:
+    """Prompt history for ``email``'s next message; empty when the conversation went idle."""
+    conversation = await CONVERSATIONS.get(email)
+    if conversation.is_idle():
+        # New session: earlier turns are left out, so the message shares cache entries with standalone questions
+        conversation.clear()
+        return []
+    remaining = budget - estimate_tokens(system_prompt) - estimate_tokens(user_message)
+    if remaining <= 0:
+        return []
+    return conversation.window(remaining)
+
+
+async def record_exchange(email: str, user_message: str, reply: str, ids: Tuple = (None, None)) -> None:
+    """Add an answered exchange; ``ids`` are its saved ``chat_history`` ids, so a resync recognises them."""
+    # No resync here: the newest saved ids are this exchange's own
+    conversation = CONVERSATIONS.peek(email) or await CONVERSATIONS.get(email)
+    conversation.record(user_message, reply, ids)
+
+
+def chat_context_stats() -> dict:
+    return CONVERSATIONS.stats()
@@ -1,10 +1,48 @@
+import hashlib
+import json
 import os
-from groq import Groq
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from groq import AsyncGroq
 from dotenv import load_dotenv
 from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from .executor import run_cpu
+from .log import get_logger
+from .metrics import count_error, stage
+from .rate_limit import llm_slot
 
 load_dotenv()
 
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+# Point the Groq client at any compatible server (e.g. benchmarks/fake_llm.py)
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+
+SYSTEM_PROMPT = (
+    "You are a friendly helpful study assistant. "
+    "Explain concepts clearly and simply."
+)
+FALLBACK_REPLY = "Sorry, I couldn’t process your message. Try again."
+
+# Response cache (size 0 disables it)
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1024"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "86400"))
+# Optional nearest-neighbour matching over embeddings from a small local model,
+# e.g. sentence-transformers/all-MiniLM-L6-v2 (needs transformers + torch: requirements-semantic.txt)
+CHAT_SEMANTIC_MODEL = os.getenv("CHAT_SEMANTIC_MODEL") or None
+CHAT_SEMANTIC_THRESHOLD = float(os.getenv("CHAT_SEMANTIC_THRESHOLD", "0.92"))
+
+logger = get_logger(__name__)
+
+_LLM_CLIENT = None
+
+
 @lru_cache(maxsize=1)
 def get_groq_client():
     api_key = os.getenv("GROQ_API_KEY")
@@ -13,35 +51,339 @@ def get_groq_client():
             "❌ GROQ_API_KEY not found in .env file.\n"
             "Create a free key at https://console.groq.com"
         )
-    return Groq(api_key=api_key)
+    return AsyncGroq(api_key=api_key, base_url=LLM_BASE_URL)
+
+
+def set_llm_client(client) -> None:
+    """Swap the LLM client (anything with an async ``chat.completions.create``); ``None`` restores Groq."""
+    global _LLM_CLIENT
+    _LLM_CLIENT = client
+
+
+def get_llm_client():
+    return _LLM_CLIENT if _LLM_CLIENT is not None else get_groq_client()
+
+
+# -----------------------------
+# Response cache
+# -----------------------------
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Canonical form used as the exact-match key: case, spacing and trailing punctuation ignored."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.rstrip("?!.,;: ")
+
+
+class LocalEmbedder:
+    """Mean-pooled, L2-normalised sentence embeddings from a small local transformer."""
+
+    def __init__(self, model_name: str, max_length: int = 128):
+        self.model_name = model_name
+        self.max_length = max_length
+        self._tokenizer = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from transformers import AutoModel, AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModel.from_pretrained(self.model_name).eval()
+
+    def embed(self, text: str) -> np.ndarray:
+        import torch
+
+        if self._model is None:
+            self._load()
+        with torch.no_grad():
+            inputs = self._tokenizer(text, truncation=True, max_length=self.max_length, return_tensors="pt")
+            hidden = self._model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            vector = torch.nn.functional.normalize(pooled, dim=1)[0]
+        return vector.numpy().astype(np.float32)
+
+
+class ResponseCache:
+    """LRU + TTL cache of assistant replies.
+
+    Exact hits match on ``normalize_prompt``. With an embedder, a miss falls
+    back to the most similar cached prompt (cosine similarity over unit
+    vectors) when it clears ``threshold``.
+    """
+
+    def __init__(self, max_size: int, ttl: float, embedder=None, threshold: float = CHAT_SEMANTIC_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.embedder = embedder
+        self.threshold = threshold
+        self._data = OrderedDict()  # normalized prompt -> (reply, expires_at, vector)
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._matrix_keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypassed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _expired(self, expires_at: float) -> bool:
+        return bool(expires_at) and expires_at < time.monotonic()
+
+    def _drop(self, key) -> None:
+        del self._data[key]
+        self._matrix = None
+
+    def _nearest(self, vector):
+        if self._matrix is None:
+            self._matrix_keys = [k for k, entry in self._data.items() if entry[2] is not None]
+            self._matrix = (
+                np.stack([self._data[k][2] for k in self._matrix_keys]) if self._matrix_keys else None
+            )
+        if self._matrix is None:
+            return None, 0.0
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        return self._matrix_keys[best], float(scores[best])
+
+    async def embed(self, key: str):
+        if self.embedder is None:
+            return None
+        try:
+            return await run_cpu(self.embedder.embed, key)
+        except Exception as e:
+            logger.warning("Embedding failed, semantic matching disabled: %s", e)
+            self.embedder = None
+            return None
+
+    def get(self, key: str, vector=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._expired(entry[1]):
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0]
+
+            if vector is not None:
+                match, score = self._nearest(vector)
+                if match is not None and score >= self.threshold:
+                    reply, expires_at, _ = self._data[match]
+                    if not self._expired(expires_at):
+                        self._data.move_to_end(match)
+                        self.semantic_hits += 1
+                        return reply
+                    self._drop(match)
+                    self.expirations += 1
+
+            self.misses += 1
+            return None
 
+    def put(self, key: str, reply: str, vector=None) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._data[key] = (reply, expires_at, vector)
+            self._data.move_to_end(key)
+            self._matrix = None
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
 
-def chat_with_ai(user_message: str) -> str:
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "semantic": self.embedder is not None,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+RESPONSE_CACHE = ResponseCache(
+    CHAT_CACHE_SIZE,
+    CHAT_CACHE_TTL,
+    embedder=LocalEmbedder(CHAT_SEMANTIC_MODEL) if CHAT_SEMANTIC_MODEL else None,
+)
+
+
+def _cache_key(user_message: str, history: Optional[list] = None) -> str:
+    """``normalize_prompt`` of the message, plus a digest of the history sent with it.
+
+    The same follow-up after the same earlier turns (e.g. students working
+    through the same opening question) shares an entry; after different
+    turns it doesn't, since the reply depends on them.
+    """
+    key = normalize_prompt(user_message)
+    if history:
+        digest = hashlib.sha256(json.dumps(history, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        key = f"{key}\n#context:{digest}"
+    return key
+
+
+async def _cache_lookup(user_message: str, use_cache: bool, history: Optional[list] = None):
+    """Return ``(cached_reply, key, vector)``; key is ``None`` when caching is off for this call."""
+    if not RESPONSE_CACHE.enabled:
+        return None, None, None
+    if not use_cache:
+        RESPONSE_CACHE.record_bypass()
+        return None, None, None
+
+    key = _cache_key(user_message, history)
+    reply = RESPONSE_CACHE.get(key)
+    if reply is not None or history:
+        # Similar wording is only a match for standalone messages; in context the turns matter too
+        return reply, key, None
+
+    vector = await RESPONSE_CACHE.embed(key)
+    if vector is not None:
+        reply = RESPONSE_CACHE.get(key, vector)
+    return reply, key, vector
+
+
+def chat_cache_stats() -> dict:
+    return RESPONSE_CACHE.stats()
+
+
+def _build_messages(user_message: str, history: Optional[list] = None) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *(history or []),
+        {"role": "user", "content": user_message},
+    ]
+
+
+async def chat_with_ai(user_message: str, use_cache: bool = True, history: Optional[list] = None) -> str:
+    """Reply to ``user_message``; ``history`` is earlier turns from ``services.chat_context``.
+
+    The response cache is keyed on the message and that history together.
+    A cache miss waits for an LLM slot and raises ``LLMBusy`` if none frees up.
+    """
     if not user_message.strip():
         return "Please type a message."
 
-    client = get_groq_client()
-
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a friendly helpful study assistant. "
-                        "Explain concepts clearly and simply."
-                    ),
-                },
-                {"role": "user", "content": user_message},
-            ],
-            max_tokens=300,
-            temperature=0.7,
-        )
+    cached, key, vector = await _cache_lookup(user_message, use_cache, history)
+    if cached is not None:
+        return cached
+
+    client = get_llm_client()
+
+    async with llm_slot():
+        try:
+            with stage("llm"):
+                response = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=_build_messages(user_message, history),
+                    max_tokens=300,
+                    temperature=0.7,
+                )
+
+            # ✅ FIX: Extract content correctly
+            reply = response.choices[0].message.content.strip()
+            if key is not None and reply:
+                RESPONSE_CACHE.put(key, reply, vector)
+            return reply
+
+        except Exception as e:
+            count_error("llm")
+            logger.error("Groq chat error: %s", e)
+            return FALLBACK_REPLY
+
+
+async def stream_chat(user_message: str, use_cache: bool = True, history: Optional[list] = None):
+    """Yield reply text deltas as the LLM produces them (a cached reply comes as one delta).
+
+    An LLM slot is held until the stream ends; raises ``LLMBusy`` before the first delta if none frees up.
+    """
+    cached, key, vector = await _cache_lookup(user_message, use_cache, history)
+    if cached is not None:
+        yield cached
+        return
+
+    client = get_llm_client()
+    parts = []
+
+    async with llm_slot():
+        # Until the LLM starts responding; the rest of the stream is paced by the reader
+        with stage("llm_stream_start"):
+            stream = await client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=_build_messages(user_message, history),
+                max_tokens=300,
+                temperature=0.7,
+                stream=True,
+            )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    reply = "".join(parts).strip()
+    if key is not None and reply:
+        RESPONSE_CACHE.put(key, reply, vector)
+
+
+class StreamStats:
+    """Running time-to-first-token / total-time figures for streamed replies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.errors = 0
+        self.ttft_total = 0.0
+        self.ttft_max = 0.0
+        self.duration_total = 0.0
+
+    def record(self, ttft: float, duration: float) -> None:
+        with self._lock:
+            self.streams += 1
+            self.ttft_total += ttft
+            self.ttft_max = max(self.ttft_max, ttft)
+            self.duration_total += duration
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = self.streams
+            return {
+                "streams": n,
+                "errors": self.errors,
+                "avg_ttft_ms": round(self.ttft_total / n * 1000, 1) if n else None,
+                "max_ttft_ms": round(self.ttft_max * 1000, 1) if n else None,
+                "avg_duration_ms": round(self.duration_total / n * 1000, 1) if n else None,
+            }
 
-        # ✅ FIX: Extract content correctly
-        return response.choices[0].message.content.strip()
 
-    except Exception as e:
-        print(f"[GROQ CHAT ERROR] {e}")
-        return "Sorry, I couldn’t process your message. Try again."
+STREAM_STATS = StreamStats()
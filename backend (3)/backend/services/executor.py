@@ -0,0 +1,37 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads for CPU-bound request work (bcrypt, model predict). Both
+# release the GIL, so threads give real parallelism; keeping the pool small
+# and separate from the default threadpool stops a burst of predictions or
+# logins from starving everything else.
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_EXECUTOR = None
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+    return _EXECUTOR
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run ``func`` on the bounded CPU executor without blocking the event loop.
+
+    Context variables (the request id for logging) carry over to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_cpu_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_executor() -> None:
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
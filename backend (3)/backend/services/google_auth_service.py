@@ -0,0 +1,208 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Google's signing certs as {key id: PEM}, the format google-auth verifies against
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+# When set, tokens must be issued for this OAuth client ("aud" claim)
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID") or None
+# How long an already-verified token is trusted without re-checking its signature
+VERIFIED_TOKEN_TTL = float(os.getenv("GOOGLE_VERIFIED_TOKEN_TTL", "300"))
+VERIFIED_TOKEN_MAX = int(os.getenv("GOOGLE_VERIFIED_TOKEN_MAX", "1024"))
+# Minimum seconds between fetches forced by an unknown key id (anyone can send a made-up "kid")
+CERT_MIN_REFRESH_INTERVAL = float(os.getenv("GOOGLE_CERT_MIN_REFRESH_INTERVAL", "60"))
+
+# Used when the cert response has no usable Cache-Control max-age
+DEFAULT_CERT_MAX_AGE = 3600.0
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class CertSource:
+    """Where signing certs come from. ``fetch`` returns ``(certs, max_age_seconds)``."""
+
+    def fetch(self) -> Tuple[dict, Optional[float]]:
+        raise NotImplementedError
+
+
+class HttpCertSource(CertSource):
+    """Fetch certs over a pooled ``requests.Session``, honouring Cache-Control max-age."""
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, timeout: float = 5.0):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self) -> Tuple[dict, Optional[float]]:
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+        return response.json(), float(match.group(1)) if match else None
+
+
+class StaticCertSource(CertSource):
+    def __init__(self, certs: dict, max_age: Optional[float] = None):
+        self.certs = certs
+        self.max_age = max_age
+
+    def fetch(self) -> Tuple[dict, Optional[float]]:
+        return dict(self.certs), self.max_age
+
+
+class CertCache:
+    """Holds the current certs until their max-age runs out.
+
+    A forced refresh (a token signed with a key we don't know) refetches at
+    most once per ``min_refresh_interval``; in between, the cached certs are
+    returned and the token fails verification without touching Google.
+    """
+
+    def __init__(self, source: CertSource, min_refresh_interval: float = CERT_MIN_REFRESH_INTERVAL):
+        self.source = source
+        self.min_refresh_interval = min_refresh_interval
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.throttled_refreshes = 0
+
+    def _fresh(self, force_refresh: bool) -> bool:
+        if self._certs is None:
+            return False
+        now = time.monotonic()
+        if force_refresh:
+            return now - self._fetched_at < self.min_refresh_interval
+        return now < self._expires_at
+
+    def get(self, force_refresh: bool = False) -> dict:
+        if self._fresh(force_refresh):
+            if force_refresh:
+                self.throttled_refreshes += 1
+            return self._certs
+
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if self._fresh(force_refresh):
+                return self._certs
+
+            certs, max_age = self.source.fetch()
+            self.fetches += 1
+            self._certs = certs
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + (max_age if max_age is not None else DEFAULT_CERT_MAX_AGE)
+            return certs
+
+
+class GoogleTokenVerifier:
+    """Verify Google ID tokens against cached certs, remembering recent successes.
+
+    Same checks as ``google.oauth2.id_token.verify_oauth2_token`` (signature,
+    expiry, optional audience, issuer). A token that verified recently is
+    served from a small TTL cache keyed on its SHA-256, so retries and
+    double-submits skip the RSA check.
+    """
+
+    def __init__(self, source: CertSource = None, audience: Optional[str] = GOOGLE_CLIENT_ID,
+                 token_ttl: float = VERIFIED_TOKEN_TTL, max_tokens: int = VERIFIED_TOKEN_MAX):
+        self.certs = CertCache(source or HttpCertSource())
+        self.audience = audience
+        self.token_ttl = token_ttl
+        self.max_tokens = max_tokens
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _cached(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._verified.get(key)
+            if entry is None:
+                self.cache_misses += 1
+                return None
+            idinfo, expires_at = entry
+            if expires_at <= time.time():
+                del self._verified[key]
+                self.cache_misses += 1
+                return None
+            self._verified.move_to_end(key)
+            self.cache_hits += 1
+            return dict(idinfo)
+
+    def _remember(self, key: str, idinfo: dict) -> None:
+        if self.token_ttl <= 0 or self.max_tokens <= 0:
+            return
+        # Never trust a token past its own expiry
+        expires_at = min(time.time() + self.token_ttl, float(idinfo.get("exp", 0)))
+        with self._lock:
+            self._verified[key] = (dict(idinfo), expires_at)
+            self._verified.move_to_end(key)
+            while len(self._verified) > self.max_tokens:
+                self._verified.popitem(last=False)
+
+    def verify(self, token: str) -> dict:
+        """Return the token's claims or raise ``ValueError`` if it isn't valid."""
+        from google.auth import jwt
+
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        certs = self.certs.get()
+        # Unknown key id usually means Google rotated keys before our max-age ran out
+        key_id = jwt.decode_header(token).get("kid")
+        if key_id and key_id not in certs:
+            certs = self.certs.get(force_refresh=True)
+
+        idinfo = jwt.decode(token, certs=certs, audience=self.audience)
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer. 'iss' should be one of {GOOGLE_ISSUERS} but is {idinfo.get('iss')!r}")
+
+        self._remember(key, idinfo)
+        return idinfo
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cert_fetches": self.certs.fetches,
+                "cert_refreshes_throttled": self.certs.throttled_refreshes,
+                "verified_cached": len(self._verified),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+            }
+
+
+_VERIFIER = None
+_VERIFIER_LOCK = threading.Lock()
+
+
+def get_verifier() -> GoogleTokenVerifier:
+    global _VERIFIER
+    if _VERIFIER is None:
+        with _VERIFIER_LOCK:
+            if _VERIFIER is None:
+                _VERIFIER = GoogleTokenVerifier()
+    return _VERIFIER
+
+
+def set_cert_source(source: CertSource, audience: Optional[str] = GOOGLE_CLIENT_ID) -> GoogleTokenVerifier:
+    """Swap the cert source (e.g. a local stub in tests); returns the new verifier."""
+    global _VERIFIER
+    with _VERIFIER_LOCK:
+        _VERIFIER = GoogleTokenVerifier(source, audience=audience)
+    return _VERIFIER
+
+
+def verify_google_token(token: str) -> dict:
+    return get_verifier().verify(token)
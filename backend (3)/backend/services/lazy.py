@@ -0,0 +1,43 @@
+"""Deferred imports for the startup path.
+
+``import app`` (and so every serverless cold start) should cost FastAPI and
+pydantic, not numpy, pymongo, groq or the model. Route modules bind the
+heavy service modules through ``lazy_import``; the real import happens on
+the first attribute access, i.e. the first request to a route that needs it.
+
+    prediction_service = lazy_import("services.prediction_service")
+    ...
+    await run_cpu(prediction_service.predict_batch, rows, bundle)
+
+Attribute lookups go to the real module, so monkeypatching it still works.
+"""
+import importlib
+
+
+class LazyModule:
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            # import_module is thread-safe and returns the one module object, so a race is harmless
+            module = self._module = importlib.import_module(self._name)
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r} ({'loaded' if self._module is not None else 'not loaded'})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
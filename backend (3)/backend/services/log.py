@@ -0,0 +1,192 @@
+"""Structured, non-blocking logging.
+
+Modules log through ``get_logger(__name__)``. ``configure_logging`` (called
+from the app's lifespan, i.e. in each worker, and at import by the serverless
+entry point ``api/index.py``) puts a ``QueueHandler`` on the root logger, so a log call only
+builds the record and does ``put_nowait``; a ``QueueListener`` thread
+formats it (one JSON object per line by default) and writes it to stdout.
+If the queue is full the record is dropped and counted - logging never
+makes a request wait.
+
+Each record carries the request id set by ``RequestIdMiddleware``, plus any
+``extra={...}`` fields. High-volume debug events go through
+``debug_sampled`` so only a fraction of them are ever formatted.
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# DEBUG | INFO | WARNING | ERROR
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json (one object per line) | text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of sampled debug events (e.g. per-prediction input dumps) that are logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+# Records waiting for the writer thread before new ones are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def debug_sampled(logger: logging.Logger, msg: str, *args, rate: float = None, **fields) -> None:
+    """``logger.debug`` for one in every ``1 / rate`` calls; free when DEBUG is off."""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < (LOG_SAMPLE_RATE if rate is None else rate):
+        logger.debug(msg, *args, extra={**fields, "sampled": True})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        request_id = getattr(record, "request_id", None)
+        record.rid = f" [{request_id}]" if request_id else ""
+        return super().format(record)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Stamps the request id in the caller's context and never blocks on a full queue."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The writer thread does the formatting (including tracebacks); only
+        # resolve the message here, while its arguments are still current
+        record = copy.copy(record)
+        record.request_id = REQUEST_ID.get()
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[_NonBlockingQueueHandler] = None
+# Process that started the writer thread; a forked child inherits the queue but not the thread
+_listener_pid: Optional[int] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None) -> None:
+    """Route the root logger through the queue (idempotent; ``stream`` defaults to stdout).
+
+    Called again in a forked worker, it replaces the handler and writer
+    thread inherited from the parent, whose thread didn't survive the fork.
+    """
+    global _listener, _handler, _listener_pid
+    with _configure_lock:
+        if _listener is not None:
+            if _listener_pid == os.getpid():
+                return
+            # Records the parent had queued are the parent's to write
+            logging.getLogger().removeHandler(_handler)
+        output = logging.StreamHandler(stream or sys.stdout)
+        if fmt == "text":
+            output.setFormatter(_TextFormatter("%(asctime)s %(levelname)s %(name)s%(rid)s: %(message)s"))
+        else:
+            output.setFormatter(JsonFormatter())
+
+        _handler = _NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(level)
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+def shutdown_logging() -> None:
+    """Write out everything still queued and stop the writer thread."""
+    global _listener, _handler
+    with _configure_lock:
+        if _listener is None:
+            return
+        if _listener_pid == os.getpid():
+            _listener.stop()
+        logging.getLogger().removeHandler(_handler)
+        _listener = None
+        _handler = None
+
+
+def logging_stats() -> dict:
+    handler = _handler
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "queued": handler.queue.qsize() if handler is not None else 0,
+        "dropped": handler.dropped if handler is not None else 0,
+    }
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: take ``X-Request-ID`` from the client (or make one), expose it to logs, echo it back."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == _REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1")
+                if _VALID_REQUEST_ID.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = REQUEST_ID.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + [(_REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUEST_ID.reset(token)
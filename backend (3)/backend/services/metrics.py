@@ -0,0 +1,326 @@
+"""In-process metrics in the Prometheus text format, served at ``/metrics``.
+
+Counters and histograms are updated on the request path, so an update is a
+bisect, a dict lookup and a few additions under one lock. Cache, pool and
+queue figures are gauges read from the existing ``stats()`` functions only
+when ``/metrics`` is scraped. Values are per process: with several workers,
+scrape each one.
+
+    with stage("preprocess"):
+        X = encoder.transform(payload)
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+from .log import get_logger
+
+# 0 turns off the middleware and stage timers (``/metrics`` keeps serving gauges)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Latency buckets in seconds, from a prediction-cache hit to a slow LLM reply
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = get_logger(__name__)
+
+_METRICS: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+        _METRICS.append(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # [per-bucket counts (last = above every bucket), sum, count]
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self, *labels):
+        """``(cumulative bucket counts, sum, count)`` for one label set."""
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                return [0] * (len(self.buckets) + 1), 0.0, 0
+            counts, total, count = list(entry[0]), entry[1], entry[2]
+        cumulative, running = [], 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def render(self) -> List[str]:
+        with self._lock:
+            keys = list(self._values)
+        lines = self._header()
+        for labels in keys:
+            cumulative, total, count = self.snapshot(*labels)
+            for bound, n in zip(self.buckets + (float("inf"),), cumulative):
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, (('le', _format_value(bound)),))} {n}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """A gauge (or counter) whose values come from ``callback()`` at scrape time.
+
+    The callback returns a number, or ``{label values tuple: number}``.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Tuple[str, ...] = (),
+                 kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning("%s unavailable: %s", self.name, e)
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+            if value is not None
+        ]
+
+
+def render() -> str:
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Request and stage metrics
+# -----------------------------
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Time to the end of the response", ("method", "route"))
+STAGE_LATENCY = Histogram("stage_duration_seconds", "Time spent in one stage of a request", ("stage",))
+STAGE_ERRORS = Counter("stage_errors_total", "Stages that raised", ("stage",))
+ERRORS = Counter("app_errors_total", "Errors handled and reported as status=error", ("where",))
+RATE_LIMITED = Counter("rate_limit_rejections_total", "Requests turned away with 429 by rate limit rule", ("rule",))
+
+_in_flight = 0
+
+
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            STAGE_LATENCY.observe(time.perf_counter() - self.start, self.name)
+            if exc_type is not None:
+                STAGE_ERRORS.inc(self.name)
+        return False
+
+
+def stage(name: str) -> _StageTimer:
+    """Time a block (sync or around ``await``) into ``stage_duration_seconds{stage=name}``."""
+    return _StageTimer(name)
+
+
+def count_error(where: str) -> None:
+    if METRICS_ENABLED:
+        ERRORS.inc(where)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request by its route template (not the raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        global _in_flight
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _in_flight -= 1
+            # Set by the router once matched; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            HTTP_LATENCY.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+
+
+# -----------------------------
+# Gauges read at scrape time
+# -----------------------------
+# A scrape must not import what the app loads lazily (the model, the LLM
+# client): gauges for a module nobody has used yet are simply left out.
+def _loaded(name: str):
+    return sys.modules.get(f"services.{name}")
+
+
+def _cache_stats() -> dict:
+    sources = {
+        "prediction": ("prediction_service", "prediction_cache_stats"),
+        "chat": ("chat_service", "chat_cache_stats"),
+        "calibration": ("calibration", "calibration_cache_stats"),
+    }
+    stats = {}
+    for cache, (module_name, function) in sources.items():
+        module = _loaded(module_name)
+        if module is not None:
+            stats[cache] = getattr(module, function)()
+    return stats
+
+
+def _hit_ratio(stats: dict) -> float:
+    hits = stats.get("hits", stats.get("exact_hits", 0) + stats.get("semantic_hits", 0))
+    lookups = hits + stats.get("misses", 0)
+    return hits / lookups if lookups else 0.0
+
+
+def _mongo_pool() -> dict:
+    from db.connection import connection_stats
+
+    pool = connection_stats()["pool"]
+    return {("open",): pool["open"], ("in_use",): pool["in_use"]}
+
+
+def _mongo_up() -> float:
+    from db.connection import connection_stats
+
+    return 1.0 if connection_stats()["connected"] else 0.0
+
+
+def _write_buffer() -> dict:
+    from db.write_buffer import WRITE_BUFFER
+
+    stats = WRITE_BUFFER.stats()
+    return {(state,): stats[state] for state in ("pending", "written", "spilled", "replayed", "dropped", "rejected")}
+
+
+def _log_records() -> dict:
+    from .log import logging_stats
+
+    stats = logging_stats()
+    return {(key,): stats[key] for key in ("queued", "dropped")}
+
+
+def _llm_in_flight() -> float:
+    from .rate_limit import LIMITER
+
+    return LIMITER.backend.in_flight(LIMITER.LLM_SLOTS) or 0
+
+
+def _model_version() -> dict:
+    model_registry = _loaded("model_registry")
+    bundle = model_registry.REGISTRY.peek() if model_registry is not None else None
+    return {(bundle.version,): 1} if bundle is not None else {}
+
+
+def _shadow() -> dict:
+    prediction_service = _loaded("prediction_service")
+    if prediction_service is None:
+        return {}
+    stats = prediction_service.shadow_stats()
+    return {(key,): stats[key] for key in ("queued", "requests", "dropped", "errors")}
+
+
+CallbackMetric("http_requests_in_flight", "Requests being handled", lambda: _in_flight)
+CallbackMetric("cache_hit_ratio", "Hits / lookups since start", lambda: {(name,): _hit_ratio(s) for name, s in _cache_stats().items()}, ("cache",))
+CallbackMetric("cache_entries", "Entries held", lambda: {(name,): s["size"] for name, s in _cache_stats().items()}, ("cache",))
+CallbackMetric("mongo_up", "1 while the MongoDB circuit breaker is closed", _mongo_up)
+CallbackMetric("mongo_pool_connections", "MongoDB connections by state", _mongo_pool, ("state",))
+CallbackMetric("write_buffer_documents", "Write-behind buffer documents by state", _write_buffer, ("state",))
+CallbackMetric("log_records", "Log records waiting for the writer thread, and dropped on a full queue", _log_records, ("state",))
+CallbackMetric("llm_requests_in_flight", "LLM calls holding a concurrency slot (this process's view)", _llm_in_flight)
+CallbackMetric("model_info", "The model version serving predictions", _model_version, ("version",))
+CallbackMetric("shadow_requests", "Shadow-evaluation queue and totals", _shadow, ("state",))
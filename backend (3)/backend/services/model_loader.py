@@ -0,0 +1,115 @@
+import os
+import pickle
+from pathlib import Path
+
+from .log import get_logger
+
+BASE = Path(__file__).resolve().parent.parent
+MODEL_DIR = BASE / "models"
+
+PICKLE_FILE = MODEL_DIR / "memory_model.pkl"
+# Native XGBoost formats written by export_model.py, in order of preference
+NATIVE_FILES = [MODEL_DIR / "memory_model.ubj", MODEL_DIR / "memory_model.json"]
+# The NumPy engine parses the JSON export itself
+JSON_FILE = MODEL_DIR / "memory_model.json"
+# ...or maps pre-flattened node arrays (export_model.py --flat) read-only
+FLAT_DIR = MODEL_DIR / "memory_model_flat"
+
+# auto (native if exported, NumPy engine if xgboost is missing, else pickle)
+# | native | numpy | mmap | pickle
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "auto").lower()
+
+logger = get_logger(__name__)
+
+
+class NativeBoosterModel:
+    """A bare ``xgboost.Booster`` loaded from the native JSON/UBJ format.
+
+    Predicts straight from a NumPy array with ``inplace_predict`` - no
+    sklearn wrapper and no DMatrix construction per call.
+    """
+
+    def __init__(self, path: Path):
+        import xgboost
+
+        self.path = Path(path)
+        self.booster = xgboost.Booster()
+        self.booster.load_model(str(self.path))
+
+    def predict(self, X):
+        return self.booster.inplace_predict(X)
+
+
+def load_pickle_model(path: Path = PICKLE_FILE):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def find_native_model(model_dir: Path = MODEL_DIR):
+    for path in NATIVE_FILES:
+        candidate = Path(model_dir) / path.name
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def load_numpy_model(path: Path = JSON_FILE):
+    from .tree_engine import TreeEnsemble
+
+    return TreeEnsemble.from_json(path)
+
+
+def load_mmap_model(directory: Path = FLAT_DIR):
+    from .tree_engine import TreeEnsemble
+
+    return TreeEnsemble.load_flat(directory, mmap=True)
+
+
+def load_model(backend: str = None, model_dir: Path = MODEL_DIR):
+    """Load the forgetting-curve model, returning ``(model, path_loaded_from)``.
+
+    ``native`` requires an exported booster, ``numpy`` the JSON export and
+    ``mmap`` the flattened arrays (shared between worker processes through
+    the page cache); ``auto`` uses the NumPy engine when xgboost isn't
+    installed and falls back to the pickle when there is no export or it
+    fails to load.
+    """
+    backend = (backend or MODEL_BACKEND).lower()
+    model_dir = Path(model_dir)
+    json_path = model_dir / JSON_FILE.name
+
+    if backend == "mmap":
+        from .tree_engine import FLAT_META_FILE
+
+        meta_path = model_dir / FLAT_DIR.name / FLAT_META_FILE
+        if not meta_path.exists():
+            raise FileNotFoundError(f"No flattened model in {model_dir}; run export_model.py --flat")
+        return load_mmap_model(meta_path.parent), meta_path
+
+    if backend == "numpy":
+        if not json_path.exists():
+            raise FileNotFoundError(f"No exported JSON model in {model_dir}; run export_model.py")
+        return load_numpy_model(json_path), json_path
+
+    if backend in ("auto", "native"):
+        native_path = find_native_model(model_dir)
+        if native_path is not None:
+            try:
+                return NativeBoosterModel(native_path), native_path
+            except ImportError:
+                if backend == "native":
+                    raise
+                if json_path.exists():
+                    logger.info("xgboost not installed, using the NumPy tree engine")
+                    return load_numpy_model(json_path), json_path
+            except Exception as e:
+                if backend == "native":
+                    raise
+                logger.warning("Native model load failed, falling back to pickle: %s", e)
+        elif backend == "native":
+            raise FileNotFoundError(f"No exported native model in {model_dir}; run export_model.py")
+    elif backend != "pickle":
+        raise ValueError(f"Unknown MODEL_BACKEND: {backend}")
+
+    pickle_path = model_dir / PICKLE_FILE.name
+    return load_pickle_model(pickle_path), pickle_path
@@ -0,0 +1,376 @@
+"""Versioned model bundles, loaded in the background and swapped atomically.
+
+A bundle is everything a prediction depends on: the model, the encoder
+(label-encoder classes + scaler stats) and the feature order, loaded and
+validated together. Bundles live in ``models/versions/<version>/``; a
+directory only counts once its ``manifest.json`` exists, so the exporter
+writes that last. The active version is, in order: ``MODEL_VERSION``,
+the name in ``models/versions/CURRENT``, the newest bundle by name, or
+the flat ``models/`` directory itself (versioned by its model file hash).
+
+Requests take a reference to the current bundle once and use only that,
+so a swap never mixes two versions inside one request and in-flight work
+finishes on the version it started with.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from .model_loader import MODEL_DIR, load_model
+from .log import get_logger
+from .preprocess import PARAMS_FILE, CompiledEncoder, load_encoder, safe_load_pickle
+
+logger = get_logger(__name__)
+
+VERSIONS_DIR_NAME = "versions"
+CURRENT_FILE_NAME = "CURRENT"
+MANIFEST_FILE_NAME = "manifest.json"
+
+# Pin a version (a directory under models/versions); empty follows CURRENT / the newest bundle
+MODEL_VERSION = os.getenv("MODEL_VERSION", "").strip()
+# Seconds between checks of the models directory for new bundles (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", os.getenv("PREDICTION_MODEL_CHECK_INTERVAL", "30")))
+
+_VERSION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_stat(path: Path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ModelBundle:
+    """One loaded model version; never mutated after construction."""
+
+    __slots__ = ("version", "model", "encoder", "path", "digest", "directory", "manifest", "loaded_at")
+
+    def __init__(self, version: str, model, encoder: CompiledEncoder, path: Path, digest: str,
+                 directory: Path, manifest: dict):
+        self.version = version
+        self.model = model
+        self.encoder = encoder
+        self.path = Path(path)
+        self.digest = digest
+        self.directory = Path(directory)
+        self.manifest = manifest
+        self.loaded_at = datetime.utcnow()
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "model_file": self.path.name,
+            "sha256": self.digest,
+            "n_features": self.encoder.n_features,
+            "created_at": self.manifest.get("created_at"),
+            "loaded_at": self.loaded_at.isoformat() + "Z",
+        }
+
+
+# -----------------------------
+# Bundles on disk
+# -----------------------------
+def bundle_dirs(models_dir: Path = MODEL_DIR) -> dict:
+    """``{version: directory}`` for every complete bundle under ``models/versions``."""
+    versions_dir = Path(models_dir) / VERSIONS_DIR_NAME
+    if not versions_dir.is_dir():
+        return {}
+    return {
+        entry.name: entry
+        for entry in sorted(versions_dir.iterdir())
+        if entry.is_dir() and _VERSION_NAME.match(entry.name) and (entry / MANIFEST_FILE_NAME).exists()
+    }
+
+
+def _read_current(models_dir: Path) -> Optional[str]:
+    try:
+        return (Path(models_dir) / VERSIONS_DIR_NAME / CURRENT_FILE_NAME).read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def _write_current(models_dir: Path, version: str) -> None:
+    """Point ``CURRENT`` at ``version``; written aside and renamed, so a watcher never reads half a name."""
+    path = Path(models_dir) / VERSIONS_DIR_NAME / CURRENT_FILE_NAME
+    tmp = path.with_name(f"{CURRENT_FILE_NAME}.{os.getpid()}.tmp")
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def resolve_version(models_dir: Path = MODEL_DIR, pinned: Optional[str] = MODEL_VERSION) -> Optional[str]:
+    """The version that should be serving; ``None`` means the flat models directory."""
+    if pinned:
+        return pinned
+    current = _read_current(models_dir)
+    if current:
+        return current
+    versions = list(bundle_dirs(models_dir))
+    return versions[-1] if versions else None
+
+
+def _load_encoder(directory: Path) -> CompiledEncoder:
+    params_file = directory / PARAMS_FILE.name
+    if params_file.exists() or directory == MODEL_DIR:
+        return load_encoder(params_file)
+    return CompiledEncoder.from_fitted(
+        safe_load_pickle(directory / "label_encoders.pkl"),
+        safe_load_pickle(directory / "scaler.pkl"),
+    )
+
+
+def load_bundle(version: Optional[str] = None, models_dir: Path = MODEL_DIR, backend: str = None) -> ModelBundle:
+    """Load and validate one bundle (``None`` = the flat models directory).
+
+    Raises ``FileNotFoundError`` for an unknown version and ``ValueError``
+    when the parts don't fit together, so a bad bundle is never swapped in.
+    """
+    models_dir = Path(models_dir)
+    if version is None:
+        directory = models_dir
+    else:
+        if not _VERSION_NAME.match(version):
+            raise ValueError(f"Invalid model version name: {version!r}")
+        directory = models_dir / VERSIONS_DIR_NAME / version
+        if not (directory / MANIFEST_FILE_NAME).exists():
+            raise FileNotFoundError(f"No model bundle {version!r} in {directory.parent}")
+
+    manifest = {}
+    manifest_file = directory / MANIFEST_FILE_NAME
+    if manifest_file.exists():
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    model, path = load_model(backend, directory)
+    encoder = _load_encoder(directory)
+
+    feature_order = manifest.get("feature_order")
+    if feature_order is not None and list(feature_order) != encoder.feature_order:
+        raise ValueError(f"Bundle {version or directory}: manifest feature order doesn't match the encoder")
+    # Smoke test: the model must accept the encoder's output
+    probe = model.predict(encoder.transform({}))
+    if len(probe) != 1:
+        raise ValueError(f"Bundle {version or directory}: model returned {len(probe)} values for one row")
+
+    digest = file_digest(path)
+    if version is None:
+        version = manifest.get("version") or f"sha-{digest[:12]}"
+    return ModelBundle(version, model, encoder, path, digest, directory, manifest)
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+class ModelRegistry:
+    """Holds the serving bundle and replaces it without blocking predictions.
+
+    Loading happens on the caller's thread (the watcher thread, or the CPU
+    executor for admin reloads) under a lock that only serialises loads;
+    readers just read ``self._bundle``, and the swap is one reference
+    assignment.
+    """
+
+    def __init__(self, models_dir: Path = MODEL_DIR, pinned: Optional[str] = MODEL_VERSION, backend: str = None):
+        self.models_dir = Path(models_dir)
+        self.pinned = pinned or None
+        self.backend = backend
+        self._bundle: Optional[ModelBundle] = None
+        self._load_lock = threading.Lock()
+        self._listeners: List[Callable] = []
+        self._signature = None
+        self._watcher = None
+        self._stop = threading.Event()
+        self.swaps = 0
+        self.failed_loads = 0
+        self.last_error = None
+
+    def add_listener(self, callback: Callable) -> None:
+        """``callback(old_bundle, new_bundle)`` runs after every swap."""
+        self._listeners.append(callback)
+
+    def peek(self) -> Optional[ModelBundle]:
+        """The current bundle if one is loaded, without loading."""
+        return self._bundle
+
+    def current(self) -> ModelBundle:
+        bundle = self._bundle
+        if bundle is None:
+            with self._load_lock:
+                if self._bundle is None:
+                    logger.info("Loading ML model...")
+                    self._swap(self._load(resolve_version(self.models_dir, self.pinned)))
+                bundle = self._bundle
+        return bundle
+
+    def reload(self, version: Optional[str] = None) -> ModelBundle:
+        """Load ``version`` (or whatever should be serving now) and swap it in.
+
+        Naming a version pins it until another version is named. Loading
+        the same files again is a no-op.
+        """
+        with self._load_lock:
+            bundle = self._load(version or resolve_version(self.models_dir, self.pinned))
+            if version:
+                self.pinned = version
+            return self._adopt(bundle)
+
+    def promote(self, version: str) -> ModelBundle:
+        """Load ``version``, swap it in and point ``models/versions/CURRENT`` at it.
+
+        ``reload`` only changes the process it runs in; every other worker's
+        watcher follows ``CURRENT``, so they switch on their next check. A
+        ``MODEL_VERSION`` pin outranks ``CURRENT``: then only this process
+        moves (pinned to ``version``, as ``reload`` would).
+        """
+        with self._load_lock:
+            bundle = self._load(version)
+            if self.pinned:
+                self.pinned = version
+            _write_current(self.models_dir, version)
+            return self._adopt(bundle)
+
+    def _adopt(self, bundle: ModelBundle) -> ModelBundle:
+        old = self._bundle
+        if old is not None and old.version == bundle.version and old.digest == bundle.digest:
+            self._signature = self._scan(old)
+            return old
+        self._swap(bundle)
+        return bundle
+
+    def _load(self, version: Optional[str]) -> ModelBundle:
+        try:
+            return load_bundle(version, self.models_dir, self.backend)
+        except Exception as e:
+            self.failed_loads += 1
+            self.last_error = f"{version or 'models/'}: {e}"
+            raise
+
+    def _swap(self, bundle: ModelBundle) -> None:
+        old, self._bundle = self._bundle, bundle
+        self._signature = self._scan(bundle)
+        self.swaps += 1
+        self.last_error = None
+        if old is None:
+            logger.info("Serving model %s from %s", bundle.version, bundle.path.name)
+        else:
+            logger.info("Swapped model %s -> %s", old.version, bundle.version)
+        for callback in self._listeners:
+            try:
+                callback(old, bundle)
+            except Exception as e:
+                logger.exception("Swap listener failed: %s", e)
+
+    # -----------------------------
+    # Watcher
+    # -----------------------------
+    def _scan(self, bundle: Optional[ModelBundle]):
+        """Cheap fingerprint of everything that could change which files should be serving."""
+        versions = bundle_dirs(self.models_dir)
+        return (
+            _read_current(self.models_dir),
+            tuple((name, _file_stat(path / MANIFEST_FILE_NAME)) for name, path in versions.items()),
+            _file_stat(bundle.path) if bundle is not None else None,
+        )
+
+    def check(self) -> bool:
+        """Reload if the models directory changed since the last load; True if a new version was swapped in."""
+        bundle = self._bundle
+        if bundle is None:
+            return False
+        signature = self._scan(bundle)
+        if signature == self._signature:
+            return False
+        # Remember it even if the load fails, so a broken bundle isn't retried
+        # every interval (a further change to it triggers another attempt)
+        self._signature = signature
+        try:
+            return self.reload() is not bundle
+        except Exception as e:
+            logger.error("Reload failed, still serving %s: %s", bundle.version, e)
+            return False
+
+    def start_watcher(self, interval: float = MODEL_WATCH_INTERVAL) -> None:
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.check()
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def after_fork(self) -> None:
+        """In a freshly forked worker: drop the parent's watcher and locks (the bundle stays shared)."""
+        self._watcher = None
+        self._stop = threading.Event()
+        self._load_lock = threading.Lock()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def versions(self) -> List[dict]:
+        active = self._bundle.version if self._bundle is not None else None
+        listed = []
+        for name, path in bundle_dirs(self.models_dir).items():
+            try:
+                with open(path / MANIFEST_FILE_NAME, "r", encoding="utf-8") as f:
+                    created_at = json.load(f).get("created_at")
+            except (OSError, ValueError):
+                created_at = None
+            listed.append({"version": name, "created_at": created_at, "active": name == active})
+        return listed
+
+    def stats(self) -> dict:
+        bundle = self._bundle
+        return {
+            "active": bundle.info() if bundle is not None else None,
+            "pinned": self.pinned,
+            "current_file": _read_current(self.models_dir),
+            "swaps": self.swaps,
+            "failed_loads": self.failed_loads,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+        }
+
+
+REGISTRY = ModelRegistry()
+
+
+def current_bundle() -> ModelBundle:
+    return REGISTRY.current()
+
+
+async def get_bundle() -> ModelBundle:
+    """The serving bundle, loading it on the CPU executor the first time."""
+    bundle = REGISTRY.peek()
+    if bundle is not None:
+        return bundle
+    from .executor import run_cpu
+
+    return await run_cpu(REGISTRY.current)
+
+
+def model_registry_stats() -> dict:
+    return REGISTRY.stats()
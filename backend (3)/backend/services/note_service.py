@@ -1,7 +1,7 @@
 from db.notes_model import add_note, get_notes
 
-def create_note(data):
-    add_note(data)
+async def create_note(data):
+    await add_note(data)
 
-def fetch_notes(email):
-    return get_notes(email)
+async def fetch_notes(email, before=None, after=None, limit=None):
+    return await get_notes(email, before=before, after=after, limit=limit)
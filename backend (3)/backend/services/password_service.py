@@ -0,0 +1,177 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from .executor import run_cpu
+from .log import get_logger
+
+# bcrypt cost factor for new hashes; logins rehash stored hashes whose cost differs
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes doing bcrypt (0 = hash on the CPU thread pool instead)
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", str(min(2, os.cpu_count() or 1))))
+# Max hash/verify jobs running or waiting before new ones are rejected
+PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", "32"))
+
+logger = get_logger(__name__)
+
+
+class PasswordTooLong(Exception):
+    pass
+
+
+class PasswordQueueFull(Exception):
+    """Too many hash/verify jobs are queued; the caller should retry later."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+# -----------------------------
+# Worker-side functions (run in the pool processes)
+# -----------------------------
+_CONTEXTS = {}
+
+
+def _context(rounds: int):
+    context = _CONTEXTS.get(rounds)
+    if context is None:
+        from passlib.context import CryptContext
+
+        # min == max == default: any stored hash with another cost "needs update"
+        context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        _CONTEXTS[rounds] = context
+    return context
+
+
+def _hash_job(password: str, rounds: int) -> str:
+    from passlib.exc import PasswordSizeError
+
+    try:
+        return _context(rounds).hash(password)
+    except PasswordSizeError:
+        raise PasswordTooLong()
+
+
+def _verify_job(password: str, password_hash: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    from passlib.exc import PasswordSizeError
+
+    try:
+        return _context(rounds).verify_and_update(password, password_hash)
+    except PasswordSizeError:
+        raise PasswordTooLong()
+
+
+# -----------------------------
+# Service
+# -----------------------------
+class PasswordHasher:
+    """bcrypt on a bounded process pool with queue-depth backpressure.
+
+    Falls back to the CPU thread pool when ``pool_size`` is 0 or the
+    platform can't start worker processes (e.g. serverless sandboxes). A
+    worker that dies (OOM, a signal) breaks the whole executor, so a broken
+    pool is replaced and the job retried once on the new one before it
+    runs on threads.
+    """
+
+    def __init__(self, pool_size: int = PASSWORD_POOL_SIZE, queue_max: int = PASSWORD_QUEUE_MAX, rounds: int = BCRYPT_ROUNDS):
+        self.pool_size = pool_size
+        self.queue_max = queue_max
+        self.rounds = rounds
+        self._pool = None
+        self._pool_failed = False
+        self._pending = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.pool_restarts = 0
+
+    def _get_pool(self):
+        if self._pool is None and self.pool_size > 0 and not self._pool_failed:
+            try:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.pool_size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            except (OSError, NotImplementedError, ImportError) as e:
+                logger.warning("Process pool unavailable, hashing on threads: %s", e)
+                self._pool_failed = True
+        return self._pool
+
+    async def _submit(self, func, *args):
+        if self._pending >= self.queue_max:
+            self.rejected += 1
+            raise PasswordQueueFull()
+
+        self._pending += 1
+        try:
+            for _ in range(2):
+                pool = self._get_pool()
+                if pool is None:
+                    break
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+                except BrokenProcessPool as e:
+                    self._discard_pool(pool, e)
+            return await run_cpu(func, *args)
+        finally:
+            self._pending -= 1
+
+    def _discard_pool(self, pool, error) -> None:
+        # Concurrent jobs on the same dead pool all land here; only the first replaces it
+        if self._pool is not pool:
+            return
+        logger.warning("Password worker pool broke, starting a new one: %s", error)
+        self._pool = None
+        self.pool_restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash_job, password, self.rounds)
+
+    async def verify(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """Return ``(valid, new_hash)``; ``new_hash`` is set when the stored cost is stale."""
+        valid, new_hash = await self._submit(_verify_job, password, password_hash, self.rounds)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.pool_size if self._pool is not None else 0,
+            "queue_max": self.queue_max,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "pool_restarts": self.pool_restarts,
+            "rounds": self.rounds,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+PASSWORD_HASHER = PasswordHasher()
+
+
+async def hash_password(password: str) -> str:
+    return await PASSWORD_HASHER.hash(password)
+
+
+async def verify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    return await PASSWORD_HASHER.verify(password, password_hash)
+
+
+def shutdown_password_pool() -> None:
+    PASSWORD_HASHER.shutdown()
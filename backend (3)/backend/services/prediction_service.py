@@ -1,31 +1,373 @@
-import pickle
-from pathlib import Path
-from .preprocess import preprocess_payload
-
-BASE = Path(__file__).resolve().parent.parent
-MODEL_FILE = BASE / "models" / "memory_model.pkl"
-
-# Lazy load model - only load when first prediction is made
-_MODEL = None
-
-def _get_model():
-    global _MODEL
-    if _MODEL is None:
-        print("[PREDICTION] Loading ML model...")
-        with open(MODEL_FILE, "rb") as f:
-            _MODEL = pickle.load(f)
-        print("[PREDICTION] Model loaded successfully")
-    return _MODEL
-
-def predict_days_until_forget(data: dict) -> float:
-    model = _get_model()
-    X = preprocess_payload(data)
-    result = model.predict(X)
-    prediction_value = round(float(result[0]), 2)
-    
-    # Debug: Log input values to help verify different inputs produce different outputs
-    print(f"[PREDICTION] Input - category: {data.get('category')}, difficulty: {data.get('difficulty')}, "
-          f"study_time: {data.get('study_time')}, confidence: {data.get('confidence')}")
-    print(f"[PREDICTION] Output: {prediction_value} days")
-    
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .log import debug_sampled, get_logger
+from .metrics import stage
+from .model_registry import REGISTRY, ModelBundle, current_bundle, load_bundle
+
+# Prediction cache settings (size 0 disables the cache, TTL 0 means no expiry)
+CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+# Candidate model scored in the background on live traffic (a models/versions bundle; empty disables)
+SHADOW_MODEL_VERSION = os.getenv("SHADOW_MODEL_VERSION", "").strip()
+# Percentage of prediction requests mirrored to the candidate
+SHADOW_SAMPLE_PCT = float(os.getenv("SHADOW_SAMPLE_PCT", "100"))
+# Requests waiting for the shadow worker; past this they're dropped, never waited on
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "1000"))
+# Recent requests kept for the latency percentiles
+SHADOW_LATENCY_WINDOW = 1024
+
+logger = get_logger(__name__)
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL cache of predictions keyed on the encoded feature vector."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key) -> Optional[float]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: float) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+PREDICTION_CACHE = PredictionCache(CACHE_SIZE, CACHE_TTL)
+
+# The model, its encoder and their version come from the registry as one
+# bundle; a request uses the bundle it started with even if a newer one is
+# swapped in meanwhile. Entries are keyed on the bundle's model hash, so a
+# swap only needs to drop the old ones to free the memory.
+REGISTRY.add_listener(lambda old, new: PREDICTION_CACHE.clear())
+
+
+def _timed_predict(bundle: ModelBundle, X) -> Tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    predicted = bundle.predict(X)
+    return predicted, time.perf_counter() - start
+
+
+def _predict_matrix(X, bundle: ModelBundle) -> Tuple[list, Optional[float]]:
+    """Predict every row of an encoded matrix, serving repeats from the cache.
+
+    Also returns the seconds ``bundle.predict`` took, or ``None`` when some
+    rows came from the cache (the model didn't score the whole matrix, so
+    the time isn't comparable with a candidate that did).
+    """
+    if not PREDICTION_CACHE.enabled:
+        predicted, seconds = _timed_predict(bundle, X)
+        return [round(float(value), 2) for value in predicted], seconds
+
+    # +0.0 folds -0.0 into 0.0 so equal vectors always share a key
+    keys = [(bundle.digest, row.tobytes()) for row in X + 0.0]
+    results = [PREDICTION_CACHE.get(key) for key in keys]
+
+    missing = [i for i, value in enumerate(results) if value is None]
+    seconds = None
+    if missing:
+        predicted, elapsed = _timed_predict(bundle, X[missing])
+        for i, value in zip(missing, predicted):
+            results[i] = round(float(value), 2)
+            PREDICTION_CACHE.put(keys[i], results[i])
+        if len(missing) == len(results):
+            seconds = elapsed
+
+    return results, seconds
+
+
+def predict_encoded(X, bundle: Optional[ModelBundle] = None):
+    """Raw model output for an already encoded + scaled matrix (no rounding, no cache)."""
+    return (bundle or current_bundle()).predict(X)
+
+
+def prediction_cache_stats() -> dict:
+    return PREDICTION_CACHE.stats()
+
+
+# -----------------------------
+# Shadow evaluation
+# -----------------------------
+def _latency_summary(total: float, count: int, window) -> dict:
+    if not count:
+        return {"mean": None, "p50": None, "p95": None}
+    p50, p95 = np.percentile(np.fromiter(window, dtype=np.float64), [50, 95])
+    return {"mean": round(total / count * 1000, 3), "p50": round(p50 * 1000, 3), "p95": round(p95 * 1000, 3)}
+
+
+class ShadowEvaluator:
+    """Scores a sample of live prediction matrices with a candidate model, off the request path.
+
+    ``submit`` only does a ``put_nowait`` onto a bounded queue (dropping the
+    job when it's full), so neither the candidate's latency nor a backlog
+    ever reaches a response. A daemon thread scores each matrix with the
+    candidate and folds the difference from what was served into running
+    totals.
+    """
+
+    def __init__(self, sample_pct: float = SHADOW_SAMPLE_PCT, queue_size: int = SHADOW_QUEUE_SIZE):
+        self.sample_pct = sample_pct
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._candidate: Optional[ModelBundle] = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._same_encoding = (None, None, False)
+        self._reset()
+
+    def _reset(self) -> None:
+        self.primary_version = None
+        self.requests = 0
+        self.rows = 0
+        self.dropped = 0
+        self.errors = 0
+        self.abs_diff_sum = 0.0
+        self.diff_sum = 0.0
+        self.max_abs_diff = 0.0
+        self.primary_timed = 0
+        self.primary_seconds = 0.0
+        self.shadow_seconds = 0.0
+        self.primary_window = deque(maxlen=SHADOW_LATENCY_WINDOW)
+        self.shadow_window = deque(maxlen=SHADOW_LATENCY_WINDOW)
+
+    @property
+    def candidate(self) -> Optional[ModelBundle]:
+        return self._candidate
+
+    def set_candidate(self, bundle: Optional[ModelBundle], sample_pct: Optional[float] = None) -> None:
+        """Compare against ``bundle`` from now on (``None`` switches shadowing off); resets the stats."""
+        with self._lock:
+            self._candidate = bundle
+            if sample_pct is not None:
+                self.sample_pct = sample_pct
+            self._reset()
+        if bundle is not None:
+            logger.info("Scoring %g%% of predictions with candidate %s", self.sample_pct, bundle.version)
+            self.start(None)
+
+    # -----------------------------
+    # Worker
+    # -----------------------------
+    def start(self, version: Optional[str] = SHADOW_MODEL_VERSION) -> None:
+        """Start the worker thread; it loads ``version`` as the candidate first, off the startup path."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, args=(version,), name="shadow-model", daemon=True)
+        self._thread.start()
+
+    def after_fork(self) -> None:
+        """In a freshly forked worker: new queue and lock, and a worker thread if a candidate is set."""
+        self._thread = None
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._lock = threading.Lock()
+        if self._candidate is not None:
+            self.start(None)
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        # Skip whatever is still queued; make room for the sentinel rather than block shutdown
+        self._candidate = None
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self, version: Optional[str]) -> None:
+        if version:
+            try:
+                self.set_candidate(load_bundle(version))
+            except Exception as e:
+                logger.error("Could not load shadow candidate %s: %s", version, e)
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._score(*job)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.warning("Shadow candidate scoring failed: %s", e)
+
+    def submit(self, X, payloads, served, primary_seconds: Optional[float], primary: ModelBundle) -> None:
+        """Queue a served matrix for scoring; ``primary_seconds`` is the primary model's own predict time, if it ran on every row."""
+        candidate = self._candidate
+        if candidate is None or candidate is primary or random.random() * 100 >= self.sample_pct:
+            return
+        try:
+            self._queue.put_nowait((candidate, X, payloads, served, primary_seconds, primary))
+        except queue.Full:
+            # Request threads submit concurrently
+            with self._lock:
+                self.dropped += 1
+
+    def _encoding_matches(self, candidate: ModelBundle, primary: ModelBundle) -> bool:
+        a, b, same = self._same_encoding
+        if a is candidate.encoder and b is primary.encoder:
+            return same
+        same = candidate.encoder is primary.encoder or candidate.encoder.to_params() == primary.encoder.to_params()
+        self._same_encoding = (candidate.encoder, primary.encoder, same)
+        return same
+
+    def _score(self, candidate, X, payloads, served, primary_seconds, primary) -> None:
+        if candidate is not self._candidate:
+            return  # queued before the candidate was replaced
+        if not self._encoding_matches(candidate, primary):
+            # Different encoders/scalers: the candidate needs its own matrix
+            X = candidate.encoder.transform_batch(payloads)
+
+        start = time.perf_counter()
+        shadow = np.round(np.asarray(candidate.predict(X), dtype=np.float64), 2)
+        elapsed = time.perf_counter() - start
+        diff = shadow - np.asarray(served, dtype=np.float64)
+
+        with self._lock:
+            if candidate is not self._candidate:
+                return
+            self.primary_version = primary.version
+            self.requests += 1
+            self.rows += len(diff)
+            self.abs_diff_sum += float(np.abs(diff).sum())
+            self.diff_sum += float(diff.sum())
+            self.max_abs_diff = max(self.max_abs_diff, float(np.abs(diff).max(initial=0.0)))
+            if primary_seconds is not None:
+                self.primary_timed += 1
+                self.primary_seconds += primary_seconds
+                self.primary_window.append(primary_seconds)
+            self.shadow_seconds += elapsed
+            self.shadow_window.append(elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            candidate = self._candidate
+            rows = self.rows
+            return {
+                "enabled": candidate is not None,
+                "candidate_version": candidate.version if candidate is not None else None,
+                "primary_version": self.primary_version,
+                "sample_pct": self.sample_pct,
+                "queued": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "requests": self.requests,
+                "rows": rows,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                # candidate - served, in days
+                "mean_abs_diff": round(self.abs_diff_sum / rows, 4) if rows else None,
+                "mean_diff": round(self.diff_sum / rows, 4) if rows else None,
+                "max_abs_diff": round(self.max_abs_diff, 4) if rows else None,
+                # Model predict time only; requests partly served from the prediction cache aren't timed
+                "primary_latency_ms": _latency_summary(self.primary_seconds, self.primary_timed, self.primary_window),
+                "shadow_latency_ms": _latency_summary(self.shadow_seconds, self.requests, self.shadow_window),
+            }
+
+
+SHADOW = ShadowEvaluator()
+
+
+def shadow_stats() -> dict:
+    return SHADOW.stats()
+
+
+def predict_days_until_forget(data: dict, bundle: Optional[ModelBundle] = None) -> float:
+    bundle = bundle or current_bundle()
+    with stage("preprocess"):
+        X = bundle.encoder.transform(data)
+    with stage("predict"):
+        results, model_seconds = _predict_matrix(X, bundle)
+    SHADOW.submit(X, [data], results, model_seconds, bundle)
+    prediction_value = results[0]
+
+    # Input/output dump for checking that different inputs give different outputs (sampled)
+    debug_sampled(
+        logger, "Prediction", category=data.get("category"), difficulty=data.get("difficulty"),
+        study_time=data.get("study_time"), confidence=data.get("confidence"), prediction=prediction_value,
+    )
+
     return prediction_value
+
+
+def predict_batch(rows: list, bundle: Optional[ModelBundle] = None) -> list:
+    """Predict many payloads with one scaler pass and a single ``model.predict`` call."""
+    if not rows:
+        return []
+
+    bundle = bundle or current_bundle()
+    with stage("preprocess"):
+        X = bundle.encoder.transform_batch(rows)
+    with stage("predict"):
+        results, model_seconds = _predict_matrix(X, bundle)
+    SHADOW.submit(X, rows, results, model_seconds, bundle)
+
+    logger.debug("Batch of %d rows predicted", len(rows))
+
+    return results
@@ -1,12 +1,16 @@
+import json
 import pickle
+from functools import lru_cache
 import numpy as np
-import pandas as pd
 from pathlib import Path
 
 # -----------------------------
 # Load Models Folder
 # -----------------------------
 MODEL_DIR = Path(__file__).resolve().parent.parent / "models"
+# Plain-JSON copy of the encoder classes + scaler stats (written by
+# export_model.py) so serving doesn't need to unpickle sklearn objects
+PARAMS_FILE = MODEL_DIR / "preprocess_params.json"
 
 
 # -----------------------------
@@ -18,10 +22,25 @@ def safe_load_pickle(path):
 
 
 # -----------------------------
-# LOAD SAVED OBJECTS
+# LOAD SAVED OBJECTS (lazily - unpickling the scaler imports sklearn)
 # -----------------------------
-LABEL_ENCODERS = safe_load_pickle(MODEL_DIR / "label_encoders.pkl")
-SCALER = safe_load_pickle(MODEL_DIR / "scaler.pkl")
+@lru_cache(maxsize=1)
+def load_label_encoders():
+    return safe_load_pickle(MODEL_DIR / "label_encoders.pkl")
+
+
+@lru_cache(maxsize=1)
+def load_scaler():
+    return safe_load_pickle(MODEL_DIR / "scaler.pkl")
+
+
+def __getattr__(name):
+    # Keep ``preprocess.LABEL_ENCODERS`` / ``preprocess.SCALER`` working
+    if name == "LABEL_ENCODERS":
+        return load_label_encoders()
+    if name == "SCALER":
+        return load_scaler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # -----------------------------
@@ -134,12 +153,213 @@ def encode_topic_name(topic_name: str) -> float:
     return float(48.62 + (normalized - 0.5) * 28.31 * 2.0)
 
 
+# -----------------------------
+# Fallback stats for values the label encoders don't know
+# -----------------------------
+FALLBACK_STATS = {
+    "category": {"mean": 9.996, "std": 6.060},
+    "domain": {"mean": 5.311, "std": 2.550},
+    "category_type": {"mean": 0.364, "std": 0.481},
+    "difficulty": {"mean": 1.5, "std": 1.0},
+    "mood": {"mean": 2.0, "std": 1.5},
+    "recent_event": {"mean": 1.0, "std": 1.0},
+}
+DEFAULT_FALLBACK_STATS = {"mean": 0.0, "std": 1.0}
+
+
+# -----------------------------
+# COMPILED ENCODER (hot path)
+# -----------------------------
+_TOPIC, _CATEGORICAL, _NUMERIC, _OTHER = range(4)
+
+
+class CompiledEncoder:
+    """Encode + scale payloads with flat per-column lookup tables.
+
+    Everything that doesn't depend on the request (label-encoder indices,
+    deterministic fallbacks for known values, scaler mean/scale) is resolved
+    once here, so encoding a row is a dict lookup per categorical column and
+    one vectorised subtract/divide. Output matches ``preprocess_payload_reference``
+    exactly.
+    """
+
+    def __init__(self, classes: dict, mean=None, scale=None, feature_order=FEATURE_ORDER):
+        self.feature_order = list(feature_order)
+        self.n_features = len(self.feature_order)
+        self.classes = {col: list(values) for col, values in classes.items()}
+        self.columns = [self._compile_column(col, self.classes) for col in self.feature_order]
+
+        self.mean = np.asarray(mean, dtype=np.float64) if mean is not None else None
+        self.scale = np.asarray(scale, dtype=np.float64) if scale is not None else None
+
+    @classmethod
+    def from_fitted(cls, label_encoders, scaler, feature_order=FEATURE_ORDER):
+        """Build from the fitted sklearn label encoders and StandardScaler."""
+        # Non-string classes can never match a request value, but keep their
+        # slot so the indices of the others don't shift
+        classes = {
+            col: [value if isinstance(value, str) else None for value in encoder.classes_]
+            for col, encoder in label_encoders.items()
+            if encoder is not None
+        }
+        return cls(
+            classes,
+            mean=scaler.mean_ if scaler.with_mean else None,
+            scale=scaler.scale_ if scaler.with_std else None,
+            feature_order=feature_order,
+        )
+
+    @classmethod
+    def from_params(cls, params: dict):
+        return cls(
+            params.get("classes", {}),
+            mean=params.get("mean"),
+            scale=params.get("scale"),
+            feature_order=params.get("feature_order", FEATURE_ORDER),
+        )
+
+    def to_params(self) -> dict:
+        return {
+            "feature_order": self.feature_order,
+            "classes": self.classes,
+            "mean": self.mean.tolist() if self.mean is not None else None,
+            "scale": self.scale.tolist() if self.scale is not None else None,
+        }
+
+    @staticmethod
+    def _compile_column(col, classes):
+        if col == "topic_name":
+            return (col, _TOPIC, None, 0.0, 1.0)
+        if col in NUMERIC_COLS:
+            return (col, _NUMERIC, None, 0.0, 1.0)
+        if col not in CATEGORICAL_COLS:
+            return (col, _OTHER, None, 0.0, 1.0)
+
+        stats = FALLBACK_STATS.get(col, DEFAULT_FALLBACK_STATS)
+        mean, std = stats["mean"], stats["std"]
+
+        # Deterministic fallbacks for the values we know about...
+        table = {
+            value: encode_string_deterministic(value, col, mean, std)
+            for value in CATEGORICAL_VALUE_MAPPINGS.get(col, {})
+        }
+        # ...overridden by whatever the fitted label encoder knows
+        for index, value in enumerate(classes.get(col, [])):
+            if value is not None:
+                table[value] = float(index)
+
+        return (col, _CATEGORICAL, table, mean, std)
+
+    def encode_row(self, payload: dict) -> list:
+        """Raw (unscaled) feature values for one payload, in ``feature_order``."""
+        values = []
+        append = values.append
+
+        for col, kind, table, mean, std in self.columns:
+            if col not in payload:
+                append(0.0)
+                continue
+
+            val = payload[col]
+
+            if val is None or (isinstance(val, str) and val.strip() == ""):
+                append(encode_topic_name("") if kind == _TOPIC else 0.0)
+                continue
+
+            if kind == _CATEGORICAL:
+                encoded = table.get(str(val).lower().strip())
+                if encoded is None:
+                    encoded = encode_string_deterministic(val, col, mean, std)
+                append(encoded)
+            elif kind == _NUMERIC:
+                try:
+                    append(float(val))
+                except Exception:
+                    append(0.0)
+            elif kind == _TOPIC:
+                append(encode_topic_name(str(val)))
+            else:
+                append(0.0)
+
+        return values
+
+    def encode_batch(self, payloads) -> np.ndarray:
+        """Raw (unscaled) ``(n, n_features)`` float64 matrix; pass it to ``apply_scaler`` before predicting."""
+        matrix = np.empty((len(payloads), self.n_features), dtype=np.float64)
+        for i, payload in enumerate(payloads):
+            matrix[i] = self.encode_row(payload)
+        return matrix
+
+    def apply_scaler(self, matrix):
+        """Apply the fitted scaler to a raw float64 matrix in place (and return it)."""
+        if self.mean is not None:
+            matrix -= self.mean
+        if self.scale is not None:
+            matrix /= self.scale
+        return matrix
+
+    def transform(self, payload: dict, out=None):
+        """Encode and scale one payload into a ``(1, n_features)`` array."""
+        return self.transform_batch([payload], out=out)
+
+    def transform_batch(self, payloads, dtype=np.float64, out=None):
+        """Encode and scale many payloads into a ``(n, n_features)`` array.
+
+        Rows are written straight into ``out`` when it's given (float64 or
+        float32); scaling is always done in float64 so the float64 output is
+        bit-identical to the scikit-learn path.
+        """
+        n_rows = len(payloads)
+        if out is not None:
+            dtype = out.dtype
+            if out.shape != (n_rows, self.n_features):
+                raise ValueError(f"out has shape {out.shape}, expected {(n_rows, self.n_features)}")
+
+        matrix = out if out is not None and dtype == np.float64 else np.empty((n_rows, self.n_features), dtype=np.float64)
+        for i, payload in enumerate(payloads):
+            matrix[i] = self.encode_row(payload)
+        self.apply_scaler(matrix)
+
+        if matrix.dtype == dtype:
+            return matrix
+        if out is not None:
+            out[...] = matrix
+            return out
+        return matrix.astype(dtype)
+
+
+def load_encoder(params_file: Path = PARAMS_FILE) -> CompiledEncoder:
+    """Build the encoder from the exported JSON params, or the pickles if there are none."""
+    if Path(params_file).exists():
+        with open(params_file, "r", encoding="utf-8") as f:
+            return CompiledEncoder.from_params(json.load(f))
+    return CompiledEncoder.from_fitted(load_label_encoders(), load_scaler())
+
+
+ENCODER = load_encoder()
+
+
 # -----------------------------
 # MAIN PREPROCESS FUNCTION
 # -----------------------------
 def preprocess_payload(payload: dict):
-    """Preprocess and return a scaled DataFrame (NO WARNING)."""
+    """Preprocess and return a scaled ``(1, n_features)`` float64 array."""
+    return ENCODER.transform(payload)
+
+
+# -----------------------------
+# BATCH PREPROCESS
+# -----------------------------
+def preprocess_batch(payloads: list):
+    """Encode many payloads into one (n, len(FEATURE_ORDER)) matrix and scale it in a single pass."""
+    return ENCODER.transform_batch(payloads)
+
 
+# -----------------------------
+# REFERENCE PATH (label encoders + pandas + sklearn scaler)
+# Kept for parity checks and benchmarks; not used when serving.
+# -----------------------------
+def _encode_row_reference(payload: dict) -> list:
     feature_values = []
 
     for col in FEATURE_ORDER:
@@ -162,21 +382,13 @@ def preprocess_payload(payload: dict):
             feature_values.append(encode_topic_name(str(val)))
 
         elif col in CATEGORICAL_COLS:
-            encoder = LABEL_ENCODERS.get(col)
+            encoder = load_label_encoders().get(col)
             val_lower = str(val).lower().strip()
 
             if encoder and val_lower in encoder.classes_:
                 feature_values.append(float(encoder.transform([val_lower])[0]))
             else:
-                stats = {
-                    "category": {"mean": 9.996, "std": 6.060},
-                    "domain": {"mean": 5.311, "std": 2.550},
-                    "category_type": {"mean": 0.364, "std": 0.481},
-                    "difficulty": {"mean": 1.5, "std": 1.0},
-                    "mood": {"mean": 2.0, "std": 1.5},
-                    "recent_event": {"mean": 1.0, "std": 1.0},
-                }.get(col, {"mean": 0.0, "std": 1.0})
-
+                stats = FALLBACK_STATS.get(col, DEFAULT_FALLBACK_STATS)
                 feature_values.append(
                     encode_string_deterministic(val, col, stats["mean"], stats["std"])
                 )
@@ -190,14 +402,12 @@ def preprocess_payload(payload: dict):
         else:
             feature_values.append(0.0)
 
-    # -----------------------------
-    # FIX: Create DataFrame with column names
-    # -----------------------------
-    df = pd.DataFrame([dict(zip(FEATURE_ORDER, feature_values))])
+    return feature_values
+
 
-    # -----------------------------
-    # Scale using fitted scaler (NO MORE WARNINGS)
-    # -----------------------------
-    df_scaled = SCALER.transform(df)
+def preprocess_payload_reference(payload: dict):
+    """Original scikit-learn preprocessing path (DataFrame + ``SCALER.transform``)."""
+    import pandas as pd
 
-    return df_scaled
+    df = pd.DataFrame([dict(zip(FEATURE_ORDER, _encode_row_reference(payload)))])
+    return load_scaler().transform(df)
@@ -0,0 +1,499 @@
+"""Per-client token buckets (ASGI middleware) and a global cap on concurrent LLM calls.
+
+Each rule gives a route prefix a bucket of ``burst`` tokens refilled at
+``rate`` per ``period`` seconds. A request spends a token from two buckets:
+
+- its client IP's, which holds ``RATE_LIMIT_IP_FACTOR`` times the rule
+  (several students can share an address), and
+- the one for that IP *and* the ``email`` it names (JSON body or path).
+
+The email is whatever the client sent, so it never gets a bucket of its own:
+rotating emails only shares out the IP's budget, and naming someone else's
+address from another IP doesn't touch their quota. A rejected request gets
+a 429 with ``Retry-After``.
+
+Calls that actually reach the LLM (not cached replies) share
+``LLM_MAX_CONCURRENCY`` slots, taken by the chat service with ``llm_slot()``;
+a call waits up to ``LLM_QUEUE_TIMEOUT`` for one, then raises ``LLMBusy``.
+
+Rules come from ``RATE_LIMITS``, e.g.::
+
+    RATE_LIMITS="POST /api/chat=20/60:10; POST /api/predict=120/60:60; /api/auth=10/60"
+
+(``[METHOD ]PREFIX=RATE/PERIOD[:BURST]``; the longest matching prefix wins,
+an empty value turns per-user limits off).
+
+State lives in a backend: ``memory`` (per process) or ``redis``
+(``RATE_LIMIT_REDIS_URL``, shared by every worker, needs the ``redis``
+package). If Redis is unreachable the limiter falls back to memory rather
+than failing requests.
+"""
+import asyncio
+import math
+from contextlib import asynccontextmanager
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+from .log import get_logger
+
+# 0 turns the middleware into a pass-through
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "POST /api/chat=20/60:10; POST /api/predict=120/60:60; POST /api/auth=10/60:10",
+)
+# memory | redis
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://127.0.0.1:6379/0")
+# Buckets kept by the memory backend (least recently used are dropped; a dropped bucket is full again)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# The per-IP bucket is this many times each rule, shared by every email sent from the address
+RATE_LIMIT_IP_FACTOR = float(os.getenv("RATE_LIMIT_IP_FACTOR", "5"))
+# Take the client IP from X-Forwarded-For (behind Vercel or another proxy)
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") != "0"
+# LLM calls in flight across the process (or all workers, with Redis); 0 = no cap
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Seconds a chat request waits for an LLM slot before it is turned away
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "2"))
+# A slot held longer than this (e.g. by a worker that died) is freed; must exceed the longest stream
+LLM_SLOT_LEASE = float(os.getenv("LLM_SLOT_LEASE", "120"))
+
+logger = get_logger(__name__)
+
+_RULE_RE = re.compile(r"^(?:([A-Z]+)\s+)?(/\S*)\s*=\s*(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)\s*(?::\s*(\d+))?$")
+_EMAIL_RE = re.compile(rb'"email"\s*:\s*"([^"\\]{3,254})"')
+_POLL_INTERVAL = 0.02
+
+
+class LLMBusy(Exception):
+    """Every LLM slot stayed taken for ``LLM_QUEUE_TIMEOUT``; the caller should retry later."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("All LLM slots are in use")
+        self.retry_after = retry_after
+
+
+class RateRule:
+    __slots__ = ("name", "method", "prefix", "capacity", "refill_per_second")
+
+    def __init__(self, prefix: str, rate: float, period: float, burst: Optional[int] = None,
+                 method: Optional[str] = None):
+        self.method = method
+        self.prefix = prefix
+        self.capacity = float(burst if burst is not None else rate)
+        self.refill_per_second = rate / period
+        self.name = f"{method} {prefix}" if method else prefix
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method is None or self.method == method) and path.startswith(self.prefix)
+
+    def to_dict(self) -> dict:
+        return {
+            "rule": self.name,
+            "burst": self.capacity,
+            "per_minute": round(self.refill_per_second * 60, 3),
+        }
+
+
+def parse_rules(spec: str) -> List[RateRule]:
+    """Rules from ``RATE_LIMITS``, longest prefix first; raises ValueError on a malformed entry."""
+    rules = []
+    for entry in filter(None, (part.strip() for part in re.split(r"[;\n]", spec or ""))):
+        match = _RULE_RE.match(entry)
+        if not match:
+            raise ValueError(f"Bad RATE_LIMITS entry {entry!r} (want '[METHOD ]/prefix=rate/period[:burst]')")
+        method, prefix, rate, period, burst = match.groups()
+        if float(rate) <= 0 or float(period) <= 0:
+            raise ValueError(f"Bad RATE_LIMITS entry {entry!r}: rate and period must be positive")
+        rules.append(RateRule(prefix, float(rate), float(period), int(burst) if burst else None, method))
+    return sorted(rules, key=lambda rule: (-len(rule.prefix), rule.method is None))
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class RateLimitBackend:
+    """Where bucket and slot state lives.
+
+    ``take`` returns 0 when a token was taken, else the seconds until one
+    will be available. ``acquire`` returns a slot token, or ``None`` when
+    all ``limit`` slots are taken.
+    """
+
+    name = "base"
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> float:
+        raise NotImplementedError
+
+    async def acquire(self, name: str, limit: int, lease_seconds: float) -> Optional[str]:
+        raise NotImplementedError
+
+    async def release(self, name: str, token: str) -> None:
+        raise NotImplementedError
+
+    def in_flight(self, name: str) -> Optional[int]:
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(RateLimitBackend):
+    name = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / refill_per_second
+
+    async def acquire(self, name: str, limit: int, lease_seconds: float) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            held = self._slots.setdefault(name, {})
+            for token in [t for t, expires in held.items() if expires <= now]:
+                del held[token]
+            if len(held) >= limit:
+                return None
+            token = uuid.uuid4().hex
+            held[token] = now + lease_seconds
+            return token
+
+    async def release(self, name: str, token: str) -> None:
+        with self._lock:
+            self._slots.get(name, {}).pop(token, None)
+
+    def in_flight(self, name: str) -> Optional[int]:
+        with self._lock:
+            return len(self._slots.get(name, ()))
+
+    def keys(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+# Bucket state as a hash {tokens, ts}; Redis' own clock so workers agree on "now"
+_TAKE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+# Slots as a sorted set of token -> lease expiry (ms); expired leases are dropped first
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+  redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+  redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+  return 1
+end
+return 0
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """Buckets and slots in Redis, so every worker (and every instance) shares them."""
+
+    name = "redis"
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self.client = redis.from_url(url)
+        self._take = self.client.register_script(_TAKE_LUA)
+        self._acquire = self.client.register_script(_ACQUIRE_LUA)
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0) -> float:
+        wait = await self._take(keys=[self.prefix + "bucket:" + key], args=[capacity, refill_per_second, cost])
+        return float(wait)
+
+    async def acquire(self, name: str, limit: int, lease_seconds: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self._acquire(keys=[self.prefix + "slots:" + name], args=[limit, int(lease_seconds * 1000), token])
+        return token if acquired else None
+
+    async def release(self, name: str, token: str) -> None:
+        await self.client.zrem(self.prefix + "slots:" + name, token)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def make_backend(name: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    if name == "redis":
+        try:
+            return RedisBackend()
+        except ImportError:
+            logger.warning("RATE_LIMIT_BACKEND=redis but the redis package is not installed; using memory")
+    elif name != "memory":
+        logger.warning("Unknown RATE_LIMIT_BACKEND %r; using memory", name)
+    return MemoryBackend()
+
+
+# -----------------------------
+# Limiter
+# -----------------------------
+class RateLimiter:
+    LLM_SLOTS = "llm"
+
+    def __init__(self, rules: List[RateRule], backend: Optional[RateLimitBackend] = None,
+                 llm_max_concurrency: int = LLM_MAX_CONCURRENCY, llm_queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 llm_slot_lease: float = LLM_SLOT_LEASE, ip_factor: float = RATE_LIMIT_IP_FACTOR,
+                 enabled: bool = RATE_LIMIT_ENABLED):
+        self.rules = rules
+        self.ip_factor = ip_factor
+        self.backend = backend or MemoryBackend()
+        self.llm_max_concurrency = llm_max_concurrency
+        self.llm_queue_timeout = llm_queue_timeout
+        self.llm_slot_lease = llm_slot_lease
+        self.enabled = enabled
+        # Used while the shared backend is failing
+        self._fallback = MemoryBackend()
+        self.backend_errors = 0
+        self.rejected = {}
+        self._lock = threading.Lock()
+
+    def match(self, method: str, path: str) -> Optional[RateRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    async def _call(self, method: str, *args):
+        try:
+            return await getattr(self.backend, method)(*args)
+        except Exception as e:
+            if self.backend is self._fallback:
+                raise
+            with self._lock:
+                self.backend_errors += 1
+                first = self.backend_errors == 1
+            if first:
+                logger.warning("Rate limit backend %s failed, limiting per process: %s", self.backend.name, e)
+            return await getattr(self._fallback, method)(*args)
+
+    async def check(self, rule: RateRule, ip: str, email: Optional[str] = None) -> float:
+        """0 if the client may make a request under ``rule``, else the seconds to wait."""
+        wait = await self._call("take", f"{rule.name}|ip:{ip}", rule.capacity * self.ip_factor,
+                                rule.refill_per_second * self.ip_factor)
+        if wait > 0:
+            return wait
+        return await self._call("take", f"{rule.name}|ip:{ip}|email:{email or ''}", rule.capacity,
+                                rule.refill_per_second)
+
+    async def acquire_llm_slot(self) -> Optional[str]:
+        """Wait up to ``llm_queue_timeout`` for an LLM slot; ``None`` if none came free."""
+        deadline = time.monotonic() + self.llm_queue_timeout
+        while True:
+            token = await self._call("acquire", self.LLM_SLOTS, self.llm_max_concurrency, self.llm_slot_lease)
+            if token is not None or time.monotonic() >= deadline:
+                return token
+            await asyncio.sleep(min(_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+    async def release_llm_slot(self, token: str) -> None:
+        try:
+            await self._call("release", self.LLM_SLOTS, token)
+        except Exception as e:
+            logger.warning("Could not release LLM slot: %s", e)
+
+    @asynccontextmanager
+    async def llm_slot(self):
+        """Hold one of the LLM slots for the block; raises ``LLMBusy`` if none comes free in time."""
+        if not self.enabled or self.llm_max_concurrency <= 0:
+            yield
+            return
+        token = await self.acquire_llm_slot()
+        if token is None:
+            self.record_rejection("llm_concurrency")
+            raise LLMBusy(max(1, math.ceil(self.llm_queue_timeout)))
+        try:
+            yield
+        finally:
+            await self.release_llm_slot(token)
+
+    def record_rejection(self, name: str) -> None:
+        from .metrics import METRICS_ENABLED, RATE_LIMITED
+
+        if METRICS_ENABLED:
+            RATE_LIMITED.inc(name)
+        with self._lock:
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            rejected = dict(self.rejected)
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "backend_errors": self.backend_errors,
+            "rules": [rule.to_dict() for rule in self.rules],
+            "ip_factor": self.ip_factor,
+            "llm": {
+                "max_concurrency": self.llm_max_concurrency,
+                "queue_timeout_seconds": self.llm_queue_timeout,
+                "in_flight": self.backend.in_flight(self.LLM_SLOTS),
+            },
+            "rejected": rejected,
+        }
+
+
+LIMITER = RateLimiter(parse_rules(RATE_LIMITS), make_backend())
+
+
+def rate_limit_stats() -> dict:
+    return LIMITER.stats()
+
+
+def llm_slot():
+    """``async with llm_slot():`` around an LLM call (raises ``LLMBusy``)."""
+    return LIMITER.llm_slot()
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+async def _read_body(receive):
+    """The whole request body, plus a ``receive`` that replays it to the app."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            # Client went away; let the app see the disconnect
+            pending = [message]
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            pending = []
+            break
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            if pending:
+                return pending.pop()
+            return {"type": "http.request", "body": body, "more_body": False}
+        if pending:
+            return pending.pop()
+        return await receive()
+
+    return body, replay
+
+
+def client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def client_email(scope, body: bytes = b"") -> Optional[str]:
+    """The email the request names (body, else path), unverified; ``None`` if there isn't one."""
+    match = _EMAIL_RE.search(body) if body else None
+    if match:
+        return match.group(1).decode("utf-8", "replace").strip().lower()
+    for segment in reversed(scope["path"].split("/")):
+        if "@" in segment:
+            return segment.strip().lower()
+    return None
+
+
+class _RouteLabel:
+    __slots__ = ("path",)
+
+    def __init__(self, path: str):
+        self.path = path
+
+
+class RateLimitMiddleware:
+    """Per-IP and per-(IP, email) token buckets on the configured routes."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter or LIMITER
+        if scope["type"] != "http" or not limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        rule = limiter.match(method, path)
+        if rule is not None:
+            body = b""
+            if method in ("POST", "PUT", "PATCH"):
+                body, receive = await _read_body(receive)
+            wait = await limiter.check(rule, client_ip(scope), client_email(scope, body))
+            if wait > 0:
+                await self._reject(scope, receive, send, rule, wait)
+                return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, scope, receive, send, rule: RateRule, wait: float):
+        from starlette.responses import JSONResponse
+        from starlette.routing import Match
+
+        (self.limiter or LIMITER).record_rejection(rule.name)
+        # Label the request in /metrics as if it had been routed: the route
+        # template where the router can tell without handling it, else the rule
+        app = scope.get("app")
+        for route in getattr(getattr(app, "router", None), "routes", ()):
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                scope["route"] = child_scope.get("route")
+                break
+        if scope.get("route") is None:
+            scope["route"] = _RouteLabel(rule.prefix)
+
+        retry_after = max(1, math.ceil(wait))
+        response = JSONResponse(
+            {"status": "error", "message": "Too many requests. Please slow down.", "retry_after": retry_after},
+            status_code=429,
+            headers={"Retry-After": str(retry_after)},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,88 @@
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from .model_registry import ModelBundle, current_bundle
+
+# Upper bound on simulated reviews per topic
+SCHEDULE_MAX_STEPS = int(os.getenv("SCHEDULE_MAX_STEPS", "30"))
+# Never schedule two reviews of a topic closer together than this (days)
+SCHEDULE_MIN_INTERVAL = float(os.getenv("SCHEDULE_MIN_INTERVAL", "1"))
+# Confidence is entered on a 1-5 scale
+CONFIDENCE_MAX = 5.0
+
+
+def simulate_reviews(payloads: List[dict], steps: int, confidence_step: float = 1.0, calibration=None,
+                     bundle: Optional[ModelBundle] = None):
+    """Predict -> review -> bump ``review_count``/``confidence`` -> predict again, ``steps`` times.
+
+    All topics are encoded once into a raw feature matrix; each step only
+    edits two columns, rescales and makes one ``predict`` call for every
+    topic together (then the user's ``calibration``, if given). Returns ``(intervals, review_counts, confidences)``,
+    each shaped ``(steps, n_topics)``.
+    """
+    bundle = bundle or current_bundle()
+    encoder = bundle.encoder
+    raw = encoder.encode_batch(payloads)
+    review_col = encoder.feature_order.index("review_count")
+    confidence_col = encoder.feature_order.index("confidence")
+
+    n_topics = len(payloads)
+    intervals = np.empty((steps, n_topics), dtype=np.float64)
+    review_counts = np.empty((steps, n_topics), dtype=np.float64)
+    confidences = np.empty((steps, n_topics), dtype=np.float64)
+    scaled = np.empty_like(raw)
+
+    for step in range(steps):
+        np.copyto(scaled, raw)
+        predicted = np.asarray(bundle.predict(encoder.apply_scaler(scaled)), dtype=np.float64)
+        if calibration is not None:
+            predicted = calibration.apply(predicted)
+        intervals[step] = np.maximum(predicted, SCHEDULE_MIN_INTERVAL)
+        review_counts[step] = raw[:, review_col]
+        confidences[step] = raw[:, confidence_col]
+
+        # The review at the end of this interval
+        raw[:, review_col] += 1
+        raw[:, confidence_col] = np.minimum(raw[:, confidence_col] + confidence_step, CONFIDENCE_MAX)
+
+    return intervals, review_counts, confidences
+
+
+def build_schedule(payloads: List[dict], steps: int, start: Optional[date] = None,
+                   confidence_step: float = 1.0, calibration=None, bundle: Optional[ModelBundle] = None) -> dict:
+    """Per-topic review timelines plus a date-ordered calendar across all topics."""
+    start = start or date.today()
+    bundle = bundle or current_bundle()
+    intervals, review_counts, confidences = simulate_reviews(payloads, steps, confidence_step, calibration, bundle)
+    # Day offset of each review from ``start``
+    days = np.cumsum(intervals, axis=0)
+
+    topics = []
+    calendar = defaultdict(list)
+    for t, payload in enumerate(payloads):
+        name = payload.get("topic_name") or f"topic {t + 1}"
+        reviews = []
+        for step in range(steps):
+            review_date = start + timedelta(days=int(np.ceil(days[step, t])))
+            reviews.append({
+                "step": step + 1,
+                "review_count": int(review_counts[step, t]),
+                "confidence": round(float(confidences[step, t]), 2),
+                "interval_days": round(float(intervals[step, t]), 2),
+                "day": round(float(days[step, t]), 2),
+                "date": review_date.isoformat(),
+            })
+            calendar[review_date.isoformat()].append({"topic_name": name, "step": step + 1})
+        topics.append({"topic_name": name, "reviews": reviews})
+
+    return {
+        "start_date": start.isoformat(),
+        "steps": steps,
+        "model_version": bundle.version,
+        "topics": topics,
+        "calendar": [{"date": day, "reviews": calendar[day]} for day in sorted(calendar)],
+    }
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Node arrays written by ``save_flat``, one .npy each so they can be memory-mapped
+FLAT_ARRAYS = ("features", "thresholds", "children", "default_left", "values", "roots")
+# Written last; its hash covers the arrays, so it versions the whole directory
+FLAT_META_FILE = "meta.json"
+
+# Objectives whose prediction is the raw margin (identity link)
+_IDENTITY_OBJECTIVES = {
+    "reg:squarederror",
+    "reg:absoluteerror",
+    "reg:pseudohubererror",
+    "reg:quantileerror",
+}
+
+
+def _parse_base_score(raw) -> float:
+    # XGBoost >= 2 writes it as a bracketed vector string, e.g. "[1.0291157E1]"
+    if isinstance(raw, str):
+        raw = raw.strip().strip("[]").split(",")[0]
+    return float(raw)
+
+
+class TreeEnsemble:
+    """Pure-NumPy evaluator for a gradient-boosted tree ensemble.
+
+    All trees are flattened into shared 1-D node arrays (feature index,
+    threshold, left/right child, default direction, leaf value) with leaves
+    pointing at themselves, so a batch is evaluated by ``max_depth`` rounds
+    of vectorised gathers over an ``(n_rows, n_trees)`` matrix of node ids.
+    Only needs NumPy - no xgboost, sklearn or pandas import.
+    """
+
+    def __init__(self, features, thresholds, children, default_left, values, roots, max_depth, base_score, feature_names=None):
+        self.features = features
+        self.thresholds = thresholds
+        # children[2 * node] is the left child, children[2 * node + 1] the right
+        self.children = children
+        self.default_left = default_left
+        self.values = values
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.base_score = np.float32(base_score)
+        self.feature_names = feature_names
+        self.n_trees = len(roots)
+
+    @classmethod
+    def from_json(cls, path: Path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, model: dict):
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in _IDENTITY_OBJECTIVES:
+            raise ValueError(f"Unsupported objective for the NumPy engine: {objective}")
+
+        params = learner["learner_model_param"]
+        if int(params.get("num_target", 1)) != 1 or int(params.get("num_class", 0)) > 1:
+            raise ValueError("The NumPy engine only supports single-output regression models")
+
+        booster = learner["gradient_booster"]
+        if booster.get("name") != "gbtree":
+            raise ValueError(f"Unsupported booster for the NumPy engine: {booster.get('name')}")
+
+        trees = booster["model"]["trees"]
+        sizes = [len(tree["left_children"]) for tree in trees]
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+        n_nodes = int(sum(sizes))
+
+        features = np.zeros(n_nodes, dtype=np.int32)
+        thresholds = np.zeros(n_nodes, dtype=np.float32)
+        left = np.zeros(n_nodes, dtype=np.int32)
+        right = np.zeros(n_nodes, dtype=np.int32)
+        default_left = np.zeros(n_nodes, dtype=bool)
+        values = np.zeros(n_nodes, dtype=np.float32)
+        max_depth = 0
+
+        for tree, offset, size in zip(trees, offsets, sizes):
+            if any(tree.get("split_type", [])):
+                raise ValueError("Categorical splits are not supported by the NumPy engine")
+
+            nodes = slice(offset, offset + size)
+            lc = np.asarray(tree["left_children"], dtype=np.int32)
+            rc = np.asarray(tree["right_children"], dtype=np.int32)
+            is_leaf = lc == -1
+            local = np.arange(size, dtype=np.int32)
+
+            features[nodes] = np.where(is_leaf, 0, tree["split_indices"])
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+            # Leaves store their weight in split_conditions
+            thresholds[nodes] = np.where(is_leaf, 0.0, conditions)
+            values[nodes] = np.where(is_leaf, conditions, 0.0)
+            left[nodes] = np.where(is_leaf, local, lc) + offset
+            right[nodes] = np.where(is_leaf, local, rc) + offset
+            default_left[nodes] = np.asarray(tree["default_left"], dtype=bool)
+
+            max_depth = max(max_depth, _tree_depth(lc, rc))
+
+        children = np.empty(2 * n_nodes, dtype=np.int32)
+        children[0::2] = left
+        children[1::2] = right
+
+        return cls(
+            features, thresholds, children, default_left, values,
+            roots=offsets, max_depth=max_depth,
+            base_score=_parse_base_score(params["base_score"]),
+            feature_names=learner.get("feature_names") or None,
+        )
+
+    def save_flat(self, directory: Path) -> Path:
+        """Write the node arrays as ``.npy`` files plus ``meta.json``; returns the meta path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        digests = {}
+        for name in FLAT_ARRAYS:
+            path = directory / f"{name}.npy"
+            tmp = directory / f"{name}.tmp.npy"
+            np.save(tmp, np.ascontiguousarray(getattr(self, name)))
+            os.replace(tmp, path)
+            digests[name] = hashlib.sha256(path.read_bytes()).hexdigest()
+
+        meta = {
+            "max_depth": self.max_depth,
+            "base_score": float(self.base_score),
+            "feature_names": self.feature_names,
+            "sha256": digests,
+        }
+        meta_path = directory / FLAT_META_FILE
+        tmp = directory / (FLAT_META_FILE + ".tmp")
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp, meta_path)
+        return meta_path
+
+    @classmethod
+    def load_flat(cls, directory: Path, mmap: bool = True):
+        """Load arrays written by ``save_flat``.
+
+        With ``mmap`` the arrays are read-only views of the files: every
+        process that loads the same directory shares one copy through the
+        page cache, and loading costs a few ``mmap`` calls instead of
+        parsing the model.
+        """
+        directory = Path(directory)
+        with open(directory / FLAT_META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            # Plain ndarray views: indexing an np.memmap subclass is slower and returns memmaps
+            name: np.load(directory / f"{name}.npy", mmap_mode="r" if mmap else None).view(np.ndarray)
+            for name in FLAT_ARRAYS
+        }
+        return cls(
+            arrays["features"], arrays["thresholds"], arrays["children"], arrays["default_left"],
+            arrays["values"], arrays["roots"], max_depth=meta["max_depth"],
+            base_score=meta["base_score"], feature_names=meta.get("feature_names"),
+        )
+
+    def predict(self, X):
+        # XGBoost compares features as float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+
+        for _ in range(self.max_depth):
+            fvalues = flat_X[row_offsets + self.features[nodes]]
+            go_right = ~(fvalues < self.thresholds[nodes])
+            missing = np.isnan(fvalues)
+            if missing.any():
+                go_right[missing] = ~self.default_left[nodes[missing]]
+            nodes = self.children[2 * nodes + go_right]
+
+        # Sum leaves sequentially in tree order in float32, as XGBoost does
+        leaves = np.empty((n_rows, self.n_trees + 1), dtype=np.float32)
+        leaves[:, 0] = self.base_score
+        leaves[:, 1:] = self.values[nodes]
+        return np.cumsum(leaves, axis=1, dtype=np.float32)[:, -1]
+
+
+def _tree_depth(left_children, right_children) -> int:
+    depth = 0
+    frontier = [(0, 0)]
+    while frontier:
+        node, d = frontier.pop()
+        if left_children[node] == -1:
+            depth = max(depth, d)
+            continue
+        frontier.append((int(left_children[node]), d + 1))
+        frontier.append((int(right_children[node]), d + 1))
+    return depth
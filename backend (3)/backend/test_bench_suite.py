@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from benchmarks.fake_mongo import FakeDatabase, fake_mongo
+from benchmarks.suite import compare, load_test, summarize
+
+
+def test_summarize_reports_throughput_and_percentiles():
+    result = summarize([i / 1000 for i in range(1, 101)], elapsed=2.0, errors=0)
+    assert result["count"] == 100 and result["throughput_per_s"] == 50.0
+    assert (result["p50_ms"], result["p95_ms"], result["p99_ms"]) == (51.0, 96.0, 100.0)
+    assert result["errors"] == 0
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"load": {"predict": {"throughput_per_s": 100.0, "p95_ms": 10.0},
+                         "home": {"throughput_per_s": 1000.0, "p95_ms": 1.0}},
+                "micro": {"cold_load": {"numpy": {"median_ms": 50.0}}}}
+    current = {"load": {"predict": {"throughput_per_s": 80.0, "p95_ms": 10.5},
+                        "home": {"throughput_per_s": 1200.0, "p95_ms": 0.8}},
+               "micro": {"cold_load": {"numpy": {"median_ms": 70.0}}}}
+
+    regressions = compare(current, baseline, threshold=0.10)
+    assert len(regressions) == 2
+    assert any(r.startswith("load.predict: throughput") for r in regressions)
+    assert any(r.startswith("micro.cold_load.numpy") for r in regressions)
+
+
+def test_fake_mongo_covers_the_queries_db_helpers_make():
+    async def main():
+        database = FakeDatabase()
+        predictions = database["predictions"]
+        for topic in ("a", "b", "a"):
+            await predictions.insert_one({"email": "x@y.z", "payload": {"topic_name": topic}})
+        latest = await predictions.aggregate([
+            {"$match": {"email": "x@y.z"}},
+            {"$sort": {"_id": -1}},
+            {"$group": {"_id": "$payload.topic_name", "payload": {"$first": "$payload"}, "last_id": {"$first": "$_id"}}},
+            {"$sort": {"last_id": -1}},
+        ])
+        topics = [doc["_id"] async for doc in latest]
+
+        page = await predictions.find({"email": "x@y.z"}, {"payload": 1}).sort("_id", -1).limit(2).to_list(length=2)
+
+        await database["users"].insert_one({"email": "x@y.z"})
+        with pytest.raises(DuplicateKeyError):
+            await database["users"].insert_one({"email": "x@y.z"})
+
+        update = [{"$set": {"n": {"$add": [{"$multiply": [{"$ifNull": ["$n", 0.0]}, 0.5]}, 1.0]}}}]
+        calibration = database["calibration"]
+        await calibration.find_one_and_update({"_id": "x@y.z"}, update, upsert=True, return_document=ReturnDocument.AFTER)
+        doc = await calibration.find_one_and_update({"_id": "x@y.z"}, update, upsert=True)
+        return topics, page, doc
+
+    topics, page, doc = asyncio.run(main())
+    assert topics == ["a", "b"]
+    assert len(page) == 2 and set(page[0]) == {"_id", "payload"}
+    assert doc["n"] == 1.5
+
+
+def test_load_test_drives_routes_through_the_app():
+    async def main():
+        with fake_mongo() as database:
+            results = await load_test(4, 2, llm_delay=0.0, only={"predict", "predict_history", "chat_llm"})
+        return results, database.stats()
+
+    results, stored = asyncio.run(main())
+    assert set(results) == {"predict", "predict_history", "chat_llm"}
+    for result in results.values():
+        assert result["count"] == 4 and result["errors"] == 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    assert stored["predictions"] >= 5
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import db.calibration_model as calibration_model
+import services.calibration as calibration
+from app import app
+from services.calibration import IDENTITY, Calibration, CalibrationCache
+
+PAYLOAD = {
+    "email": "cal@b.com",
+    "topic_name": "Photosynthesis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 2.0,
+    "review_count": 1,
+    "confidence": 2,
+    "difficulty": "medium",
+    "stress_level": 3,
+    "sleep_hours": 7.0,
+    "mood": "calm",
+    "distraction_level": 2,
+    "recent_event": "None",
+    "attention_level": 4,
+}
+
+
+def _sums(xs, ys):
+    xs, ys = np.asarray(xs, float), np.asarray(ys, float)
+    return dict(n=len(xs), sx=xs.sum(), sy=ys.sum(), sxx=(xs * xs).sum(), sxy=(xs * ys).sum())
+
+
+def test_no_outcomes_is_identity():
+    assert Calibration.from_doc({}) is IDENTITY
+    assert IDENTITY.apply(7.5) == 7.5
+
+
+def test_fit_converges_to_least_squares_with_many_outcomes():
+    xs = np.linspace(2, 20, 400)
+    ys = 1.0 + 0.5 * xs
+    fitted = Calibration(**_sums(xs, ys))
+    assert fitted.slope == pytest.approx(0.5, abs=0.01)
+    assert fitted.intercept == pytest.approx(1.0, abs=0.1)
+    assert fitted.apply(10.0) == pytest.approx(6.0, abs=0.1)
+
+
+def test_few_outcomes_are_shrunk_towards_the_model():
+    # One outcome, user forgets 4 days sooner than predicted
+    one = Calibration(**_sums([10.0], [6.0]), prior=5)
+    assert one.slope == 1.0
+    assert one.apply(10.0) == pytest.approx(10.0 - 4.0 / 6.0, abs=0.01)
+
+
+def test_slope_is_clamped_and_output_never_negative():
+    wild = Calibration(**_sums([1.0, 2.0, 3.0], [100.0, 0.0, -100.0]), prior=0)
+    assert wild.slope >= 0.25
+    assert wild.apply(np.array([0.0, 50.0])).min() >= 0.0
+
+
+def test_lru_cache_evicts_least_recent():
+    cache = CalibrationCache(max_size=2)
+    cache.put("a", IDENTITY)
+    cache.put("b", IDENTITY)
+    cache.get("a")
+    cache.put("c", IDENTITY)
+    assert cache.get("b") is None and cache.get("a") is IDENTITY
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_calibration_expires_so_other_workers_see_new_outcomes(monkeypatch):
+    stored = {}
+
+    async def fake_get(email):
+        return dict(stored)
+
+    monkeypatch.setattr(calibration_model, "get_calibration", fake_get)
+    monkeypatch.setattr(calibration, "CALIBRATIONS", CalibrationCache(ttl=0.05))
+
+    first = asyncio.run(calibration.get_user_calibration("ttl@b.com"))
+    # Another worker records outcomes: its sums land in MongoDB, not in this cache
+    stored.update(_sums([2.0, 4.0, 6.0, 8.0], [1.0, 2.0, 3.0, 4.0]))
+    cached = asyncio.run(calibration.get_user_calibration("ttl@b.com"))
+    time.sleep(0.06)
+    refreshed = asyncio.run(calibration.get_user_calibration("ttl@b.com"))
+
+    assert first is IDENTITY and cached is IDENTITY
+    assert refreshed.slope < 1.0
+    assert calibration.CALIBRATIONS.stats()["expirations"] == 1
+
+
+def test_outcomes_update_later_predictions(monkeypatch):
+    store = {}
+
+    async def fake_get(email):
+        return store.get(email, {})
+
+    async def fake_add(email, x, y, decay):
+        doc = store.setdefault(email, {"n": 0.0, "sx": 0.0, "sy": 0.0, "sxx": 0.0, "sxy": 0.0})
+        for field, term in (("n", 1.0), ("sx", x), ("sy", y), ("sxx", x * x), ("sxy", x * y)):
+            doc[field] = doc[field] * decay + term
+        return dict(doc)
+
+    monkeypatch.setattr(calibration_model, "get_calibration", fake_get)
+    monkeypatch.setattr(calibration_model, "add_observation", fake_add)
+    monkeypatch.setattr(calibration, "CALIBRATIONS", CalibrationCache())
+
+    with TestClient(app) as client:
+        before = client.post("/api/predict/", json=PAYLOAD).json()
+        assert before["prediction"] == before["model_prediction"]
+
+        for _ in range(20):
+            response = client.post("/api/predict/outcome", json={
+                "email": PAYLOAD["email"],
+                "model_prediction": before["model_prediction"],
+                "actual_days": before["model_prediction"] / 2,
+            }).json()
+            assert response["status"] == "success"
+
+        after = client.post("/api/predict/", json=PAYLOAD).json()
+        missing = client.post("/api/predict/outcome", json={"email": PAYLOAD["email"], "actual_days": 3}).json()
+
+    assert after["model_prediction"] == before["model_prediction"]
+    assert after["prediction"] < before["prediction"] * 0.75
+    assert missing["status"] == "error"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import routes.admin_routes as admin_routes
+import routes.chat_routes as chat_routes
+import services.chat_context as chat_context
+import services.chat_service as chat_service
+from app import app
+from benchmarks.fake_llm import FakeLLMServer
+from services.chat_context import ConversationStore
+from services.chat_service import ResponseCache, normalize_prompt, set_llm_client
+
+
+class BagOfWordsEmbedder:
+    """Stand-in for the transformer: unit vectors over a tiny fixed vocabulary."""
+
+    VOCAB = ["what", "is", "spaced", "repetition", "explain", "photosynthesis", "define"]
+
+    def embed(self, text):
+        words = text.split()
+        vector = np.array([words.count(w) for w in self.VOCAB], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  What is   Spaced Repetition?? ") == "what is spaced repetition"
+    assert normalize_prompt("what is spaced repetition") == normalize_prompt("WHAT IS SPACED REPETITION!")
+
+
+def test_exact_hits_lru_and_ttl():
+    cache = ResponseCache(max_size=2, ttl=0.05)
+    cache.put("a", "reply a")
+    cache.put("b", "reply b")
+    assert cache.get("a") == "reply a"
+    cache.put("c", "reply c")  # evicts "b", the least recently used
+    assert cache.get("b") is None
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 2
+
+
+def test_semantic_hit_above_threshold():
+    embedder = BagOfWordsEmbedder()
+    cache = ResponseCache(max_size=8, ttl=60, embedder=embedder, threshold=0.8)
+    key = "what is spaced repetition"
+    cache.put(key, "reply", embedder.embed(key))
+
+    close = "what is spaced repetition is"
+    assert cache.get(close, embedder.embed(close)) == "reply"
+    far = "explain photosynthesis"
+    assert cache.get(far, embedder.embed(far)) is None
+
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_routes_serve_repeats_from_cache(monkeypatch):
+    async def fake_save(email, sender, message):
+        pass
+
+    monkeypatch.setattr(chat_routes, "save_message", fake_save)
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(chat_service, "RESPONSE_CACHE", ResponseCache(max_size=16, ttl=60))
+
+    with FakeLLMServer(first_token_delay=0.0, token_delay=0.0) as llm:
+        from groq import AsyncGroq
+
+        set_llm_client(AsyncGroq(api_key="fake", base_url=llm.base_url))
+        try:
+            with TestClient(app) as client:
+                # Different students, so each message is standalone (no history) and cache-eligible
+                first = client.post("/api/chat/", json={"email": "c1@b.com", "message": "Define entropy?"}).json()
+                again = client.post("/api/chat/", json={"email": "c2@b.com", "message": "  define ENTROPY "}).json()
+                streamed = client.post("/api/chat/stream", json={"email": "c3@b.com", "message": "define entropy"})
+                bypass = client.post("/api/chat/", json={"email": "c4@b.com", "message": "Define entropy?", "no_cache": True})
+                stats = client.get("/api/chat/cache/stats", headers={"X-Admin-Token": "secret"}).json()["cache"]
+        finally:
+            set_llm_client(None)
+
+        assert first["reply"] == again["reply"] == llm.reply
+        assert "event: token" in streamed.text and llm.reply.split()[0] in streamed.text
+        assert bypass.json()["reply"] == llm.reply
+        # First call and the explicit bypass reached the LLM; the repeats did not
+        assert len(llm.requests) == 2
+
+    assert stats["exact_hits"] == 2
+    assert stats["bypassed"] == 1
+
+
+def test_follow_ups_are_cached_per_conversation(monkeypatch):
+    async def fake_save(email, sender, message):
+        return None
+
+    async def no_history(email, limit):
+        return []
+
+    async def nothing_saved(email):
+        return None
+
+    monkeypatch.setattr(chat_routes, "save_message", fake_save)
+    monkeypatch.setattr(chat_context, "CONVERSATIONS", ConversationStore(loader=no_history, latest=nothing_saved))
+    monkeypatch.setattr(chat_service, "RESPONSE_CACHE", ResponseCache(max_size=16, ttl=60))
+
+    def converse(client, email, *messages):
+        return [client.post("/api/chat/", json={"email": email, "message": m}).json()["reply"] for m in messages]
+
+    with FakeLLMServer(first_token_delay=0.0, token_delay=0.0) as llm:
+        from groq import AsyncGroq
+
+        set_llm_client(AsyncGroq(api_key="fake", base_url=llm.base_url))
+        try:
+            with TestClient(app) as client:
+                converse(client, "s1@b.com", "What is entropy?", "Give an example.")
+                # Same conversation so far: both replies come from the cache
+                converse(client, "s2@b.com", "What is entropy?", "Give an example.")
+                # Same follow-up after a different question: the cached example doesn't apply
+                converse(client, "s3@b.com", "What is osmosis?", "Give an example.")
+        finally:
+            set_llm_client(None)
+
+        assert len(llm.requests) == 4
+
+    stats = chat_service.RESPONSE_CACHE.stats()
+    assert stats["exact_hits"] == 2 and stats["bypassed"] == 0
+
+
+def test_failed_replies_are_not_cached(monkeypatch):
+    cache = ResponseCache(max_size=16, ttl=60)
+    monkeypatch.setattr(chat_service, "RESPONSE_CACHE", cache)
+
+    class Broken:
+        class chat:
+            class completions:
+                @staticmethod
+                async def create(**kwargs):
+                    raise RuntimeError("down")
+
+    set_llm_client(Broken())
+    try:
+        reply = asyncio.run(chat_service.chat_with_ai("anything at all"))
+    finally:
+        set_llm_client(None)
+
+    assert reply == chat_service.FALLBACK_REPLY
+    assert cache.stats()["size"] == 0
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
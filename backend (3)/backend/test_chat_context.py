@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import routes.admin_routes as admin_routes
+import routes.chat_routes as chat_routes
+import services.chat_context as chat_context
+from app import app
+from benchmarks.fake_llm import FakeLLMServer
+from benchmarks.fake_mongo import fake_mongo
+from db.chat_model import save_message
+from services.chat_context import Conversation, ConversationStore, estimate_tokens
+from services.chat_service import set_llm_client
+
+
+def _fill(conversation, exchanges):
+    for i in range(exchanges):
+        conversation.record(f"Question {i}. With some detail.", f"Answer {i}. " + "More words here. " * 10)
+
+
+def test_window_stays_within_budget():
+    conversation = Conversation(max_turns=20, summary_tokens=80)
+    _fill(conversation, 200)
+
+    for budget in (60, 200, 600, 5000):
+        messages = conversation.window(budget)
+        assert sum(estimate_tokens(m["content"]) for m in messages) <= budget
+    assert len(conversation.turns) == 20
+
+
+def test_window_keeps_newest_turns_and_summarises_older_ones():
+    conversation = Conversation(max_turns=10, summary_tokens=100)
+    _fill(conversation, 8)
+
+    messages = conversation.window(300)
+    assert messages[0]["role"] == "system"
+    assert messages[0]["content"].startswith("Summary of earlier conversation:")
+    assert "Student: Question" in messages[0]["content"]
+
+    verbatim = messages[1:]
+    assert verbatim[0]["role"] == "user"
+    assert verbatim[-1] == {"role": "assistant", "content": "Answer 7. " + "More words here. " * 10}
+
+
+def test_store_hydrates_once_and_bounds_users():
+    calls = []
+
+    async def loader(email, limit):
+        calls.append((email, limit))
+        return [{"sender": "user", "message": "hi"}, {"sender": "bot", "message": "hello"}]
+
+    store = ConversationStore(max_users=2, max_turns=6, loader=loader)
+
+    async def scenario():
+        first, second = await asyncio.gather(store.get("a"), store.get("a"))
+        assert first is second
+        assert [t.role for t in first.turns] == ["user", "assistant"]
+        await store.get("b")
+        await store.get("c")  # evicts "a"
+        await store.get("a")
+
+    asyncio.run(scenario())
+    assert calls == [("a", 6), ("b", 6), ("c", 6), ("a", 6)]
+    assert store.stats()["evictions"] == 2
+
+
+def test_workers_pick_up_each_others_turns():
+    email = "multi@b.com"
+    # One store per worker process, one shared database
+    worker_a, worker_b = ConversationStore(max_turns=10), ConversationStore(max_turns=10)
+
+    async def answer(store, question, reply):
+        conversation = await store.get(email)
+        history = [turn.content for turn in conversation.turns]
+        ids = (await save_message(email, "user", question), await save_message(email, "bot", reply))
+        conversation.record(question, reply, ids)
+        return history
+
+    async def scenario():
+        with fake_mongo():
+            seen = [
+                await answer(worker_a, "q1", "r1"),
+                await answer(worker_b, "q2", "r2"),
+                await answer(worker_a, "q3", "r3"),
+                await answer(worker_a, "q4", "r4"),
+            ]
+            return seen
+
+    seen = asyncio.run(scenario())
+    assert seen == [[], ["q1", "r1"], ["q1", "r1", "q2", "r2"], ["q1", "r1", "q2", "r2", "q3", "r3"]]
+    # A re-read only when B had answered in between; its own turns never trigger one
+    assert worker_a.stats()["resyncs"] == 1 and worker_b.stats()["resyncs"] == 0
+    assert worker_a.stats()["hydrations"] == 2
+
+
+def test_resync_keeps_turns_still_in_the_write_buffer():
+    flushed, pending = ObjectId(), ObjectId()
+    loaded = Conversation(max_turns=10)
+    loaded.append("user", "flushed", doc_id=flushed)
+    previous = Conversation(max_turns=10)
+    previous.append("user", "flushed", doc_id=flushed)
+    previous.append("bot", "not flushed yet", doc_id=pending)
+    previous.append("user", "never saved")
+
+    loaded.keep_unsaved(previous)
+    assert [turn.content for turn in loaded.turns] == ["flushed", "not flushed yet"]
+
+
+def test_sync_off_trusts_memory():
+    async def loader(email, limit):
+        return []
+
+    async def latest(email):
+        raise AssertionError("not consulted")
+
+    store = ConversationStore(loader=loader, latest=latest, sync=False)
+    asyncio.run(store.get("a"))
+    asyncio.run(store.get("a"))
+    assert store.stats()["hydrations"] == 1
+
+
+def test_idle_conversation_starts_fresh():
+    conversation = Conversation(max_turns=10)
+    conversation.append("user", "old question", at=time.time() - 10_000)
+    conversation.append("bot", "old answer", at=time.time() - 10_000)
+    assert conversation.is_idle(idle_after=1800)
+    conversation.record("new question", "new answer")
+    assert not conversation.is_idle(idle_after=1800)
+
+
+def test_chat_route_sends_recent_history(monkeypatch):
+    async def fake_save(email, sender, message):
+        pass
+
+    async def no_history(email, limit):
+        return []
+
+    async def nothing_saved(email):
+        return None
+
+    monkeypatch.setattr(chat_routes, "save_message", fake_save)
+    monkeypatch.setattr(chat_context, "CONVERSATIONS", ConversationStore(loader=no_history, latest=nothing_saved))
+
+    with FakeLLMServer(first_token_delay=0.0, token_delay=0.0) as llm:
+        from groq import AsyncGroq
+
+        set_llm_client(AsyncGroq(api_key="fake", base_url=llm.base_url))
+        try:
+            with TestClient(app) as client:
+                client.post("/api/chat/", json={"email": "ctx@b.com", "message": "What is recall?"})
+                client.post("/api/chat/", json={"email": "ctx@b.com", "message": "Give an example."})
+        finally:
+            set_llm_client(None)
+
+        first, second = (request["messages"] for request in llm.requests)
+
+    assert [m["role"] for m in first] == ["system", "user"]
+    assert [m["role"] for m in second] == ["system", "user", "assistant", "user"]
+    assert second[1]["content"] == "What is recall?"
+    assert second[2]["content"] == llm.reply
+
+
+@pytest.mark.parametrize("path", ["/api/chat/stream/stats", "/api/chat/cache/stats", "/api/chat/context/stats"])
+def test_chat_stats_need_the_admin_token(path, monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "secret")
+    with TestClient(app) as client:
+        anonymous = client.get(path)
+        wrong = client.get(path, headers={"X-Admin-Token": "nope"})
+        allowed = client.get(path, headers={"X-Admin-Token": "secret"})
+
+    assert anonymous.status_code == 401 and wrong.status_code == 401
+    assert allowed.status_code == 200 and allowed.json()["status"] == "success"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
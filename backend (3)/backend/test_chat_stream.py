@@ -0,0 +1,69 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import routes.admin_routes as admin_routes
+import routes.chat_routes as chat_routes
+from app import app
+from benchmarks.fake_llm import FakeLLMServer
+from services.chat_service import set_llm_client
+
+
+def _events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_relays_tokens_and_persists_reply(monkeypatch):
+    saved = []
+
+    async def fake_save(email, sender, message):
+        saved.append((email, sender, message))
+
+    monkeypatch.setattr(chat_routes, "save_message", fake_save)
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "secret")
+
+    with FakeLLMServer(first_token_delay=0.05, token_delay=0.001) as llm:
+        from groq import AsyncGroq
+
+        set_llm_client(AsyncGroq(api_key="fake", base_url=llm.base_url))
+        try:
+            with TestClient(app) as client:
+                response = client.post("/api/chat/stream", json={"email": "a@b.com", "message": "What is spaced repetition?"})
+                stats = client.get("/api/chat/stream/stats", headers={"X-Admin-Token": "secret"}).json()["stream"]
+        finally:
+            set_llm_client(None)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = _events(response.text)
+        tokens = [data["delta"] for name, data in events if name == "token"]
+        assert tokens == llm.tokens()
+
+        name, done = events[-1]
+        assert name == "done"
+        assert done["reply"] == llm.reply
+        assert done["ttft_ms"] >= 50
+        assert llm.requests[0]["stream"] is True
+
+    assert saved == [
+        ("a@b.com", "user", "What is spaced repetition?"),
+        ("a@b.com", "bot", llm.reply),
+    ]
+    assert stats["streams"] >= 1
+
+
+def test_stream_rejects_empty_message():
+    with TestClient(app) as client:
+        response = client.post("/api/chat/stream", json={"email": "a@b.com", "message": "  "})
+    assert _events(response.text) == [("error", {"message": "Message cannot be empty."})]
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
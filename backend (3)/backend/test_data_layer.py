@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import services.prediction_service as prediction_service
+from app import app
+from benchmarks.fake_mongo import fake_mongo
+from db.calibration_model import add_observation, get_calibration
+from db.chat_model import get_chat_history, get_recent_messages, save_message
+from db.notes_model import add_note, get_notes
+from db.prediction_model import (
+    get_latest_payloads, get_prediction, get_predictions, save_prediction, save_predictions,
+)
+from db.user_model import create_user, get_user, update_last_login, update_password_hash
+from services.executor import run_cpu
+
+
+def _run(coro):
+    """Run ``coro`` against a fresh in-memory database (no lifespan, so no write buffer)."""
+    async def main():
+        with fake_mongo():
+            return await coro()
+
+    return asyncio.run(main())
+
+
+def test_user_round_trip():
+    async def main():
+        created = await create_user("Ada@B.com", "hash-1")
+        await update_password_hash(created["_id"], "hash-2")
+        await update_last_login(created["_id"])
+        return created, await get_user("ADA@b.com"), await get_user("nobody@b.com")
+
+    created, found, missing = _run(main)
+    assert created["email"] == "ada@b.com"
+    assert found["_id"] == created["_id"] and found["password_hash"] == "hash-2"
+    assert found["last_login"] >= created["last_login"]
+    assert missing is None
+
+
+def test_chat_round_trip():
+    async def main():
+        for i in range(3):
+            await save_message("chat@b.com", "user" if i % 2 == 0 else "bot", f"message {i}")
+        await save_message("other@b.com", "user", "not mine")
+        return await get_chat_history("chat@b.com"), await get_recent_messages("chat@b.com", 2)
+
+    (history, next_cursor), recent = _run(main)
+    assert [m["message"] for m in history] == ["message 0", "message 1", "message 2"]
+    assert next_cursor is None
+    assert [m["message"] for m in recent] == ["message 1", "message 2"]
+
+
+def test_notes_round_trip():
+    async def main():
+        await add_note({"email": "notes@b.com", "title": "First", "content": "a"})
+        await add_note({"email": "notes@b.com", "title": "Second", "content": "b"})
+        return await get_notes("notes@b.com")
+
+    notes, next_cursor = _run(main)
+    assert [n["title"] for n in notes] == ["Second", "First"]
+    assert next_cursor is None
+
+
+def test_prediction_round_trip():
+    async def main():
+        one = await save_prediction("Pred@B.com", {"topic_name": "Osmosis"}, 4.2, 4.0, "v1")
+        await save_predictions("pred@b.com", [({"topic_name": "Osmosis"}, 5.0), ({"topic_name": "Cells"}, 3.0, 2.5)], "v1")
+        page, _ = await get_predictions("pred@b.com")
+        return (
+            page,
+            await get_prediction("pred@b.com", one),
+            await get_prediction("other@b.com", one),
+            await get_latest_payloads("pred@b.com"),
+        )
+
+    page, mine, theirs, latest = _run(main)
+    assert [p["prediction"] for p in page] == [3.0, 5.0, 4.2]
+    assert all(p["model_version"] == "v1" for p in page)
+    assert mine["prediction"] == 4.2 and mine["model_prediction"] == 4.0
+    assert theirs is None
+    assert [p["topic_name"] for p in latest] == ["Cells", "Osmosis"]
+
+
+def test_calibration_round_trip():
+    async def main():
+        before = await get_calibration("cal@b.com")
+        await add_observation("Cal@b.com", 2.0, 3.0, decay=0.5)
+        await add_observation("cal@b.com", 4.0, 5.0, decay=0.5)
+        return before, await get_calibration("cal@b.com")
+
+    before, after = _run(main)
+    assert before == {}
+    assert after["n"] == pytest.approx(1.5)
+    assert after["sx"] == pytest.approx(2.0 * 0.5 + 4.0)
+    assert after["sxy"] == pytest.approx(6.0 * 0.5 + 20.0)
+
+
+def test_run_cpu_keeps_the_event_loop_free():
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+
+        def blocking():
+            time.sleep(0.2)
+            return threading.current_thread().name
+
+        thread_name = await run_cpu(blocking)
+        task.cancel()
+        return thread_name, ticks
+
+    thread_name, ticks = asyncio.run(main())
+    assert thread_name.startswith("cpu")
+    # A blocking call on the loop itself would have allowed none
+    assert ticks >= 10
+
+
+def test_prediction_runs_on_the_cpu_executor(monkeypatch):
+    threads = []
+    original = prediction_service.predict_batch
+
+    def recording(rows, bundle=None):
+        threads.append(threading.current_thread().name)
+        return original(rows, bundle)
+
+    monkeypatch.setattr(prediction_service, "predict_batch", recording)
+    item = {
+        "topic_name": "Cells", "category": "science", "domain": "school", "category_type": "concept",
+        "study_time": 2.0, "review_count": 1, "confidence": 2, "difficulty": "medium", "stress_level": 3,
+        "sleep_hours": 7.0, "mood": "calm", "distraction_level": 2, "attention_level": 4,
+    }
+    with fake_mongo():
+        with TestClient(app) as client:
+            body = client.post("/api/predict/batch", json={"email": "cpu@b.com", "items": [item]}).json()
+
+    assert body["status"] == "success"
+    assert threads and threads[0].startswith("cpu")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+import db.connection as connection
+from db.connection import CircuitBreaker
+
+
+class FakeAdmin:
+    def __init__(self, server):
+        self.server = server
+
+    async def command(self, name):
+        self.server.pings += 1
+        if not self.server.up:
+            await asyncio.sleep(0.05)  # stands in for the server-selection timeout
+            raise ConnectionError("mongod is down")
+        return {"ok": 1}
+
+
+class FakeServer:
+    def __init__(self, up):
+        self.up = up
+        self.pings = 0
+        self.clients = 0
+
+    def client(self):
+        self.clients += 1
+        server = self
+
+        class Client:
+            admin = FakeAdmin(server)
+
+            def __getitem__(self, name):
+                return {"name": name}
+
+            async def close(self):
+                pass
+
+        return Client()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeServer(up=False)
+    monkeypatch.setattr(connection, "_new_client", fake.client)
+    monkeypatch.setattr(connection, "BREAKER", CircuitBreaker(base_delay=0.1, max_delay=0.4))
+    monkeypatch.setattr(connection, "_client", None)
+    monkeypatch.setattr(connection, "_db", None)
+    monkeypatch.setattr(connection, "_attempt_task", None)
+    return fake
+
+
+def test_breaker_backoff_doubles_and_caps():
+    breaker = CircuitBreaker(base_delay=1, max_delay=4)
+    delays = []
+    for _ in range(5):
+        breaker.record_failure()
+        delays.append(round(breaker.retry_at - time.monotonic()))
+    assert delays == [1, 2, 4, 4, 4]
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+
+
+def test_requests_fail_fast_while_mongo_is_down(server):
+    async def scenario():
+        # Concurrent first callers share one connection attempt
+        results = await asyncio.gather(*(connection.get_db() for _ in range(10)))
+        assert results == [None] * 10
+        assert server.pings == 1
+
+        start = time.perf_counter()
+        for _ in range(100):
+            assert await connection.get_db() is None
+        assert time.perf_counter() - start < 0.05
+        assert server.pings == 1
+
+    asyncio.run(scenario())
+    stats = connection.connection_stats()
+    assert stats["breaker"]["state"] == "open"
+    assert stats["breaker"]["rejected"] == 100
+
+
+def test_health_probe_recovers_without_traffic(server):
+    async def scenario():
+        probe = asyncio.create_task(connection.health_probe(interval=0.05))
+        try:
+            await asyncio.sleep(0.2)
+            assert connection.BREAKER.state == CircuitBreaker.OPEN
+            server.up = True
+            await asyncio.sleep(0.6)
+            assert connection.BREAKER.state == CircuitBreaker.CLOSED
+            assert await connection.get_db() == {"name": connection.DB_NAME}
+        finally:
+            probe.cancel()
+
+    asyncio.run(scenario())
+    assert connection.connection_stats()["connected"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+
+from services.google_auth_service import GoogleTokenVerifier, HttpCertSource, StaticCertSource
+
+
+def _keypair(key_id):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    return crypt.RSASigner.from_string(private_pem, key_id), public_pem
+
+
+def _token(signer, **claims):
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": "test-client",
+        "email": "student@example.com",
+        "iat": now,
+        "exp": now + 600,
+    }
+    payload.update(claims)
+    return jwt.encode(signer, payload).decode()
+
+
+class StubCertServer:
+    """Local stand-in for Google's cert endpoint that counts fetches."""
+
+    def __init__(self, certs, max_age=3600):
+        stub = self
+        self.certs = certs
+        self.max_age = max_age
+        self.requests = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                body = json.dumps(stub.certs).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={stub.max_age}, must-revalidate")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/certs"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def test_certs_cached_for_max_age():
+    signer, public_pem = _keypair("key-1")
+    stub = StubCertServer({"key-1": public_pem}, max_age=3600)
+    try:
+        verifier = GoogleTokenVerifier(HttpCertSource(stub.url), audience="test-client")
+        for i in range(5):
+            assert verifier.verify(_token(signer, sub=str(i)))["email"] == "student@example.com"
+        assert stub.requests == 1
+
+        # max-age=0 forces a refetch on every new token
+        stub.max_age = 0
+        verifier = GoogleTokenVerifier(HttpCertSource(stub.url), audience="test-client")
+        verifier.verify(_token(signer, sub="a"))
+        verifier.verify(_token(signer, sub="b"))
+        assert stub.requests == 3
+    finally:
+        stub.close()
+
+
+def test_verified_token_cache_skips_signature_check():
+    signer, public_pem = _keypair("key-1")
+    verifier = GoogleTokenVerifier(StaticCertSource({"key-1": public_pem}), audience="test-client")
+    token = _token(signer)
+
+    verifier.verify(token)
+    verifier.verify(token)
+    verifier.verify(token)
+
+    stats = verifier.stats()
+    assert stats["cache_misses"] == 1
+    assert stats["cache_hits"] == 2
+    assert stats["cert_fetches"] == 1
+
+
+def test_rotated_key_triggers_refresh():
+    old_signer, old_pem = _keypair("old")
+    new_signer, new_pem = _keypair("new")
+    source = StaticCertSource({"old": old_pem}, max_age=3600)
+    verifier = GoogleTokenVerifier(source, audience="test-client")
+    verifier.verify(_token(old_signer))
+    # As if the last fetch were more than a refresh interval ago
+    verifier.certs.min_refresh_interval = 0
+
+    source.certs = {"old": old_pem, "new": new_pem}
+    assert verifier.verify(_token(new_signer))["email"] == "student@example.com"
+    assert verifier.stats()["cert_fetches"] == 2
+
+
+def test_unknown_key_ids_refetch_at_most_once_per_interval():
+    signer, public_pem = _keypair("key-1")
+    verifier = GoogleTokenVerifier(StaticCertSource({"key-1": public_pem}), audience="test-client")
+    verifier.verify(_token(signer))
+
+    # Made-up key ids, e.g. a flood of forged tokens: refused without hitting Google each time
+    forgers = [_keypair(f"made-up-{i}")[0] for i in range(2)]
+    for i in range(20):
+        with pytest.raises(ValueError):
+            verifier.verify(_token(forgers[i % 2], sub=str(i)))
+
+    stats = verifier.stats()
+    assert stats["cert_fetches"] == 1
+    assert stats["cert_refreshes_throttled"] == 20
+    # Known keys keep working meanwhile
+    assert verifier.verify(_token(signer, sub="again"))["email"] == "student@example.com"
+
+
+def test_rejects_bad_tokens():
+    signer, public_pem = _keypair("key-1")
+    other_signer, _ = _keypair("key-1")
+    verifier = GoogleTokenVerifier(StaticCertSource({"key-1": public_pem}), audience="test-client")
+
+    with pytest.raises(ValueError):
+        verifier.verify(_token(other_signer))
+    with pytest.raises(ValueError):
+        verifier.verify(_token(signer, aud="someone-else"))
+    with pytest.raises(ValueError):
+        verifier.verify(_token(signer, iss="https://evil.example.com"))
+    with pytest.raises(ValueError):
+        verifier.verify(_token(signer, iat=int(time.time()) - 7200, exp=int(time.time()) - 3600))
+
+
+if __name__ == "__main__":
+    test_certs_cached_for_max_age()
+    test_verified_token_cache_skips_signature_check()
+    test_rotated_key_triggers_refresh()
+    test_unknown_key_ids_refetch_at_most_once_per_interval()
+    test_rejects_bad_tokens()
+    print("Google token verification checks passed.")
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from pymongo import AsyncMongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from db.indexes import ensure_indexes, index_report
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017")
+
+
+async def _scratch_db():
+    client = AsyncMongoClient(MONGO_URI, serverSelectionTimeoutMS=500)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        await client.close()
+        pytest.skip(f"no mongod reachable at {MONGO_URI}")
+    return client, client[f"index_test_{uuid.uuid4().hex[:8]}"]
+
+
+def _stages(plan: dict) -> list:
+    stages = [plan.get("stage")]
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            stages += _stages(plan[child])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return stages
+
+
+def _index_names(plan: dict) -> set:
+    names = {plan["indexName"]} if "indexName" in plan else set()
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            names |= _index_names(plan[child])
+    return names
+
+
+def test_history_and_login_queries_use_indexes():
+    async def scenario():
+        client, db = await _scratch_db()
+        try:
+            first = await ensure_indexes(db)
+            assert first["errors"] == []
+            assert len(first["created"]) == 4
+            again = await ensure_indexes(db)
+            assert again["created"] == [] and len(again["existing"]) == 4
+
+            for name in ("chat_history", "notes", "predictions"):
+                col = db[name]
+                await col.insert_many([{"email": f"u{i % 20}@x.com", "n": i} for i in range(500)])
+                explain = await col.find({"email": "u3@x.com"}).sort("_id", -1).limit(50).explain()
+                plan = explain["queryPlanner"]["winningPlan"]
+                assert "IXSCAN" in _stages(plan) and "COLLSCAN" not in _stages(plan)
+                # The index provides the order - no in-memory sort
+                assert "SORT" not in _stages(plan)
+                assert _index_names(plan) == {"email_1__id_-1"}
+
+            users = db["users"]
+            await users.insert_one({"email": "a@x.com"})
+            explain = await users.find({"email": "a@x.com"}).limit(1).explain()
+            assert "IXSCAN" in _stages(explain["queryPlanner"]["winningPlan"])
+            with pytest.raises(DuplicateKeyError):
+                await users.insert_one({"email": "a@x.com"})
+
+            report = await index_report(db)
+            assert all(entry["missing"] == [] for entry in report.values())
+        finally:
+            await client.drop_database(db.name)
+            await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_report_flags_missing_indexes():
+    async def scenario():
+        client, db = await _scratch_db()
+        try:
+            await db["notes"].insert_one({"email": "a@x.com"})
+            report = await index_report(db)
+            assert report["notes"]["missing"] == ["email_1__id_-1"]
+        finally:
+            await client.drop_database(db.name)
+            await client.close()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,176 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import services.log as log
+from app import app
+from services.executor import run_cpu
+from services.log import REQUEST_ID, JsonFormatter, _NonBlockingQueueHandler, debug_sampled
+
+PAYLOAD = {
+    "email": "logging@b.com",
+    "topic_name": "Osmosis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 3.5,
+    "review_count": 2,
+    "confidence": 3,
+    "difficulty": "hard",
+    "stress_level": 2,
+    "sleep_hours": 6.5,
+    "mood": "calm",
+    "distraction_level": 1,
+    "recent_event": "None",
+    "attention_level": 3,
+}
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Route logging into a buffer at DEBUG, sampling every event."""
+    buffer = io.StringIO()
+    log.shutdown_logging()
+    log.configure_logging(level="DEBUG", fmt="json", stream=buffer)
+    monkeypatch.setattr(log, "LOG_SAMPLE_RATE", 1.0)
+    yield buffer
+    log.shutdown_logging()
+    logging.getLogger().setLevel(log.LOG_LEVEL)
+
+
+def _entries(buffer):
+    return [json.loads(line) for line in buffer.getvalue().splitlines() if line.strip()]
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = logging.LogRecord("services.test", logging.WARNING, __file__, 1, "Saved %d rows", (3,), None)
+    record.request_id = "abc123"
+    record.collection = "predictions"
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "Saved 3 rows"
+    assert entry["level"] == "WARNING" and entry["logger"] == "services.test"
+    assert entry["request_id"] == "abc123"
+    assert entry["collection"] == "predictions"
+
+
+def test_request_id_is_echoed_and_reaches_logs_from_worker_threads(captured):
+    with TestClient(app) as client:
+        given = client.post("/api/predict/", json=PAYLOAD, headers={"X-Request-ID": "req-42"})
+        generated = client.get("/")
+        invalid = client.get("/", headers={"X-Request-ID": "bad id\twith spaces"})
+
+    assert given.headers["x-request-id"] == "req-42"
+    assert len(generated.headers["x-request-id"]) == 32
+    assert invalid.headers["x-request-id"] != "bad id\twith spaces"
+
+    # The prediction dump is logged from the CPU thread pool via run_cpu
+    dumps = [e for e in _entries(captured) if e["msg"] == "Prediction"]
+    assert dumps and dumps[0]["request_id"] == "req-42"
+    assert dumps[0]["sampled"] is True and dumps[0]["difficulty"] == "hard"
+
+
+def test_run_cpu_carries_context_into_the_thread():
+    async def main():
+        REQUEST_ID.set("ctx-1")
+        return await run_cpu(REQUEST_ID.get)
+
+    assert asyncio.run(main()) == "ctx-1"
+
+
+def test_debug_sampled_respects_rate_and_level():
+    logger = logging.getLogger("test.sampled")
+    handler = _NonBlockingQueueHandler(queue.Queue())
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.setLevel(logging.INFO)
+        debug_sampled(logger, "hidden", rate=1.0)
+        logger.setLevel(logging.DEBUG)
+        for _ in range(50):
+            debug_sampled(logger, "never", rate=0.0)
+        debug_sampled(logger, "always", rate=1.0, field=1)
+
+        records = [handler.queue.get_nowait() for _ in range(handler.queue.qsize())]
+        assert [r.msg for r in records] == ["always"]
+        assert records[0].field == 1 and records[0].sampled is True
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_full_queue_drops_records_without_blocking():
+    logger = logging.getLogger("test.full")
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        start = time.perf_counter()
+        for i in range(100):
+            logger.warning("record %d", i)
+        elapsed = time.perf_counter() - start
+
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 98
+        assert elapsed < 0.5
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_serverless_entry_point_logs_without_a_lifespan():
+    script = (
+        "import logging, runpy\n"
+        "runpy.run_path('api/index.py')\n"
+        "logging.getLogger('probe').info('cold start', extra={'route': 'vercel'})\n"
+        "from services.log import shutdown_logging\n"
+        "shutdown_logging()\n"
+    )
+    env = {**os.environ, "LOG_LEVEL": "INFO", "LOG_FORMAT": "json"}
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", script], cwd=Path(__file__).resolve().parent,
+                         env=env, capture_output=True, text=True, check=True)
+
+    records = [json.loads(line) for line in out.stdout.splitlines() if line.startswith("{")]
+    assert {"level": "INFO", "logger": "probe", "msg": "cold start", "route": "vercel"}.items() <= records[-1].items()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_worker_restarts_the_writer(captured):
+    """A preloaded master configures logging, then forks: the child must get its own writer thread."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(read_fd)
+            with os.fdopen(write_fd, "w") as out:
+                log.configure_logging(fmt="json", stream=out)
+                logging.getLogger("test.fork").warning("from the worker")
+                log.shutdown_logging()
+                code = 0 if log.logging_stats()["queued"] == 0 else 2
+        finally:
+            os._exit(code)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as child_out:
+        lines = child_out.read().splitlines()
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert [json.loads(line)["msg"] for line in lines] == ["from the worker"]
+    # The parent's writer is untouched
+    logging.getLogger("test.fork").warning("from the master")
+    log.shutdown_logging()
+    assert "from the master" in captured.getvalue()
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import services.metrics as metrics
+from app import app
+from services.metrics import CallbackMetric, Counter, Histogram, STAGE_ERRORS, STAGE_LATENCY, render, stage
+
+PAYLOAD = {
+    "email": "metrics@b.com",
+    "topic_name": "Photosynthesis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 2.0,
+    "review_count": 1,
+    "confidence": 2,
+    "difficulty": "medium",
+    "stress_level": 3,
+    "sleep_hours": 7.0,
+    "mood": "calm",
+    "distraction_level": 2,
+    "recent_event": "None",
+    "attention_level": 4,
+}
+
+
+@pytest.fixture
+def isolated(monkeypatch):
+    # Metrics created in a test register globally; drop them afterwards
+    monkeypatch.setattr(metrics, "_METRICS", list(metrics._METRICS))
+
+
+def test_histogram_renders_cumulative_buckets(isolated):
+    histogram = Histogram("test_seconds", "test", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "a")
+
+    text = "\n".join(histogram.render())
+    assert 'test_seconds_bucket{kind="a",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{kind="a",le="1"} 3' in text
+    assert 'test_seconds_bucket{kind="a",le="+Inf"} 4' in text
+    assert 'test_seconds_count{kind="a"} 4' in text
+    assert 'test_seconds_sum{kind="a"} 3.65' in text
+
+
+def test_counter_labels_are_escaped_and_broken_gauges_skipped(isolated):
+    counter = Counter("test_total", "test", ("where",))
+    counter.inc('say "hi"')
+    counter.inc('say "hi"', amount=2)
+    CallbackMetric("test_broken", "test", lambda: 1 / 0)
+
+    text = render()
+    assert 'test_total{where="say \\"hi\\""} 3' in text
+    assert "test_broken" not in text
+
+
+def test_stage_records_latency_and_errors():
+    before_count = STAGE_LATENCY.snapshot("test_stage")[2]
+    before_errors = STAGE_ERRORS.value("test_stage")
+
+    with stage("test_stage"):
+        time.sleep(0.002)
+    with pytest.raises(RuntimeError):
+        with stage("test_stage"):
+            raise RuntimeError("boom")
+
+    _, total, count = STAGE_LATENCY.snapshot("test_stage")
+    assert count == before_count + 2 and total >= 0.002
+    assert STAGE_ERRORS.value("test_stage") == before_errors + 1
+
+
+def test_metrics_endpoint_reports_routes_and_stages():
+    with TestClient(app) as client:
+        assert client.post("/api/predict/", json=PAYLOAD).json()["status"] == "success"
+        client.get("/api/predict/history/someone@b.com")
+        client.get("/no/such/path")
+        response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    # Route templates, not raw paths
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/predict/"}' in text
+    assert 'route="/api/predict/history/{email}"' in text and "someone@b.com" not in text
+    assert 'route="unmatched",status="404"' in text
+    for name in ("validation", "preprocess", "predict", "mongo_write"):
+        assert f'stage_duration_seconds_count{{stage="{name}"}}' in text
+    assert 'cache_hit_ratio{cache="prediction"}' in text
+    assert "model_info{version=" in text
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,186 @@
+import json
+import shutil
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import routes.admin_routes as admin_routes
+import services.model_registry as model_registry
+from app import app
+from services.model_loader import MODEL_DIR
+from services.model_registry import ModelBundle, ModelRegistry, load_bundle
+from services.prediction_service import predict_batch, predict_days_until_forget
+from services.preprocess import ENCODER, FEATURE_ORDER
+
+PAYLOAD = {
+    "topic_name": "Photosynthesis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 2.0,
+    "review_count": 1,
+    "confidence": 2,
+    "difficulty": "medium",
+    "stress_level": 3,
+    "sleep_hours": 7.0,
+    "mood": "calm",
+    "distraction_level": 2,
+    "recent_event": "None",
+    "attention_level": 4,
+}
+
+BUNDLE_FILES = ["memory_model.json", "preprocess_params.json"]
+
+
+class ConstantModel:
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return np.full(len(X), self.value)
+
+
+def _bundle(version, value):
+    return ModelBundle(version, ConstantModel(value), ENCODER, MODEL_DIR / "memory_model.json",
+                       f"digest-{version}", MODEL_DIR, {})
+
+
+def _add_version(models_dir, version, feature_order=FEATURE_ORDER):
+    bundle_dir = models_dir / "versions" / version
+    bundle_dir.mkdir(parents=True)
+    for name in BUNDLE_FILES:
+        shutil.copy(MODEL_DIR / name, bundle_dir / name)
+    manifest = {"version": version, "created_at": "2026-10-18T00:00:00Z", "feature_order": feature_order}
+    (bundle_dir / "manifest.json").write_text(json.dumps(manifest))
+    return bundle_dir
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    for name in BUNDLE_FILES:
+        shutil.copy(MODEL_DIR / name, tmp_path / name)
+    return tmp_path
+
+
+def test_flat_directory_is_versioned_by_hash(models_dir):
+    bundle = load_bundle(None, models_dir, backend="numpy")
+    assert bundle.version == f"sha-{bundle.digest[:12]}"
+    assert bundle.encoder.feature_order == FEATURE_ORDER
+
+
+def test_newest_bundle_wins_unless_current_names_one(models_dir):
+    registry = ModelRegistry(models_dir, pinned=None, backend="numpy")
+    flat = registry.current()
+    assert flat.version.startswith("sha-")
+
+    _add_version(models_dir, "2026-10-01")
+    _add_version(models_dir, "2026-10-18")
+    assert registry.check()
+    assert registry.current().version == "2026-10-18"
+    assert [v["active"] for v in registry.versions()] == [False, True]
+
+    (models_dir / "versions" / "CURRENT").write_text("2026-10-01\n")
+    assert registry.check()
+    assert registry.current().version == "2026-10-01"
+
+    # Nothing changed since: no reload
+    assert not registry.check()
+    assert registry.stats()["swaps"] == 3
+
+
+def test_incomplete_or_bad_bundles_are_not_swapped_in(models_dir):
+    registry = ModelRegistry(models_dir, pinned=None, backend="numpy")
+    serving = registry.current()
+
+    # No manifest yet (still being copied): ignored
+    (models_dir / "versions" / "half-copied").mkdir(parents=True)
+    assert not registry.check()
+
+    _add_version(models_dir, "reordered", feature_order=list(reversed(FEATURE_ORDER)))
+    assert not registry.check()
+    assert registry.current() is serving
+    assert registry.stats()["failed_loads"] == 1
+
+    with pytest.raises(FileNotFoundError):
+        registry.reload("missing")
+    with pytest.raises(ValueError):
+        registry.reload("../models")
+    assert registry.current() is serving
+
+
+def test_promote_moves_every_worker(models_dir):
+    _add_version(models_dir, "v1")
+    _add_version(models_dir, "v2")
+    # Two workers serving from the same directory
+    first, second = (ModelRegistry(models_dir, pinned=None, backend="numpy") for _ in range(2))
+    assert first.current().version == second.current().version == "v2"
+
+    assert first.promote("v1").version == "v1"
+    assert second.check()
+    assert second.current().version == "v1"
+    assert not first.check()
+    # A worker-local reload would have left the other one behind
+    assert first.reload("v2").version == "v2" and not second.check()
+
+    with pytest.raises(FileNotFoundError):
+        first.promote("v9")
+    assert (models_dir / "versions" / "CURRENT").read_text().strip() == "v1"
+
+
+def test_promote_under_a_pin_only_moves_this_worker(models_dir):
+    _add_version(models_dir, "v1")
+    _add_version(models_dir, "v2")
+    registry = ModelRegistry(models_dir, pinned="v2", backend="numpy")
+    registry.current()
+
+    assert registry.promote("v1").version == "v1"
+    assert registry.pinned == "v1"
+    assert not registry.check()
+
+
+def test_in_flight_requests_keep_their_bundle():
+    old, new = _bundle("old", 3.0), _bundle("new", 9.0)
+    registry = ModelRegistry(MODEL_DIR, pinned=None)
+    registry._bundle = old
+    taken = registry.current()
+
+    swapped = []
+    registry.add_listener(lambda before, after: swapped.append((before.version, after.version)))
+    registry._swap(new)
+
+    assert predict_days_until_forget(PAYLOAD, taken) == 3.0
+    assert predict_batch([PAYLOAD, PAYLOAD], registry.current()) == [9.0, 9.0]
+    assert swapped == [("old", "new")]
+
+
+def test_responses_are_tagged_with_the_model_version(monkeypatch, models_dir):
+    registry = ModelRegistry(models_dir, pinned=None, backend="numpy")
+    _add_version(models_dir, "v1")
+    monkeypatch.setattr(model_registry, "REGISTRY", registry)
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "secret")
+
+    with TestClient(app) as client:
+        assert client.post("/api/admin/models/reload", json={}).status_code == 401
+        wrong = client.post("/api/admin/models/reload", json={}, headers={"X-Admin-Token": "nope"})
+        assert wrong.status_code == 401
+
+        reloaded = client.post("/api/admin/models/reload", json={"version": "v1"}, headers={"X-Admin-Token": "secret"})
+        assert reloaded.status_code == 200
+        assert reloaded.json()["model"]["version"] == "v1"
+        assert reloaded.json()["all_workers"] is True
+        assert (models_dir / "versions" / "CURRENT").read_text().strip() == "v1"
+        assert registry.pinned is None
+
+        unknown = client.post("/api/admin/models/reload", json={"version": "v9"}, headers={"X-Admin-Token": "secret"})
+        assert unknown.status_code == 404
+
+        prediction = client.post("/api/predict/", json={**PAYLOAD, "email": "registry@b.com"}).json()
+        model = client.get("/api/predict/model").json()["model"]
+
+    assert prediction["status"] == "success"
+    assert prediction["model_version"] == model["version"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import db.chat_model as chat_model
+import db.notes_model as notes_model
+from app import app
+from db.pagination import InvalidCursor, fetch_page
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:length]
+
+
+class FakeCollection:
+    """Just enough of a collection for keyset queries on ``email`` + ``_id``."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.projections = []
+
+    def find(self, query, projection=None):
+        self.projections.append(projection)
+        id_range = query.get("_id", {})
+
+        def matches(doc):
+            return (
+                doc["email"] == query["email"]
+                and ("$lt" not in id_range or doc["_id"] < id_range["$lt"])
+                and ("$gt" not in id_range or doc["_id"] > id_range["$gt"])
+            )
+
+        return FakeCursor([dict(doc) for doc in self.docs if matches(doc)])
+
+
+def _collection(n):
+    docs = [{"_id": ObjectId(), "email": "a@b.com", "message": f"m{i}"} for i in range(n)]
+    docs.append({"_id": ObjectId(), "email": "other@b.com", "message": "not mine"})
+    return FakeCollection(docs)
+
+
+def _page(col, **kwargs):
+    return asyncio.run(fetch_page(col, {"email": "a@b.com"}, {"message": 1}, lambda doc: doc["message"], **kwargs))
+
+
+def test_walks_backwards_through_every_document_once():
+    col = _collection(23)
+    seen, cursor = [], None
+    while True:
+        items, cursor = _page(col, before=cursor, limit=5)
+        seen.extend(items)
+        if cursor is None:
+            break
+    assert seen == [f"m{i}" for i in range(22, -1, -1)]
+    assert col.projections[0] == {"message": 1}
+
+
+def test_after_walks_forwards_and_chat_order_is_oldest_first():
+    col = _collection(10)
+    oldest = str(col.docs[0]["_id"])
+
+    items, cursor = _page(col, after=oldest, limit=4)
+    assert items == ["m4", "m3", "m2", "m1"]
+    items, _ = _page(col, after=cursor, limit=4, newest_first=False)
+    assert items == ["m5", "m6", "m7", "m8"]
+
+    items, cursor = _page(col, limit=3, newest_first=False)
+    assert items == ["m7", "m8", "m9"]
+    assert cursor == str(col.docs[7]["_id"])
+
+
+def test_rejects_bad_cursors():
+    col = _collection(3)
+    with pytest.raises(InvalidCursor):
+        _page(col, before="not-an-id")
+    with pytest.raises(InvalidCursor):
+        _page(col, before=str(ObjectId()), after=str(ObjectId()))
+
+
+def test_history_route_pages_and_returns_400_for_bad_cursor(monkeypatch):
+    col = _collection(7)
+
+    async def fake_col():
+        return col
+
+    monkeypatch.setattr(chat_model, "get_chat_col", fake_col)
+    with TestClient(app) as client:
+        first = client.get("/api/chat/a@b.com", params={"limit": 4}).json()
+        second = client.get("/api/chat/a@b.com", params={"limit": 4, "before": first["next_cursor"]}).json()
+        bad = client.get("/api/chat/a@b.com", params={"before": "zzz"})
+
+    assert [m["message"] for m in first["history"]] == ["m3", "m4", "m5", "m6"]
+    assert [m["message"] for m in second["history"]] == ["m0", "m1", "m2"]
+    assert second["next_cursor"] is None
+    assert bad.status_code == 400
+
+
+def test_notes_stay_newest_first_across_pages(monkeypatch):
+    col = _collection(5)
+    for doc in col.docs:
+        doc["title"] = doc["message"]
+
+    async def fake_col():
+        return col
+
+    monkeypatch.setattr(notes_model, "get_notes_col", fake_col)
+    with TestClient(app) as client:
+        first = client.get("/api/notes/a@b.com", params={"limit": 3}).json()
+        second = client.get("/api/notes/a@b.com", params={"limit": 3, "before": first["next_cursor"]}).json()
+
+    # The order the unpaged endpoint always had
+    assert [n["title"] for n in first["notes"] + second["notes"]] == ["m4", "m3", "m2", "m1", "m0"]
+    assert second["next_cursor"] is None
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import signal
+
+import pytest
+from fastapi.testclient import TestClient
+
+import services.password_service as password_service
+from app import app
+from benchmarks.fake_mongo import fake_mongo
+from db.user_model import create_user, get_user
+from services.password_service import PasswordHasher, PasswordQueueFull, PasswordTooLong
+
+# The lowest cost bcrypt allows, so each hash takes about a millisecond
+ROUNDS = 4
+
+
+def worker_pid() -> int:
+    """Runs in the pool; module-level so a spawned worker can import it by name."""
+    return os.getpid()
+
+
+def _rounds(password_hash: str) -> int:
+    return int(password_hash.split("$")[2])
+
+
+def test_hash_and_verify_run_on_the_process_pool():
+    hasher = PasswordHasher(pool_size=1, queue_max=4, rounds=ROUNDS)
+
+    async def main():
+        pid = await hasher._submit(worker_pid)
+        password_hash = await hasher.hash("correct horse")
+        return pid, password_hash, await hasher.verify("correct horse", password_hash), await hasher.verify("wrong", password_hash)
+
+    try:
+        pid, password_hash, good, bad = asyncio.run(main())
+        assert hasher.stats()["pool_size"] == 1
+    finally:
+        hasher.shutdown()
+
+    assert pid != os.getpid()
+    assert _rounds(password_hash) == ROUNDS
+    assert good == (True, None)
+    assert bad == (False, None)
+    assert hasher.stats()["pending"] == 0
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_a_killed_worker_does_not_break_later_logins():
+    hasher = PasswordHasher(pool_size=1, queue_max=4, rounds=ROUNDS)
+
+    async def main():
+        password_hash = await hasher.hash("correct horse")
+        first_pid = await hasher._submit(worker_pid)
+        os.kill(first_pid, signal.SIGKILL)  # e.g. the OOM killer
+        verified = await hasher.verify("correct horse", password_hash)
+        return first_pid, verified, await hasher._submit(worker_pid)
+
+    try:
+        first_pid, verified, second_pid = asyncio.run(main())
+        restarts = hasher.stats()["pool_restarts"]
+    finally:
+        hasher.shutdown()
+
+    assert verified == (True, None)
+    assert restarts == 1
+    assert second_pid not in (first_pid, os.getpid())
+
+
+def test_too_long_password_crosses_the_pool_boundary():
+    hasher = PasswordHasher(pool_size=0, rounds=ROUNDS)
+    with pytest.raises(PasswordTooLong):
+        asyncio.run(hasher.hash("x" * 5000))
+
+
+def test_queue_full_rejects_without_waiting():
+    hasher = PasswordHasher(pool_size=0, queue_max=1, rounds=ROUNDS)
+
+    async def main():
+        return await asyncio.gather(hasher.hash("one"), hasher.hash("two"), return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert first.startswith("$2b$")
+    assert isinstance(second, PasswordQueueFull) and second.retry_after == 1
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_login_rehashes_when_bcrypt_rounds_change(monkeypatch):
+    old = PasswordHasher(pool_size=0, rounds=ROUNDS)
+    monkeypatch.setattr(password_service, "PASSWORD_HASHER", PasswordHasher(pool_size=0, rounds=ROUNDS + 1))
+
+    with fake_mongo():
+        asyncio.run(create_user("rehash@b.com", asyncio.run(old.hash("s3cret-pass"))))
+        with TestClient(app) as client:
+            first = client.post("/api/auth/login", json={"email": "rehash@b.com", "password": "s3cret-pass"})
+            stored = asyncio.run(get_user("rehash@b.com"))["password_hash"]
+            second = client.post("/api/auth/login", json={"email": "rehash@b.com", "password": "s3cret-pass"})
+            wrong = client.post("/api/auth/login", json={"email": "rehash@b.com", "password": "not-it"})
+
+    assert first.status_code == 200 and first.json()["mode"] == "login"
+    assert _rounds(stored) == ROUNDS + 1
+    # Upgraded once; the new hash is current
+    assert second.status_code == 200
+    assert password_service.PASSWORD_HASHER.stats()["rehashed"] == 1
+    assert wrong.status_code == 401
+
+
+def test_login_returns_429_when_the_queue_is_full(monkeypatch):
+    monkeypatch.setattr(password_service, "PASSWORD_HASHER", PasswordHasher(pool_size=0, queue_max=0, rounds=ROUNDS))
+
+    with fake_mongo():
+        with TestClient(app) as client:
+            response = client.post("/api/auth/login", json={"email": "busy@b.com", "password": "s3cret-pass"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert password_service.PASSWORD_HASHER.stats()["rejected"] == 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,124 @@
+import warnings
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic.warnings import PydanticDeprecatedSince20
+
+import routes.prediction_routes as prediction_routes
+from app import app
+from benchmarks.fake_mongo import fake_mongo
+
+ITEM = {
+    "topic_name": "Photosynthesis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 2.0,
+    "review_count": 1,
+    "confidence": 2,
+    "difficulty": "medium",
+    "stress_level": 3,
+    "sleep_hours": 7.0,
+    "mood": "calm",
+    "distraction_level": 2,
+    "recent_event": "None",
+    "attention_level": 4,
+}
+
+
+@pytest.fixture
+def saves(monkeypatch):
+    """Every ``save_predictions`` call the route makes, passed through to the real one."""
+    calls = []
+    original = prediction_routes.save_predictions
+
+    async def counting(email, items, model_version=None):
+        calls.append((email, items, model_version))
+        await original(email, items, model_version)
+
+    monkeypatch.setattr(prediction_routes, "save_predictions", counting)
+    return calls
+
+
+def test_rows_are_validated_one_by_one(saves):
+    items = [
+        ITEM,
+        {k: v for k, v in ITEM.items() if k != "mood"},  # missing field (pydantic)
+        {**ITEM, "category": ""},  # empty required field (route check)
+        {**ITEM, "review_count": "many"},  # wrong type (pydantic)
+        {**ITEM, "topic_name": "Osmosis", "study_time": 5.5, "confidence": 4},
+    ]
+    with fake_mongo() as database:
+        with TestClient(app) as client:
+            body = client.post("/api/predict/batch", json={"email": "Batch@B.com", "items": items}).json()
+        # Closing the client drained the write buffer
+        stored = database["predictions"]._docs.values()
+
+    assert body["status"] == "partial"
+    assert body["succeeded"] == 2 and body["failed"] == 3
+    assert [r["index"] for r in body["results"]] == [0, 1, 2, 3, 4]
+    assert [r["status"] for r in body["results"]] == ["success", "error", "error", "error", "success"]
+    assert "mood" in body["results"][1]["message"]
+    assert body["results"][2]["message"] == "Missing required fields: category"
+    assert "review_count" in body["results"][3]["message"]
+    assert all(r["prediction"] is None for r in body["results"][1:4])
+
+    # One write for the whole batch, of the valid rows only
+    assert len(saves) == 1
+    email, saved, version = saves[0]
+    assert email.lower() == "batch@b.com" and version == body["model_version"]
+    assert [payload["topic_name"] for payload, _, _ in saved] == ["Photosynthesis", "Osmosis"]
+    assert sorted(doc["payload"]["topic_name"] for doc in stored) == ["Osmosis", "Photosynthesis"]
+    assert all(doc["email"] == "batch@b.com" for doc in stored)
+
+
+def test_batch_matches_single_predictions(saves):
+    items = [ITEM, {**ITEM, "difficulty": "hard", "sleep_hours": 4.0}]
+    with fake_mongo():
+        with TestClient(app) as client:
+            batch = client.post("/api/predict/batch", json={"email": "same@b.com", "items": items}).json()
+            singles = [client.post("/api/predict/", json={**item, "email": "same@b.com"}).json() for item in items]
+
+    assert batch["status"] == "success" and batch["failed"] == 0
+    assert [r["prediction"] for r in batch["results"]] == pytest.approx([s["prediction"] for s in singles])
+
+
+def test_all_rows_invalid_is_an_error_and_writes_nothing(saves):
+    items = [{**ITEM, "confidence": None}, {"topic_name": "Empty"}]
+    with fake_mongo():
+        with TestClient(app) as client:
+            body = client.post("/api/predict/batch", json={"email": "bad@b.com", "items": items}).json()
+
+    assert body["status"] == "error"
+    assert body["succeeded"] == 0 and body["failed"] == 2
+    assert body["model_version"] is None
+    assert saves == []
+
+
+def test_oversized_and_empty_batches_are_rejected(saves, monkeypatch):
+    monkeypatch.setattr(prediction_routes, "MAX_BATCH_SIZE", 3)
+    with fake_mongo():
+        with TestClient(app) as client:
+            too_big = client.post("/api/predict/batch", json={"email": "big@b.com", "items": [ITEM] * 4}).json()
+            at_limit = client.post("/api/predict/batch", json={"email": "big@b.com", "items": [ITEM] * 3}).json()
+            empty = client.post("/api/predict/batch", json={"email": "big@b.com", "items": []}).json()
+
+    assert too_big == {"status": "error", "message": "Batch too large: 4 items (max 3)", "results": []}
+    assert at_limit["status"] == "success" and at_limit["succeeded"] == 3
+    assert empty["status"] == "error" and empty["results"] == []
+    assert len(saves) == 1
+
+
+def test_no_pydantic_deprecation_warnings(saves):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        with fake_mongo():
+            with TestClient(app) as client:
+                client.post("/api/predict/", json={**ITEM, "email": "warn@b.com"})
+                client.post("/api/predict/batch", json={"email": "warn@b.com", "items": [ITEM]})
+
+    assert not [w for w in caught if issubclass(w.category, PydanticDeprecatedSince20)]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
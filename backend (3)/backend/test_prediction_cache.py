@@ -0,0 +1,122 @@
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import routes.admin_routes as admin_routes
+import services.prediction_service as prediction_service
+from app import app
+from services.model_registry import REGISTRY
+from services.prediction_service import PredictionCache, _predict_matrix
+
+
+class CountingBundle:
+    """Stands in for a ModelBundle: a digest, and a predict that records the rows it was asked for."""
+
+    def __init__(self, digest: str, offset: float = 0.0):
+        self.digest = digest
+        self.offset = offset
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        return X.sum(axis=1) + self.offset
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = PredictionCache(max_size=8, ttl=60)
+    monkeypatch.setattr(prediction_service, "PREDICTION_CACHE", cache)
+    return cache
+
+
+def test_hits_lru_eviction_and_ttl():
+    cache = PredictionCache(max_size=2, ttl=0.05)
+    cache.put("a", 1.0)
+    cache.put("b", 2.0)
+    assert cache.get("a") == 1.0
+    cache.put("c", 3.0)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3.0
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+    assert stats["size"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_zero_ttl_never_expires_and_zero_size_disables():
+    cache = PredictionCache(max_size=4, ttl=0)
+    cache.put("a", 1.0)
+    assert cache.get("a") == 1.0
+    assert not PredictionCache(max_size=0, ttl=60).enabled
+
+
+def test_only_unseen_rows_reach_the_model(cache):
+    bundle = CountingBundle("v1")
+    X = np.array([[1.0, 2.0], [3.0, 4.0]])
+
+    assert _predict_matrix(X, bundle)[0] == [3.0, 7.0]
+    # One repeat, one new row; -0.0 and 0.0 are the same input
+    assert _predict_matrix(np.array([[3.0, 4.0], [-0.0, 5.0]]), bundle)[0] == [7.0, 5.0]
+    assert _predict_matrix(np.array([[0.0, 5.0]]), bundle)[0] == [5.0]
+
+    assert bundle.calls == [2, 1]
+    assert cache.stats()["hits"] == 2
+
+
+def test_model_time_is_reported_only_when_every_row_was_predicted(cache):
+    bundle = CountingBundle("v1")
+    _, seconds = _predict_matrix(np.array([[1.0, 2.0]]), bundle)
+    assert seconds is not None and seconds >= 0
+    assert _predict_matrix(np.array([[1.0, 2.0], [5.0, 6.0]]), bundle)[1] is None
+    assert _predict_matrix(np.array([[1.0, 2.0]]), bundle)[1] is None
+
+
+def test_a_different_model_digest_misses(cache):
+    X = np.array([[1.0, 2.0]])
+    old, new = CountingBundle("v1"), CountingBundle("v2", offset=10.0)
+
+    assert _predict_matrix(X, old)[0] == [3.0]
+    assert _predict_matrix(X, new)[0] == [13.0]
+    assert new.calls == [1]
+
+
+def test_registry_swap_clears_the_cache(cache):
+    _predict_matrix(np.array([[1.0, 2.0]]), CountingBundle("v1"))
+    assert cache.stats()["size"] == 1
+
+    # What the registry runs after swapping in a new bundle
+    for listener in REGISTRY._listeners:
+        listener(None, None)
+
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_disabled_cache_always_predicts(monkeypatch):
+    monkeypatch.setattr(prediction_service, "PREDICTION_CACHE", PredictionCache(max_size=0, ttl=60))
+    bundle = CountingBundle("v1")
+    X = np.array([[1.0, 2.0]])
+    _predict_matrix(X, bundle)
+    _predict_matrix(X, bundle)
+    assert bundle.calls == [1, 1]
+
+
+def test_stats_endpoint_needs_the_admin_token(cache, monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "secret")
+    with TestClient(app) as client:
+        anonymous = client.get("/api/predict/cache/stats")
+        wrong = client.get("/api/predict/cache/stats", headers={"X-Admin-Token": "nope"})
+        response = client.get("/api/predict/cache/stats", headers={"X-Admin-Token": "secret"})
+
+    assert anonymous.status_code == 401 and wrong.status_code == 401
+    assert response.json()["cache"]["max_size"] == 8
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
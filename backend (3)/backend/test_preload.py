@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import os
+import runpy
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import services.log as log
+from db.write_buffer import WRITE_BUFFER
+from services.model_registry import REGISTRY
+from services.prediction_service import SHADOW
+
+CONFIG = Path(__file__).with_name("gunicorn.conf.py")
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+
+
+def _in_child(check):
+    """Run ``check()`` in a forked child, as gunicorn runs a worker; returns its (JSON) result."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(read_fd)
+            result = check()
+            with os.fdopen(write_fd, "w") as out:
+                json.dump(result, out)
+            code = 0
+        finally:
+            os._exit(code)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as child_out:
+        output = child_out.read()
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0, "worker check raised"
+    return json.loads(output)
+
+
+def test_post_fork_restarts_per_process_threads():
+    config = runpy.run_path(str(CONFIG))
+    assert config["preload_app"] is True
+    server = SimpleNamespace(log=logging.getLogger("test.gunicorn"))
+
+    # The master after preloading: model loaded, writer and worker threads running
+    log.configure_logging()
+    bundle = REGISTRY.current()
+    REGISTRY.start_watcher(30)
+    SHADOW.set_candidate(bundle)
+
+    def worker():
+        inherited = {
+            "log_writer": log._listener._thread is not None and log._listener._thread.is_alive(),
+            "watcher": REGISTRY._watcher.is_alive(),
+            "shadow": SHADOW._thread.is_alive(),
+        }
+        config["post_fork"](server, SimpleNamespace(pid=os.getpid()))
+
+        async def flusher_starts():
+            WRITE_BUFFER.start()
+            running = WRITE_BUFFER.running
+            await WRITE_BUFFER.close()
+            return running
+
+        return {
+            "inherited": inherited,
+            "log_writer": log._listener_pid == os.getpid() and log._listener._thread.is_alive(),
+            "watcher": REGISTRY._watcher.is_alive(),
+            "shadow": SHADOW._thread.is_alive(),
+            "model_shared": REGISTRY.peek() is bundle,
+            "write_buffer": asyncio.run(flusher_starts()),
+        }
+
+    try:
+        result = _in_child(worker)
+    finally:
+        REGISTRY.stop_watcher()
+        SHADOW.set_candidate(None)
+        SHADOW.stop()
+
+    # Without the hook a worker would be left with none of them
+    assert result.pop("inherited") == {"log_writer": False, "watcher": False, "shadow": False}
+    assert result == {"log_writer": True, "watcher": True, "shadow": True, "model_shared": True, "write_buffer": True}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
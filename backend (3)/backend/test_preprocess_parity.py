@@ -0,0 +1,113 @@
+import random
+import time
+
+import numpy as np
+
+from services.preprocess import (
+    CATEGORICAL_VALUE_MAPPINGS,
+    ENCODER,
+    FEATURE_ORDER,
+    preprocess_batch,
+    preprocess_payload,
+    preprocess_payload_reference,
+)
+
+base = {
+    'topic_name': 'Test',
+    'category': 'science',
+    'domain': 'school',
+    'category_type': 'concept',
+    'study_time': 1.5,
+    'review_count': 2,
+    'confidence': 4,
+    'difficulty': 'medium',
+    'stress_level': 2,
+    'sleep_hours': 7.5,
+    'mood': 'calm',
+    'distraction_level': 1,
+    'recent_event': 'none',
+    'attention_level': 4
+}
+
+
+def _cases():
+    cases = [dict(base), {}]
+
+    # Every known categorical value, plus case/whitespace variants and unknowns
+    for col, mapping in CATEGORICAL_VALUE_MAPPINGS.items():
+        for value in list(mapping) + ["unknown-value", "Quantum Basket Weaving"]:
+            cases.append(dict(base, **{col: value}))
+            cases.append(dict(base, **{col: f"  {value.upper()} "}))
+        cases.append(dict(base, **{col: 0}))
+        cases.append(dict(base, **{col: 3}))
+
+    # Empty / None / missing / junk values in every column
+    for col in FEATURE_ORDER:
+        for value in [None, "", "   ", "abc", "12", 7, 2.5, True]:
+            cases.append(dict(base, **{col: value}))
+        missing = dict(base)
+        missing.pop(col)
+        cases.append(missing)
+
+    rng = random.Random(42)
+    for _ in range(200):
+        row = dict(base)
+        row['topic_name'] = ''.join(rng.choice('abcdefghij XYZ') for _ in range(rng.randint(0, 20)))
+        row['study_time'] = rng.uniform(0, 10)
+        row['review_count'] = rng.randint(0, 15)
+        row['confidence'] = rng.randint(1, 5)
+        row['sleep_hours'] = rng.uniform(3, 10)
+        for col, mapping in CATEGORICAL_VALUE_MAPPINGS.items():
+            row[col] = rng.choice(list(mapping))
+        cases.append(row)
+
+    return cases
+
+
+def test_single_row_parity():
+    for payload in _cases():
+        expected = preprocess_payload_reference(payload)
+        actual = preprocess_payload(payload)
+        assert actual.dtype == np.float64
+        assert actual.shape == expected.shape
+        assert np.array_equal(actual, expected), payload
+
+
+def test_batch_parity():
+    cases = _cases()
+    expected = np.vstack([preprocess_payload_reference(p) for p in cases])
+    assert np.array_equal(preprocess_batch(cases), expected)
+
+
+def test_preallocated_outputs():
+    cases = _cases()[:50]
+    expected = preprocess_batch(cases)
+
+    out64 = np.empty((len(cases), len(FEATURE_ORDER)), dtype=np.float64)
+    assert ENCODER.transform_batch(cases, out=out64) is out64
+    assert np.array_equal(out64, expected)
+
+    out32 = np.empty((len(cases), len(FEATURE_ORDER)), dtype=np.float32)
+    assert ENCODER.transform_batch(cases, out=out32) is out32
+    assert np.array_equal(out32, expected.astype(np.float32))
+
+
+if __name__ == "__main__":
+    test_single_row_parity()
+    test_batch_parity()
+    test_preallocated_outputs()
+    print("Compiled encoder matches the reference path exactly.")
+
+    n = 2000
+    start = time.perf_counter()
+    for _ in range(n):
+        preprocess_payload_reference(base)
+    reference_us = (time.perf_counter() - start) / n * 1e6
+
+    start = time.perf_counter()
+    for _ in range(n):
+        preprocess_payload(base)
+    compiled_us = (time.perf_counter() - start) / n * 1e6
+
+    print(f"Reference: {reference_us:8.1f} us/row")
+    print(f"Compiled:  {compiled_us:8.1f} us/row")
@@ -0,0 +1,214 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import routes.chat_routes as chat_routes
+import services.chat_service as chat_service
+import services.rate_limit as rate_limit
+from app import app
+from services.chat_service import ResponseCache, normalize_prompt
+from services.metrics import RATE_LIMITED
+from services.rate_limit import (
+    LLMBusy, MemoryBackend, RateLimiter, client_email, client_ip, make_backend, parse_rules,
+)
+
+
+def test_parse_rules_orders_longest_prefix_first():
+    rules = parse_rules("POST /api=100/60; POST /api/chat=20/60:10; /api/chat/stream=5/1")
+    assert [rule.name for rule in rules] == ["/api/chat/stream", "POST /api/chat", "POST /api"]
+
+    chat = rules[1]
+    assert chat.capacity == 10 and chat.refill_per_second == pytest.approx(20 / 60)
+    # No burst given: the bucket holds one period's worth
+    assert rules[2].capacity == 100
+
+    limiter = RateLimiter(rules)
+    assert limiter.match("POST", "/api/chat/").name == "POST /api/chat"
+    assert limiter.match("GET", "/api/chat/stream/stats").name == "/api/chat/stream"
+    assert limiter.match("GET", "/api/chat/a@b.com") is None
+
+    assert parse_rules("") == []
+    with pytest.raises(ValueError):
+        parse_rules("POST /api/chat=twenty/60")
+
+
+def test_memory_bucket_spends_burst_then_refills():
+    backend = MemoryBackend()
+
+    async def run():
+        waits = [await backend.take("k", 3, 10.0) for _ in range(4)]
+        await asyncio.sleep(0.12)
+        return waits, await backend.take("k", 3, 10.0)
+
+    waits, after_refill = asyncio.run(run())
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0 < waits[3] <= 0.1
+    assert after_refill == 0.0
+
+
+def test_memory_backend_evicts_least_recently_used_keys():
+    backend = MemoryBackend(max_keys=2)
+
+    async def run():
+        for key in ("a", "b", "a", "c"):
+            await backend.take(key, 1, 1.0)
+
+    asyncio.run(run())
+    assert backend.keys() == 2
+    assert list(backend._buckets) == ["a", "c"]
+
+
+def test_client_ip_and_email(monkeypatch):
+    scope = {"path": "/api/predict", "headers": [(b"x-forwarded-for", b"203.0.113.9, 10.0.0.1")], "client": ("10.0.0.1", 5000)}
+    assert client_email(scope, b'{"email": "Ada@Example.com", "message": "hi"}') == "ada@example.com"
+    assert client_email({**scope, "path": "/api/predict/list/Ada@example.com"}) == "ada@example.com"
+    assert client_email(scope, b'{"message": "hi"}') is None
+
+    assert client_ip(scope) == "10.0.0.1"
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_PROXY", True)
+    assert client_ip(scope) == "203.0.113.9"
+
+
+def test_app_returns_429_with_retry_after_per_user(monkeypatch):
+    limiter = RateLimiter(parse_rules("POST /api/auth=2/60"), llm_max_concurrency=0, ip_factor=5)
+    monkeypatch.setattr(rate_limit, "LIMITER", limiter)
+    before = RATE_LIMITED.value("POST /api/auth")
+
+    with TestClient(app) as client:
+        # Missing password: a 422 from validation, which still costs a token
+        codes = [client.post("/api/auth/login", json={"email": "limited@b.com"}).status_code for _ in range(3)]
+        rejected = client.post("/api/auth/login", json={"email": "limited@b.com"})
+        other_user = client.post("/api/auth/login", json={"email": "other@b.com"})
+        metrics = client.get("/metrics").text
+
+    assert codes == [422, 422, 429]
+    assert rejected.status_code == 429
+    assert 1 <= int(rejected.headers["Retry-After"]) <= 30
+    assert rejected.json()["status"] == "error"
+    assert rejected.json()["retry_after"] == int(rejected.headers["Retry-After"])
+    assert "x-request-id" in rejected.headers
+    assert other_user.status_code == 422
+
+    assert limiter.stats()["rejected"] == {"POST /api/auth": 2}
+    assert RATE_LIMITED.value("POST /api/auth") - before == 2
+    # Counted under a route label, not lumped in with unmatched paths
+    assert 'route="unmatched",status="429"' not in metrics
+    assert 'status="429"} 2' in metrics
+
+
+def _login(client, email, ip):
+    return client.post("/api/auth/login", json={"email": email}, headers={"X-Forwarded-For": ip}).status_code
+
+
+def test_emails_are_not_trusted_as_the_bucket_key(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_PROXY", True)
+    monkeypatch.setattr(rate_limit, "LIMITER", RateLimiter(parse_rules("POST /api/auth=2/60"), ip_factor=2))
+
+    with TestClient(app) as client:
+        # A fresh email per request only shares out the IP's budget (2 x 2)
+        rotating = [_login(client, f"user{i}@b.com", "198.51.100.1") for i in range(6)]
+        # Naming a victim from another address spends that address's tokens, not the victim's
+        spoofed = [_login(client, "victim@b.com", "198.51.100.2") for _ in range(3)]
+        victim = [_login(client, "victim@b.com", "198.51.100.3") for _ in range(2)]
+
+    assert rotating == [422, 422, 422, 422, 429, 429]
+    assert spoofed == [422, 422, 429]
+    assert victim == [422, 422]
+
+
+def test_llm_slot_queues_then_raises_busy():
+    limiter = RateLimiter([], llm_max_concurrency=1, llm_queue_timeout=0.1)
+
+    async def run():
+        async with limiter.llm_slot():
+            assert limiter.stats()["llm"]["in_flight"] == 1
+            t0 = time.perf_counter()
+            with pytest.raises(LLMBusy) as busy:
+                async with limiter.llm_slot():
+                    pass
+            waited = time.perf_counter() - t0
+
+        # Freed on the way out, so the next call gets it straight away
+        async with limiter.llm_slot():
+            pass
+        return busy.value, waited
+
+    busy, waited = asyncio.run(run())
+    assert busy.retry_after == 1 and waited >= 0.1
+    assert limiter.stats()["llm"]["in_flight"] == 0
+    assert limiter.stats()["rejected"] == {"llm_concurrency": 1}
+
+
+def test_cached_replies_skip_the_llm_slot(monkeypatch):
+    async def fake_save(email, sender, message):
+        pass
+
+    limiter = RateLimiter([], llm_max_concurrency=1, llm_queue_timeout=0.05)
+    cache = ResponseCache(max_size=16, ttl=60)
+    cache.put(normalize_prompt("What is spaced repetition?"), "cached reply")
+    monkeypatch.setattr(rate_limit, "LIMITER", limiter)
+    monkeypatch.setattr(chat_service, "RESPONSE_CACHE", cache)
+    monkeypatch.setattr(chat_routes, "save_message", fake_save)
+
+    class Unreachable:
+        class chat:
+            class completions:
+                @staticmethod
+                async def create(**kwargs):
+                    raise AssertionError("reached the LLM without a slot")
+
+    # Every slot taken, as if by a long LLM call elsewhere
+    asyncio.run(limiter.acquire_llm_slot())
+    chat_service.set_llm_client(Unreachable())
+    try:
+        with TestClient(app) as client:
+            cached = client.post("/api/chat/", json={"email": "slot1@b.com", "message": "What is spaced repetition?"})
+            cached_stream = client.post("/api/chat/stream", json={"email": "slot2@b.com", "message": "what is spaced repetition"})
+            busy = client.post("/api/chat/", json={"email": "slot3@b.com", "message": "Explain osmosis"})
+            busy_stream = client.post("/api/chat/stream", json={"email": "slot4@b.com", "message": "Explain osmosis"})
+    finally:
+        chat_service.set_llm_client(None)
+
+    assert cached.status_code == 200 and cached.json()["reply"] == "cached reply"
+    assert "cached reply" in cached_stream.text and "event: done" in cached_stream.text
+
+    assert busy.status_code == 429 and busy.headers["Retry-After"] == "1"
+    assert busy.json()["retry_after"] == 1
+    assert "event: error" in busy_stream.text and '"retry_after": 1' in busy_stream.text
+    assert limiter.stats()["rejected"] == {"llm_concurrency": 2}
+    assert limiter.stats()["llm"]["in_flight"] == 1
+
+
+def test_failing_shared_backend_falls_back_to_memory():
+    class Down(MemoryBackend):
+        name = "down"
+
+        async def take(self, *args):
+            raise ConnectionError("connection refused")
+
+    limiter = RateLimiter(parse_rules("POST /api/chat=1/60"), backend=Down())
+    rule = limiter.rules[0]
+
+    async def run():
+        return [await limiter.check(rule, "email:a@b.com") for _ in range(2)]
+
+    first, second = asyncio.run(run())
+    assert first == 0.0 and second > 0
+    # Two buckets (IP, then IP + email) per check
+    assert limiter.stats()["backend_errors"] == 4
+
+
+def test_redis_backend_without_package_uses_memory():
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        assert isinstance(make_backend("redis"), MemoryBackend)
+    else:
+        pytest.skip("redis is installed")
+    assert isinstance(make_backend("nonsense"), MemoryBackend)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import app
+from services.prediction_service import predict_batch
+from services.schedule_service import build_schedule, simulate_reviews
+
+TOPIC = {
+    "topic_name": "Photosynthesis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 2.0,
+    "review_count": 1,
+    "confidence": 2,
+    "difficulty": "medium",
+    "stress_level": 3,
+    "sleep_hours": 7.0,
+    "mood": "calm",
+    "distraction_level": 2,
+    "recent_event": "None",
+    "attention_level": 4,
+}
+
+
+def _topics(n):
+    rng = np.random.default_rng(0)
+    return [
+        dict(TOPIC, topic_name=f"topic {i}", study_time=float(rng.uniform(0.5, 8)),
+             confidence=int(rng.integers(1, 6)), review_count=int(rng.integers(0, 6)))
+        for i in range(n)
+    ]
+
+
+def test_each_step_matches_predicting_the_bumped_payloads():
+    topics = _topics(20)
+    intervals, review_counts, confidences = simulate_reviews(topics, steps=3)
+
+    for step in range(3):
+        bumped = [
+            dict(t, review_count=t["review_count"] + step, confidence=min(t["confidence"] + step, 5))
+            for t in topics
+        ]
+        expected = np.maximum(predict_batch(bumped), 1.0)
+        np.testing.assert_allclose(np.round(intervals[step], 2), expected)
+        assert review_counts[step].tolist() == [b["review_count"] for b in bumped]
+        assert confidences[step].tolist() == [b["confidence"] for b in bumped]
+
+
+def test_schedule_is_cumulative_and_calendar_is_sorted():
+    schedule = build_schedule([TOPIC], steps=4)
+    reviews = schedule["topics"][0]["reviews"]
+    assert [r["step"] for r in reviews] == [1, 2, 3, 4]
+    assert all(b["day"] > a["day"] for a, b in zip(reviews, reviews[1:]))
+    dates = [entry["date"] for entry in schedule["calendar"]]
+    assert dates == sorted(dates)
+
+
+def test_500_topics_10_steps_is_fast():
+    topics = _topics(500)
+    build_schedule(topics[:5], steps=1)  # load the model outside the timing
+    start = time.perf_counter()
+    schedule = build_schedule(topics, steps=10)
+    elapsed = time.perf_counter() - start
+    assert len(schedule["topics"]) == 500
+    assert elapsed < 1.0, elapsed
+
+
+def test_schedule_route_with_explicit_topics():
+    with TestClient(app) as client:
+        ok = client.post("/api/predict/schedule", json={"email": "a@b.com", "steps": 3, "topics": [TOPIC], "start_date": "2026-01-01"}).json()
+        bad = client.post("/api/predict/schedule", json={"email": "a@b.com", "steps": 3, "topics": [{"topic_name": "x"}]}).json()
+        too_many = client.post("/api/predict/schedule", json={"email": "a@b.com", "steps": 999, "topics": [TOPIC]}).json()
+
+    assert ok["status"] == "success"
+    assert ok["start_date"] == "2026-01-01"
+    assert len(ok["topics"][0]["reviews"]) == 3
+    assert bad["status"] == "error" and bad["message"].startswith("topics[0]: Missing required fields")
+    assert too_many["status"] == "error"
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import routes.admin_routes as admin_routes
+import services.prediction_service as prediction_service
+from app import app
+from services.model_loader import MODEL_DIR
+from services.model_registry import ModelBundle
+from services.prediction_service import ShadowEvaluator, predict_batch
+from services.preprocess import ENCODER, CompiledEncoder
+
+PAYLOAD = {
+    "topic_name": "Photosynthesis",
+    "category": "science",
+    "domain": "school",
+    "category_type": "concept",
+    "study_time": 2.0,
+    "review_count": 1,
+    "confidence": 2,
+    "difficulty": "medium",
+    "stress_level": 3,
+    "sleep_hours": 7.0,
+    "mood": "calm",
+    "distraction_level": 2,
+    "recent_event": "None",
+    "attention_level": 4,
+}
+
+
+class ConstantModel:
+    def __init__(self, value, delay=0.0, gate=None):
+        self.value = value
+        self.delay = delay
+        self.gate = gate
+        self.seen = []
+
+    def predict(self, X):
+        self.seen.append(np.array(X))
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(self.delay)
+        return np.full(len(X), self.value)
+
+
+def _bundle(version, model, encoder=ENCODER):
+    return ModelBundle(version, model, encoder, MODEL_DIR / "memory_model.json", f"digest-{version}", MODEL_DIR, {})
+
+
+def _rows(n):
+    return [dict(PAYLOAD, study_time=float(i + 1)) for i in range(n)]
+
+
+def _wait_for(evaluator, requests):
+    deadline = time.monotonic() + 5
+    while evaluator.stats()["requests"] < requests and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return evaluator.stats()
+
+
+@pytest.fixture
+def evaluator(monkeypatch):
+    shadow = ShadowEvaluator(sample_pct=100, queue_size=100)
+    monkeypatch.setattr(prediction_service, "SHADOW", shadow)
+    # Rows repeat across tests; a cached request has no primary latency to compare
+    monkeypatch.setattr(prediction_service, "PREDICTION_CACHE", prediction_service.PredictionCache(max_size=64, ttl=60))
+    yield shadow
+    shadow.stop()
+
+
+def test_divergence_is_aggregated_in_the_background(evaluator):
+    primary = _bundle("primary", ConstantModel(3.0))
+    evaluator.set_candidate(_bundle("candidate", ConstantModel(5.5)))
+
+    assert predict_batch(_rows(4), primary) == [3.0] * 4
+    assert predict_batch(_rows(6), primary) == [3.0] * 6
+    stats = _wait_for(evaluator, 2)
+
+    assert stats["candidate_version"] == "candidate" and stats["primary_version"] == "primary"
+    assert stats["rows"] == 10
+    assert stats["mean_abs_diff"] == 2.5 and stats["mean_diff"] == 2.5 and stats["max_abs_diff"] == 2.5
+    assert stats["shadow_latency_ms"]["p95"] is not None
+
+
+def test_slow_candidate_stays_off_the_response_path(evaluator):
+    primary = _bundle("primary", ConstantModel(3.0))
+    evaluator.set_candidate(_bundle("slow", ConstantModel(3.0, delay=0.3)))
+
+    start = time.perf_counter()
+    for _ in range(3):
+        predict_batch(_rows(2), primary)
+    assert time.perf_counter() - start < 0.3
+
+    stats = _wait_for(evaluator, 3)
+    assert stats["shadow_latency_ms"]["mean"] >= 300
+    assert stats["primary_latency_ms"]["mean"] < 100
+
+
+def test_primary_latency_times_the_model_not_the_cache(evaluator):
+    primary = _bundle("timed", ConstantModel(3.0, delay=0.05))
+    evaluator.set_candidate(_bundle("candidate", ConstantModel(3.0)))
+
+    rows = _rows(2)
+    predict_batch(rows, primary)
+    predict_batch(rows, primary)  # served from the cache: compared, but not timed
+    stats = _wait_for(evaluator, 2)
+
+    assert stats["requests"] == 2
+    assert list(evaluator.primary_window) == [pytest.approx(0.05, abs=0.04)]
+    assert stats["primary_latency_ms"]["mean"] >= 50
+
+
+def test_full_queue_drops_instead_of_waiting(monkeypatch):
+    gate = threading.Event()
+    shadow = ShadowEvaluator(sample_pct=100, queue_size=1)
+    monkeypatch.setattr(prediction_service, "SHADOW", shadow)
+    primary = _bundle("primary", ConstantModel(3.0))
+    shadow.set_candidate(_bundle("stuck", ConstantModel(3.0, gate=gate)))
+
+    for _ in range(5):
+        predict_batch(_rows(1), primary)
+    assert shadow.stats()["dropped"] >= 3
+    gate.set()
+    shadow.stop()
+
+
+def test_sampling_and_switching_off(evaluator):
+    primary = _bundle("primary", ConstantModel(3.0))
+    candidate = ConstantModel(4.0)
+    evaluator.set_candidate(_bundle("candidate", candidate), sample_pct=0)
+    predict_batch(_rows(3), primary)
+
+    evaluator.set_candidate(None)
+    predict_batch(_rows(3), primary)
+    time.sleep(0.05)
+    assert candidate.seen == []
+    assert evaluator.stats()["enabled"] is False
+
+
+def test_candidate_with_other_scaler_gets_its_own_matrix(evaluator):
+    params = ENCODER.to_params()
+    params["mean"] = [value + 1.0 for value in params["mean"]]
+    other = CompiledEncoder.from_params(params)
+    candidate = ConstantModel(3.0)
+
+    evaluator.set_candidate(_bundle("rescaled", candidate, encoder=other))
+    rows = _rows(3)
+    predict_batch(rows, _bundle("primary", ConstantModel(3.0)))
+    _wait_for(evaluator, 1)
+
+    np.testing.assert_array_equal(candidate.seen[0], other.transform_batch(rows))
+
+
+def test_stats_endpoint(evaluator, monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "secret")
+    with TestClient(app) as client:
+        anonymous = client.get("/api/predict/shadow/stats")
+        response = client.get("/api/predict/shadow/stats", headers={"X-Admin-Token": "secret"}).json()
+    assert anonymous.status_code == 401
+    assert response["status"] == "success"
+    assert "mean_abs_diff" in response["shadow"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
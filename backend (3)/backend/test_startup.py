@@ -0,0 +1,77 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.import_time import HEAVY_PACKAGES, parse_importtime
+from services.lazy import lazy_import
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+
+def test_importing_the_app_skips_heavy_dependencies():
+    script = (
+        "import json, sys, app\n"
+        "modules = sorted(sys.modules)\n"
+        "print(json.dumps({'modules': modules, 'paths': sorted(app.app.openapi()['paths'])}))"
+    )
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", script],
+                         cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    report = json.loads(out.stdout.strip().splitlines()[-1])
+
+    loaded = {name.split(".")[0] for name in report["modules"]}
+    assert not loaded & set(HEAVY_PACKAGES)
+    # ...but every route is still registered
+    for path in ("/api/predict/", "/api/chat/stream", "/api/auth/login", "/api/admin/models", "/api/notes/add"):
+        assert path in report["paths"]
+
+
+def test_metrics_scrape_keeps_lazy_modules_unloaded():
+    script = (
+        "import json, sys, app\n"
+        "from services.metrics import render\n"
+        "text = render()\n"
+        "print(json.dumps({'modules': sorted(sys.modules), 'text': text}))"
+    )
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", script],
+                         cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    report = json.loads(out.stdout.strip().splitlines()[-1])
+
+    loaded = {name.split(".")[0] for name in report["modules"]}
+    assert not loaded & set(HEAVY_PACKAGES)
+    for module in ("services.chat_service", "services.prediction_service", "services.calibration"):
+        assert module not in report["modules"]
+    assert "# TYPE cache_hit_ratio gauge" in report["text"]
+
+
+def test_lazy_module_imports_on_first_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / "lazy_probe.py").write_text("VALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_probe", raising=False)
+
+    module = lazy_import("lazy_probe")
+    assert not module.loaded and "lazy_probe" not in sys.modules
+    assert module.VALUE == 42
+    assert module.loaded and "lazy_probe" in sys.modules
+
+    monkeypatch.setattr(sys.modules["lazy_probe"], "VALUE", 7)
+    assert module.VALUE == 7
+
+
+def test_parse_importtime_reads_self_cumulative_and_depth():
+    text = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     numpy._core",
+        "import time:      2279 |     131090 |   numpy",
+        "import time:      4228 |    1151591 | app",
+    ])
+    modules = parse_importtime(text)
+    assert modules["numpy"] == (2279, 131090, 1)
+    assert modules["numpy._core"] == (120, 120, 2)
+    assert modules["app"][1] == 1151591
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
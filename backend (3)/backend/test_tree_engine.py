@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from services.model_loader import JSON_FILE, find_native_model, load_model
+from services.preprocess import CATEGORICAL_VALUE_MAPPINGS, preprocess_batch
+from services.tree_engine import TreeEnsemble
+
+xgboost = pytest.importorskip("xgboost")
+
+base = {
+    'topic_name': 'Test',
+    'category': 'science',
+    'domain': 'school',
+    'category_type': 'concept',
+    'study_time': 1.5,
+    'review_count': 2,
+    'confidence': 4,
+    'difficulty': 'medium',
+    'stress_level': 2,
+    'sleep_hours': 7.5,
+    'mood': 'calm',
+    'distraction_level': 1,
+    'recent_event': 'none',
+    'attention_level': 4
+}
+
+
+def _native_booster():
+    booster = xgboost.Booster()
+    booster.load_model(str(find_native_model()))
+    return booster
+
+
+def test_matches_native_on_random_inputs():
+    engine = TreeEnsemble.from_json(JSON_FILE)
+    booster = _native_booster()
+
+    X = np.random.default_rng(7).normal(scale=2.0, size=(5000, 14))
+    assert np.max(np.abs(engine.predict(X) - booster.inplace_predict(X))) <= 1e-6
+
+    # Missing values follow each node's default direction
+    X[::3, 13] = np.nan
+    X[::5, 5] = np.nan
+    assert np.max(np.abs(engine.predict(X) - booster.inplace_predict(X))) <= 1e-6
+
+
+def test_matches_native_on_encoded_payloads():
+    engine = TreeEnsemble.from_json(JSON_FILE)
+    booster = _native_booster()
+
+    payloads = []
+    for col, mapping in CATEGORICAL_VALUE_MAPPINGS.items():
+        for value in mapping:
+            for study_time in (0.5, 1.5, 4.0):
+                payloads.append(dict(base, **{col: value, 'study_time': study_time}))
+    X = preprocess_batch(payloads)
+
+    assert np.max(np.abs(engine.predict(X) - booster.inplace_predict(X))) <= 1e-6
+    assert engine.predict(X[:1]).shape == (1,)
+
+
+def test_flat_arrays_round_trip_memory_mapped(tmp_path):
+    engine = TreeEnsemble.from_json(JSON_FILE)
+    engine.save_flat(tmp_path / "flat")
+    mapped = TreeEnsemble.load_flat(tmp_path / "flat")
+
+    assert not mapped.features.flags.writeable
+    X = np.random.default_rng(3).normal(scale=2.0, size=(2000, 14))
+    X[::4, 2] = np.nan
+    np.testing.assert_array_equal(mapped.predict(X), engine.predict(X))
+
+    model, path = load_model("mmap")
+    assert path.name == "meta.json"
+    np.testing.assert_array_equal(model.predict(X), engine.predict(X))
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_matches_native_on_random_inputs()
+    test_matches_native_on_encoded_payloads()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_flat_arrays_round_trip_memory_mapped(Path(tmp))
+    print("NumPy tree engine matches the native booster within 1e-6.")
@@ -0,0 +1,156 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from db.write_buffer import WriteBuffer
+
+
+class FakeCollection:
+    def __init__(self, store):
+        self.store = store
+        self.calls = 0
+
+    async def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        self.calls += 1
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["_id"] in self.store:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.store[doc["_id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeMongo:
+    def __init__(self, up=True):
+        self.up = up
+        self.collections = {}
+
+    async def get_collection(self, name):
+        if not self.up:
+            return None
+        return self.collections.setdefault(name, FakeCollection({}))
+
+    def docs(self, name):
+        collection = self.collections.get(name)
+        return sorted(collection.store.values(), key=lambda d: d["_id"]) if collection else []
+
+
+def test_batches_inserts_by_size_and_interval():
+    mongo = FakeMongo()
+
+    async def scenario():
+        buffer = WriteBuffer(batch_size=10, interval=0.05, max_bytes=1 << 20, spill_path=None,
+                             collection_getter=mongo.get_collection)
+        buffer.start()
+        for i in range(25):
+            await buffer.add("chat_history", [{"n": i}])
+        await asyncio.sleep(0.15)
+        await buffer.close()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert [d["n"] for d in mongo.docs("chat_history")] == list(range(25))
+    # Far fewer round trips than documents
+    assert mongo.collections["chat_history"].calls <= 3
+    assert buffer.stats()["written"] == 25
+
+
+def test_keeps_documents_while_mongo_is_down_and_spills_overflow(tmp_path):
+    mongo = FakeMongo(up=False)
+    spill = tmp_path / "spill.jsonl"
+
+    async def scenario():
+        buffer = WriteBuffer(batch_size=1000, interval=0.02, max_bytes=2000, spill_path=str(spill),
+                             collection_getter=mongo.get_collection)
+        buffer.start()
+        for i in range(60):
+            await buffer.add("predictions", [{"n": i, "payload": "x" * 50}])
+        await asyncio.sleep(0.05)
+        stats = buffer.stats()
+        assert stats["pending_bytes"] <= 2000
+        assert stats["spilled"] > 0 and spill.exists()
+
+        mongo.up = True
+        await asyncio.sleep(0.2)
+        await buffer.close()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    # Everything arrives exactly once, in enqueue order, spill file included
+    assert [d["n"] for d in mongo.docs("predictions")] == list(range(60))
+    assert not spill.exists()
+    assert buffer.stats()["dropped"] == 0
+
+
+def test_replay_tolerates_documents_already_written():
+    mongo = FakeMongo()
+
+    async def scenario():
+        buffer = WriteBuffer(batch_size=100, interval=10, max_bytes=1 << 20, spill_path=None,
+                             collection_getter=mongo.get_collection)
+        buffer.start()
+        doc = {"n": 1}
+        await buffer.add("notes", [doc])
+        await buffer.flush()
+        # e.g. a retry after a timeout that had actually succeeded
+        await buffer.add("notes", [dict(doc)])
+        await buffer.close()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert len(mongo.docs("notes")) == 1
+    assert buffer.stats()["pending"] == 0
+
+
+def test_close_spills_what_mongo_cannot_take(tmp_path):
+    mongo = FakeMongo(up=False)
+    spill = tmp_path / "spill.jsonl"
+
+    async def scenario():
+        buffer = WriteBuffer(batch_size=100, interval=10, max_bytes=1 << 20, spill_path=str(spill),
+                             collection_getter=mongo.get_collection)
+        buffer.start()
+        await buffer.add("chat_history", [{"n": 1}, {"n": 2}])
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert len(spill.read_text().splitlines()) == 2
+
+
+def test_workers_sharing_a_spill_file_replay_it_once(tmp_path):
+    mongo = FakeMongo()
+    spill = tmp_path / "spill.jsonl"
+
+    class SlowMongo(FakeMongo):
+        async def get_collection(self, name):
+            await asyncio.sleep(0)  # lets the other "worker" get between the check and the replay
+            return await mongo.get_collection(name)
+
+    async def scenario():
+        # Two workers' buffers, one file; the first spilled while Mongo was down
+        first, second = (WriteBuffer(batch_size=100, interval=10, max_bytes=1 << 20, spill_path=str(spill),
+                                     collection_getter=SlowMongo().get_collection) for _ in range(2))
+        first._spill_or_drop({"notes": [{"_id": i, "n": i} for i in range(5)]})
+
+        async def spill_during_replay():
+            await asyncio.sleep(0)
+            second._spill_or_drop({"notes": [{"_id": 99, "n": 99}]})
+
+        await asyncio.gather(first._replay_spill(), second._replay_spill(), spill_during_replay())
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.replayed + second.replayed == 5
+    assert [d["n"] for d in mongo.docs("notes")] == list(range(5))
+    # Appended after the file was taken: waits for the next replay instead of being lost
+    assert len(spill.read_text().splitlines()) == 1 and '"n": 99' in spill.read_text()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["spill.jsonl", "spill.jsonl.lock"]
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -1,7 +1,9 @@
 import React, { useEffect, useRef, useState } from "react";
-import { fetchHistory, sendChat } from "../services/chatApi";
+import { fetchHistory, streamChat } from "../services/chatApi";
 import { useAuth } from "../context/AuthContext";
 
+const toMessage = (item) => ({ sender: item.sender, text: item.message });
+
 export default function Chat() {
   const { user } = useAuth();
   const email = user?.email || "";
@@ -9,10 +11,16 @@ export default function Chat() {
   const [input, setInput] = useState("");
   const [status, setStatus] = useState("idle");
   const [error, setError] = useState("");
+  // Cursor for the page before the oldest message shown; null when there's nothing older
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const historyRef = useRef(null);
+  // Scroll height before older messages were prepended, so the view stays put
+  const prependedFromRef = useRef(null);
 
   useEffect(() => {
     async function loadHistory() {
+      setOlderCursor(null);
       if (!email) {
         setMessages([]);
         return;
@@ -20,13 +28,9 @@ export default function Chat() {
       try {
         setStatus("loading");
         setError("");
-        const history = await fetchHistory(email);
-        setMessages(
-          history.map((item) => ({
-            sender: item.sender,
-            text: item.message,
-          }))
-        );
+        const { history, nextCursor } = await fetchHistory(email);
+        setMessages(history.map(toMessage));
+        setOlderCursor(nextCursor);
       } catch (err) {
         console.error("Failed to load chat history", err);
         // Don't show error for empty history, just log it
@@ -41,12 +45,35 @@ export default function Chat() {
   }, [email]);
 
   useEffect(() => {
-    historyRef.current?.scrollTo({
-      top: historyRef.current.scrollHeight,
+    const el = historyRef.current;
+    if (!el) return;
+    if (prependedFromRef.current !== null) {
+      el.scrollTop = el.scrollHeight - prependedFromRef.current;
+      prependedFromRef.current = null;
+      return;
+    }
+    el.scrollTo({
+      top: el.scrollHeight,
       behavior: "smooth",
     });
   }, [messages]);
 
+  async function loadOlder() {
+    if (!olderCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const { history, nextCursor } = await fetchHistory(email, { before: olderCursor });
+      prependedFromRef.current = historyRef.current?.scrollHeight ?? 0;
+      setMessages((prev) => [...history.map(toMessage), ...prev]);
+      setOlderCursor(nextCursor);
+    } catch (err) {
+      console.error("Failed to load older messages", err);
+      setError("Unable to load older messages.");
+    } finally {
+      setLoadingOlder(false);
+    }
+  }
+
   async function handleSend() {
     if (!input.trim() || !email) {
       setError("Please enter a message before sending.");
@@ -60,28 +87,30 @@ export default function Chat() {
     setInput("");
     setStatus("sending");
 
+    // Placeholder bot message that fills in as tokens stream in
+    setMessages((prev) => [...prev, { sender: "bot", text: "" }]);
+    const setBotText = (update) =>
+      setMessages((prev) => {
+        const next = [...prev];
+        const last = next[next.length - 1];
+        next[next.length - 1] = { ...last, text: update(last.text) };
+        return next;
+      });
+
     try {
-      const res = await sendChat({ email, message: messageToSend });
-      console.log("Chat response:", res);
-      
-      if (res && res.status === "error") {
-        const botMsg = { sender: "bot", text: res.reply || "An error occurred." };
-        setMessages((prev) => [...prev, botMsg]);
-        setError(res.reply || "An error occurred.");
-      } else if (res && res.reply) {
-        const botMsg = { sender: "bot", text: res.reply };
-        setMessages((prev) => [...prev, botMsg]);
-        setError(""); // Clear any previous errors
-      } else {
-        throw new Error("Invalid response from chat service");
-      }
+      const res = await streamChat({
+        email,
+        message: messageToSend,
+        onToken: (delta) => setBotText((text) => text + delta),
+      });
+      setBotText(() => res.reply);
+      setError(""); // Clear any previous errors
     } catch (err) {
       console.error("Send chat failed", err);
       const errorMsg = err.message || "Couldn't reach the chatbot. Please check if the backend is running.";
       setError(errorMsg);
-      // Add error message as bot response
-      const errorBotMsg = { sender: "bot", text: `Error: ${errorMsg}` };
-      setMessages((prev) => [...prev, errorBotMsg]);
+      // Show the error in place of the bot response
+      setBotText(() => `Error: ${errorMsg}`);
     } finally {
       setStatus("idle");
     }
@@ -117,6 +146,11 @@ export default function Chat() {
         {error && <p className="status-text status-text--error">{error}</p>}
 
         <div className="chat-history" ref={historyRef}>
+          {olderCursor && (
+            <button className="btn btn--ghost btn--tiny" type="button" onClick={loadOlder} disabled={loadingOlder}>
+              {loadingOlder ? "Loading..." : "Load older messages"}
+            </button>
+          )}
           {messages.length === 0 && (
             <p className="status-text">No messages yet. Say hello to start the chat.</p>
           )}
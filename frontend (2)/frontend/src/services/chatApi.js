@@ -23,15 +23,67 @@ export async function sendChat({ email, message }) {
   }
 }
 
-export async function fetchHistory(email) {
-  if (!email) return [];
+// Streams the reply over Server-Sent Events, calling onToken(delta) as text arrives.
+// Resolves with the final { reply, ttft_ms, total_ms } once the stream is done.
+export async function streamChat({ email, message, onToken }) {
+  let res;
   try {
-    const res = await chatClient.get(`/api/chat/${encodeURIComponent(email)}`);
-    return res.data.history ?? [];
+    res = await fetch(`${baseURL}/api/chat/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+      body: JSON.stringify({ email, message }),
+    });
+  } catch (error) {
+    console.error("Chat stream error:", error);
+    throw new Error("Unable to connect to chat service. Please check if the backend is running.");
+  }
+  if (!res.ok || !res.body) {
+    throw new Error("Chat service error");
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === "token") onToken?.(payload.delta);
+      else if (event === "done") return payload;
+      else if (event === "error") throw new Error(payload.message || "Chat service error");
+    }
+  }
+  throw new Error("Chat stream ended unexpectedly.");
+}
+
+// One page of the transcript, oldest message first: { history, nextCursor }.
+// Pass nextCursor back as `before` for the page of older messages; it's null once there are none.
+export async function fetchHistory(email, { before } = {}) {
+  if (!email) return { history: [], nextCursor: null };
+  try {
+    const res = await chatClient.get(`/api/chat/${encodeURIComponent(email)}`, {
+      params: before ? { before } : undefined,
+    });
+    return { history: res.data.history ?? [], nextCursor: res.data.next_cursor ?? null };
   } catch (error) {
     console.error("Fetch history error:", error);
     if (error.response && error.response.status === 404) {
-      return []; // No history yet, return empty array
+      return { history: [], nextCursor: null }; // No history yet
     }
     throw error;
   }